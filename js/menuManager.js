@@ -1,6 +1,7 @@
 class MenuManager {
     constructor() {
         this.menuData = null;
+        this.imageManifest = null;
         this.categories = [];
         this.currentCategory = null;
         this.order = {}; // { itemName: quantity }
@@ -31,6 +32,8 @@ class MenuManager {
                 icon: '🌮',
                 dataPath: 'data/menu.csv',
                 locationsPath: 'data/locations.csv',
+                // Built by scrape/build_images.py - optional
+                imageManifestPath: 'images/derivatives.json',
                 categories: [
                     'Tacos',
                     'Burritos',
@@ -74,6 +77,47 @@ class MenuManager {
         console.log('Loading menu data from:', restaurant.dataPath);
         this.menuData = await CSVParser.loadMenu(restaurant.dataPath);
         console.log('Menu data loaded:', this.menuData ? `${this.menuData.headers.length} headers, ${this.menuData.data.length} stores` : 'null');
+        this.imageManifest = await this.loadImageManifest(restaurant.imageManifestPath);
+    }
+
+    async loadImageManifest(path) {
+        // Resized AVIF/WebP derivatives; without them the full-size JPGs are used
+        if (!path) return null;
+        try {
+            const response = await fetch(path);
+            return response.ok ? await response.json() : null;
+        } catch (error) {
+            console.log('No image derivatives available:', error);
+            return null;
+        }
+    }
+
+    getImageDerivative(category, itemName) {
+        if (!this.imageManifest) return null;
+        const digest = (this.imageManifest.items[category] || {})[itemName];
+        return digest ? this.imageManifest.images[digest] : null;
+    }
+
+    renderItemImage(item) {
+        const fallback = `this.src='data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22100%22 height=%22100%22%3E%3Crect width=%22100%22 height=%22100%22 fill=%22%23333%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 fill=%22%23666%22 font-size=%2212%22 text-anchor=%22middle%22 dy=%22.3em%22%3ENo Image%3C/text%3E%3C/svg%3E'`;
+        const derivative = item.derivative;
+        if (!derivative) {
+            return `<img src="${item.imagePath}" alt="${item.name}" class="menu-item-image" onerror="${fallback}">`;
+        }
+        
+        const srcset = variants => variants.map(variant => `images/${variant.path} ${variant.width}w`).join(', ');
+        const sources = Object.entries(derivative.variants)
+            .map(([format, variants]) => `<source type="image/${format}" srcset="${srcset(variants)}" sizes="80px">`)
+            .join('');
+        // The blurred placeholder shows until the real image has loaded
+        return `
+                <picture>
+                    ${sources}
+                    <img src="${item.imagePath}" alt="${item.name}" class="menu-item-image" loading="lazy" decoding="async"
+                         width="${derivative.width}" height="${derivative.height}"
+                         style="background-image: url('${derivative.placeholder}'); background-size: cover;"
+                         onerror="${fallback}">
+                </picture>`;
     }
 
     async loadCategories() {
@@ -297,7 +341,8 @@ class MenuManager {
                 items.push({
                     name: itemName,
                     category: category,
-                    imagePath: imagePath
+                    imagePath: imagePath,
+                    derivative: this.getImageDerivative(category, itemName)
                 });
             } else {
                 console.log(`Item "${itemName}" not found in menu headers for ${category}`);
@@ -479,7 +524,7 @@ class MenuManager {
             console.log(`Rendering item: ${item.name}, quantity: ${quantity}, order object:`, this.order);
             
             itemEl.innerHTML = `
-                <img src="${item.imagePath}" alt="${item.name}" class="menu-item-image" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22100%22 height=%22100%22%3E%3Crect width=%22100%22 height=%22100%22 fill=%22%23333%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 fill=%22%23666%22 font-size=%2212%22 text-anchor=%22middle%22 dy=%22.3em%22%3ENo Image%3C/text%3E%3C/svg%3E'">
+                ${this.renderItemImage(item)}
                 <div class="menu-item-info">
                     <h4 class="menu-item-name">${item.name}</h4>
                     <div class="menu-item-counter">
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from http_cache import DEFAULT_CACHE_PATH
+from next_data import extract_next_data_text, extract_next_data_text_dom
+
+# Benchmark the fast __NEXT_DATA__ scanner against the BeautifulSoup path.
+#
+# Pages come from saved .html files or, by default, from the HTTP response
+# cache that menu.py fills during a crawl:
+#
+#   python scrape/bench_next_data.py                 # pages from .cache/
+#   python scrape/bench_next_data.py saved_pages/    # directory of .html files
+
+def load_pages_from_paths(paths):
+    """Load raw page bytes from files and directories of .html files"""
+    pages = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith('.html'):
+                    with open(os.path.join(path, name), 'rb') as f:
+                        pages.append(f.read())
+        else:
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+    return pages
+
+def load_pages_from_cache(cache_path, limit):
+    """Load raw page bytes for Taco Bell menu pages from the response cache"""
+    if not os.path.exists(cache_path):
+        return []
+    conn = sqlite3.connect(cache_path)
+    rows = conn.execute(
+        "SELECT body FROM responses WHERE url LIKE 'https://www.tacobell.com/%' LIMIT ?", (limit,)
+    ).fetchall()
+    conn.close()
+    return [zlib.decompress(row[0]) for row in rows]
+
+def time_extractor(extract, pages, repeat):
+    """Return the best-of-repeat seconds to extract and decode every page"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            payload = extract(page)
+            if payload is not None:
+                json.loads(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark __NEXT_DATA__ extraction on saved pages")
+    parser.add_argument('paths', nargs='*', help="Saved .html files or directories (default: response cache)")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="Response cache to read pages from")
+    parser.add_argument('--limit', type=int, default=200, help="Maximum pages to load from the cache")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions per extractor (best is reported)")
+    args = parser.parse_args()
+
+    if args.paths:
+        pages = load_pages_from_paths(args.paths)
+    else:
+        pages = load_pages_from_cache(args.cache, args.limit)
+
+    if not pages:
+        print("No pages to benchmark - pass saved .html files or run menu.py with the cache enabled first")
+        return
+
+    # Both extractors receive decoded text, as they do inside the crawler
+    texts = [page.decode('utf-8', errors='replace') for page in pages]
+    mismatches = sum(1 for text in texts if extract_next_data_text(text) != extract_next_data_text_dom(text))
+
+    total_mb = sum(len(page) for page in pages) / 1024 ** 2
+    print(f"Pages: {len(pages)} ({total_mb:.1f} MB)")
+    print(f"Payload mismatches between extractors: {mismatches}")
+
+    dom_time = time_extractor(extract_next_data_text_dom, texts, args.repeat)
+    fast_time = time_extractor(extract_next_data_text, texts, args.repeat)
+
+    print(f"BeautifulSoup: {dom_time / len(pages) * 1000:8.2f} ms/page")
+    print(f"Fast scanner:  {fast_time / len(pages) * 1000:8.2f} ms/page")
+    print(f"Speedup:       {dom_time / fast_time:8.1f}x")
+
+if __name__ == "__main__":
+    main()
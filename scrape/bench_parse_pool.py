@@ -0,0 +1,87 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import menu
+import parse_cache
+import parse_pool
+from bench_next_data import load_pages_from_cache, load_pages_from_paths
+from http_cache import DEFAULT_CACHE_PATH
+
+# Benchmark parse throughput against the number of worker processes.
+#
+# Runs the pages through menu.parse_menu_items - the crawler's own parse path,
+# parse cache included - from a pool of threads standing in for the fetch
+# threads, first in-process (the threaded crawler's baseline) and then with
+# the parse pool at 1, 2, 4, ... workers up to the core count. Every
+# repetition starts with empty caches, so repeats don't turn into cache hits:
+#
+#   python scrape/bench_parse_pool.py                 # pages from .cache/
+#   python scrape/bench_parse_pool.py saved_pages/    # directory of .html files
+#   python scrape/bench_parse_pool.py --cache-size 0  # without the parse cache
+
+def worker_counts(max_workers):
+    """Return 1, 2, 4, ... up to and including max_workers"""
+    counts = []
+    count = 1
+    while count < max_workers:
+        counts.append(count)
+        count *= 2
+    counts.append(max_workers)
+    return counts
+
+def time_parse(pages, threads, cache_size, workers=None):
+    """Return the seconds to parse every page with parse_menu_items, in-process or with workers"""
+    parse_cache.configure_parse_cache(cache_size)
+    if workers:
+        # Started (and warmed up) before the clock starts
+        parse_pool.enable_parse_pool(workers, cache_size)
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            start = time.perf_counter()
+            list(executor.map(menu.parse_menu_items, pages))
+            return time.perf_counter() - start
+    finally:
+        parse_pool.close_parse_pool()
+
+def best_of(repeat, *args, **kwargs):
+    return min(time_parse(*args, **kwargs) for _ in range(repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page parsing throughput per worker process count")
+    parser.add_argument('paths', nargs='*', help="Saved .html files or directories (default: response cache)")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="Response cache to read pages from")
+    parser.add_argument('--limit', type=int, default=500, help="Maximum pages to load from the cache")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions per configuration (best is reported)")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1,
+                        help="Largest worker count to try (default: number of cores)")
+    parser.add_argument('--threads', type=int, default=16, help="Crawler threads calling the parser (default: 16)")
+    parser.add_argument('--cache-size', type=int, default=parse_cache.DEFAULT_MAX_ENTRIES,
+                        help=f"Parse cache size, 0 to disable (default: {parse_cache.DEFAULT_MAX_ENTRIES})")
+    args = parser.parse_args()
+
+    if args.paths:
+        pages = load_pages_from_paths(args.paths)
+    else:
+        pages = load_pages_from_cache(args.cache, args.limit)
+
+    if not pages:
+        print("No pages to benchmark - pass saved .html files or run menu.py with the cache enabled first")
+        return
+
+    total_mb = sum(len(page) for page in pages) / 1024 ** 2
+    print(f"Pages: {len(pages)} ({total_mb:.1f} MB), cores: {os.cpu_count()}, "
+          f"threads: {args.threads}, parse cache: {args.cache_size or 'off'}")
+
+    baseline = best_of(args.repeat, pages, args.threads, args.cache_size)
+    print(f"{'in-process':>12}: {len(pages) / baseline:9.1f} pages/s")
+
+    single = None
+    for workers in worker_counts(args.max_workers):
+        elapsed = best_of(args.repeat, pages, args.threads, args.cache_size, workers)
+        single = single or elapsed
+        print(f"{workers:>4} workers: {len(pages) / elapsed:9.1f} pages/s  ({single / elapsed:4.1f}x)")
+
+if __name__ == "__main__":
+    main()
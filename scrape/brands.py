@@ -0,0 +1,225 @@
+import os
+import re
+from abc import ABC, abstractmethod
+
+from bs4 import BeautifulSoup
+
+from next_data import extract_next_data_payload
+from products import decode_menu_items, decode_product_categories
+from store_pages import fetch_store_details, parse_city_page_stores
+
+# Brand adapters.
+#
+# Everything the scrapers know about one chain's sites sits behind a
+# BrandAdapter: the store locator's discovery URLs, how a store page yields
+# its store ID, the menu URLs and how menu pages are parsed, and where the
+# brand's data files and images live (data/<brand>/ and images/<brand>/ by
+# default; Taco Bell keeps the top-level data/ and images/ and KFC its KFC/
+# directory, which is where js/menuManager.js reads them). The crawl code itself is brand-agnostic
+# - locations and results carry a 'brand' key and look their adapter up with
+# brand_of().
+#
+# Several brands can be crawled in one run (`python scrape/menu.py --brands
+# tacobell,<other>`): their stores are interleaved into one queue, and the
+# per-host rate and concurrency limits in http_client keep each brand's hosts
+# at their own budget, so the brands' crawls run side by side instead of one
+# after the other.
+#
+# To add a brand, subclass BrandAdapter, implement its abstract methods and
+# register an instance in BRANDS below (parse pool workers import this module
+# to find a page's adapter by name).
+
+DEFAULT_BRAND = 'tacobell'
+
+def clean_name(name):
+    """Remove the count numbers in parentheses from names"""
+    return re.sub(r'\(\d+\)$', '', name).strip()
+
+class BrandAdapter(ABC):
+    """Discovery URLs, store-ID extraction and menu parsing for one chain"""
+
+    name = None
+    display_name = None
+    # Store locator root - its directory lists states, which list cities
+    locations_root = None
+    # Columns of the brand's locations.csv
+    location_fields = ['store_id', 'location', 'page', 'map']
+
+    @property
+    def data_dir(self):
+        return os.path.join('data', self.name)
+
+    @property
+    def images_dir(self):
+        return os.path.join('images', self.name)
+
+    @property
+    def states_path(self):
+        return os.path.join(self.data_dir, 'states.json')
+
+    @property
+    def groups_path(self):
+        return os.path.join(self.data_dir, 'groups.json')
+
+    @property
+    def locations_csv_path(self):
+        return os.path.join(self.data_dir, 'locations.csv')
+
+    @property
+    def locations_journal_path(self):
+        return os.path.join(self.data_dir, 'locations.journal')
+
+    @property
+    def menu_csv_path(self):
+        return os.path.join(self.data_dir, 'menu.csv')
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.data_dir, 'menu_journal.csv')
+
+    @property
+    def state_path(self):
+        return os.path.join(self.data_dir, 'crawl_state.sqlite')
+
+    # -- discovery -----------------------------------------------------------
+
+    def location_url(self, href):
+        """Absolute URL for a (possibly relative) link found on the store locator"""
+        if href.startswith('http'):
+            return href
+        # ../ak/anchorage/store.html -> <root>ak/anchorage/store.html
+        return self.locations_root.rstrip('/') + '/' + href.replace('../', '').lstrip('/')
+
+    @abstractmethod
+    def parse_directory(self, html_content):
+        """Return {name: url} for the state or city links on a locator directory page"""
+
+    def parse_city_stores(self, html_content):
+        """Return {store page key: details} for stores described in a city page's structured data"""
+        return {}
+
+    @abstractmethod
+    def store_details(self, store_page_url):
+        """Fetch a store page and return {'store_id', 'lat', 'lng', 'address'}, or None"""
+
+    # -- menus ---------------------------------------------------------------
+
+    @abstractmethod
+    def menu_url(self, store_id):
+        """URL of a store's menu page"""
+
+    @abstractmethod
+    def parse_categories(self, html_content, store_id):
+        """Return [{'name', 'url', 'description'}] from a menu page, or None if it has no menu"""
+
+    @abstractmethod
+    def extract_menu_payload(self, page):
+        """Return the part of a category page that holds its products (text), or None"""
+
+    @abstractmethod
+    def decode_menu_items(self, payload, category_name=''):
+        """Decode an extracted payload into [{'name', 'price', 'image_url', 'category'}]"""
+
+class TacoBell(BrandAdapter):
+    """locations.tacobell.com (Yext directory) and the www.tacobell.com Next.js menu"""
+
+    name = 'tacobell'
+    display_name = 'Taco Bell'
+    locations_root = 'https://locations.tacobell.com/'
+    menu_root = 'https://www.tacobell.com'
+    # The first brand keeps the original top-level paths
+    data_dir = 'data'
+    images_dir = 'images'
+
+    def parse_directory(self, html_content):
+        soup = BeautifulSoup(html_content, 'html.parser')
+        directory_container = soup.find('div', class_='directory-container')
+        links = {}
+        if directory_container:
+            for link in directory_container.find_all('a', class_='DirLinks'):
+                links[clean_name(link.get_text(strip=True))] = self.location_url(link.get('href', ''))
+        return links
+
+    def parse_city_stores(self, html_content):
+        return parse_city_page_stores(html_content)
+
+    def store_details(self, store_page_url):
+        return fetch_store_details(store_page_url)
+
+    def menu_url(self, store_id):
+        return f"{self.menu_root}/food?store={store_id}"
+
+    def parse_categories(self, html_content, store_id):
+        # The __NEXT_DATA__ script tag contains all the menu data
+        payload = extract_next_data_payload(html_content)
+        if payload is None:
+            return None
+
+        categories = []
+        for label, slug, subtitle in decode_product_categories(payload):
+            categories.append({
+                'name': label,
+                # Build the full URL with store parameter
+                'url': f"{self.menu_root}{slug}?store={store_id}" if slug else '',
+                'description': subtitle
+            })
+        return categories
+
+    def extract_menu_payload(self, page):
+        return extract_next_data_payload(page)
+
+    def decode_menu_items(self, payload, category_name=''):
+        return decode_menu_items(payload, category_name)
+
+class KFC(TacoBell):
+    """locations.kfc.com and www.kfc.com - the same Yum! store locator and Next.js ordering site as Taco Bell"""
+
+    name = 'kfc'
+    display_name = 'KFC'
+    locations_root = 'https://locations.kfc.com/'
+    menu_root = 'https://www.kfc.com'
+    # Where the site (js/menuManager.js, js/config.js) reads KFC's data from
+    data_dir = os.path.join('KFC', 'data')
+    images_dir = os.path.join('KFC', 'images')
+    # js/csvParser.js places KFC stores by these rather than the map link
+    location_fields = ['store_id', 'location', 'page', 'map', 'lat', 'lng']
+
+    def menu_url(self, store_id):
+        return f"{self.menu_root}/menu?store={store_id}"
+
+BRANDS = {adapter.name: adapter for adapter in [TacoBell(), KFC()]}
+
+def get_brand(name=None):
+    """Return the adapter registered under name (the default brand for None)"""
+    name = name or DEFAULT_BRAND
+    if name not in BRANDS:
+        raise ValueError(f"Unknown brand {name!r}; available: {', '.join(sorted(BRANDS))}")
+    return BRANDS[name]
+
+def brand_of(record):
+    """Adapter for a location, category or result dict (untagged records are the default brand)"""
+    return get_brand(record.get('brand'))
+
+def tag_brand(records, brand):
+    """Copies of records (e.g. locations) marked as belonging to brand"""
+    return [dict(record, brand=brand.name) for record in records]
+
+def group_by_brand(records):
+    """Return [(adapter, records)] for records of each brand, in first-seen order"""
+    groups = {}
+    for record in records:
+        groups.setdefault(record.get('brand') or DEFAULT_BRAND, []).append(record)
+    return [(get_brand(name), members) for name, members in groups.items()]
+
+def interleave(*lists):
+    """Round-robin merge of several lists, e.g. each brand's pending stores
+
+    A run over several brands alternates between their hosts instead of
+    finishing one brand first, so every host's rate budget is in use at once.
+    """
+    merged = []
+    for position in range(max((len(items) for items in lists), default=0)):
+        for items in lists:
+            if position < len(items):
+                merged.append(items[position])
+    return merged
@@ -0,0 +1,226 @@
+import argparse
+import base64
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+from image_store import DEFAULT_IMAGES_DIR, ImageStore
+
+# Pillow is optional for the crawler but required to build derivatives
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Responsive image derivatives.
+#
+# Walks the content-addressed image store (see image_store.py) and, in a
+# process pool, resizes every blob to a few widths in modern formats plus a
+# tiny blurred placeholder that is inlined as a data URI:
+#
+#   images/derived/<xx>/<sha256>-<width>.<avif|webp>
+#   images/derivatives.json
+#       settings - widths, formats and quality the derivatives were built with
+#       images   - digest -> {width, height, placeholder, variants: {format: [{width, path}]}}
+#       items    - category -> item name -> digest, copied from the store manifest
+#
+# The menu shows images at 80px, so the default widths cover 1x, 2x and 4x
+# screens. Blobs are content-addressed, so an image that changed upstream is a
+# new digest: a rebuild only processes digests missing from derivatives.json
+# (or whose files are gone) and prunes derivatives of blobs no longer stored.
+# Changing the settings rebuilds everything.
+#
+#   python scrape/build_images.py
+#   python scrape/build_images.py --widths 80,160 --formats webp --workers 4
+#   python scrape/build_images.py --force
+
+DERIVED_DIR = 'derived'
+DERIVATIVES_NAME = 'derivatives.json'
+
+DEFAULT_WIDTHS = (80, 160, 320)
+DEFAULT_FORMATS = ('avif', 'webp')
+DEFAULT_QUALITY = 60
+PLACEHOLDER_WIDTH = 16
+
+FORMAT_EXTENSIONS = {'avif': '.avif', 'webp': '.webp'}
+
+def supported_formats(formats):
+    """The requested formats this Pillow build can write"""
+    Image.init()
+    return [fmt for fmt in formats if fmt.upper() in Image.SAVE]
+
+def save_atomic(image, path, fmt, **options):
+    temp_path = path + '.tmp'
+    image.save(temp_path, format=fmt.upper(), **options)
+    os.replace(temp_path, path)
+
+def placeholder_uri(image):
+    """A ~16px wide, low-quality WebP of the image as a data: URI"""
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    small = image.resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    small.save(buffer, format='WEBP', quality=30)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def build_derivatives(source_path, digest, images_dir, widths, formats, quality):
+    """Resize one blob into every width/format; runs in a worker process
+
+    Widths at or above the source width are replaced by a single
+    derivative at the source width - images are never upscaled.
+    """
+    with Image.open(source_path) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        source_width, source_height = image.size
+
+        targets = sorted({min(width, source_width) for width in widths})
+        out_dir = os.path.join(images_dir, DERIVED_DIR, digest[:2])
+        os.makedirs(out_dir, exist_ok=True)
+
+        variants = {fmt: [] for fmt in formats}
+        for width in targets:
+            height = max(1, round(source_height * width / source_width))
+            resized = image if width == source_width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                filename = f"{digest}-{width}{FORMAT_EXTENSIONS[fmt]}"
+                save_atomic(resized, os.path.join(out_dir, filename), fmt, quality=quality)
+                variants[fmt].append({'width': width, 'path': f"{DERIVED_DIR}/{digest[:2]}/{filename}"})
+
+        return digest, {
+            'width': source_width,
+            'height': source_height,
+            'placeholder': placeholder_uri(image),
+            'variants': variants
+        }
+
+def load_derivatives(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def is_current(entry, images_dir):
+    """True if every derivative file an entry lists is still on disk"""
+    return all(
+        os.path.exists(os.path.join(images_dir, variant['path']))
+        for variants in entry['variants'].values()
+        for variant in variants
+    )
+
+def prune(images_dir, images):
+    """Delete derivative files not referenced by any manifest entry; returns the count"""
+    referenced = {
+        os.path.normpath(os.path.join(images_dir, variant['path']))
+        for entry in images.values()
+        for variants in entry['variants'].values()
+        for variant in variants
+    }
+    removed = 0
+    for root, _, files in os.walk(os.path.join(images_dir, DERIVED_DIR)):
+        for filename in files:
+            path = os.path.normpath(os.path.join(root, filename))
+            if path not in referenced:
+                os.remove(path)
+                removed += 1
+    return removed
+
+def build(images_dir=DEFAULT_IMAGES_DIR, widths=DEFAULT_WIDTHS, formats=DEFAULT_FORMATS,
+          quality=DEFAULT_QUALITY, workers=None, force=False):
+    """Bring images/derived and derivatives.json up to date with the image store"""
+    store = ImageStore(images_dir, layout='none')
+    manifest_path = os.path.join(images_dir, DERIVATIVES_NAME)
+    previous = load_derivatives(manifest_path)
+
+    settings = {'widths': sorted(widths), 'formats': list(formats), 'quality': quality}
+    images = previous.get('images', {}) if previous.get('settings') == settings and not force else {}
+    # Only blobs still in the store are kept
+    images = {digest: entry for digest, entry in images.items() if digest in store.blobs}
+
+    todo = [
+        digest for digest in store.blobs
+        if digest not in images or not is_current(images[digest], images_dir)
+    ]
+    print(f"{len(store.blobs)} images in the store, {len(todo)} to process")
+
+    failed = 0
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {
+                executor.submit(build_derivatives, store.blob_path(digest), digest, images_dir,
+                                settings['widths'], settings['formats'], quality): digest
+                for digest in todo
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Building derivatives", unit="image"):
+                try:
+                    digest, entry = future.result()
+                    images[digest] = entry
+                except Exception as e:
+                    failed += 1
+                    print(f"Could not process {futures[future]}: {e}")
+
+    items = {
+        category: {item_name: entry['blob'] for item_name, entry in entries.items() if entry['blob'] in images}
+        for category, entries in store.items.items()
+    }
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'settings': settings, 'images': images, 'items': items}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+    removed = prune(images_dir, images)
+    return len(todo) - failed, failed, removed
+
+def payload_sizes(images_dir):
+    """Bytes the menu loads per image at 1x (smallest variant, smallest format) vs. the source blobs"""
+    manifest = load_derivatives(os.path.join(images_dir, DERIVATIVES_NAME))
+    store = ImageStore(images_dir, layout='none')
+    derived = source = 0
+    for digest, entry in manifest.get('images', {}).items():
+        derived += min(
+            os.path.getsize(os.path.join(images_dir, variants[0]['path']))
+            for variants in entry['variants'].values()
+        )
+        source += store.blobs[digest]['size']
+    return derived, source
+
+def main():
+    parser = argparse.ArgumentParser(description="Build resized AVIF/WebP derivatives of the stored menu images")
+    parser.add_argument('--images-dir', default=DEFAULT_IMAGES_DIR, help="Image directory (default: images)")
+    parser.add_argument('--widths', default=','.join(str(width) for width in DEFAULT_WIDTHS),
+                        help="Comma-separated derivative widths in pixels (default: 80,160,320)")
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                        help="Comma-separated output formats, from avif and webp (default: avif,webp)")
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY, help="Encoder quality (default: 60)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per core)")
+    parser.add_argument('--force', action='store_true', help="Rebuild every derivative")
+    args = parser.parse_args()
+
+    if Image is None:
+        print("Building derivatives needs Pillow: pip install Pillow")
+        return
+
+    widths = [int(width) for width in args.widths.split(',') if width.strip()]
+    requested = [fmt.strip().lower() for fmt in args.formats.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in requested if fmt not in FORMAT_EXTENSIONS]
+    if unknown:
+        print(f"Unknown formats: {', '.join(unknown)}")
+        return
+    formats = supported_formats(requested)
+    for fmt in requested:
+        if fmt not in formats:
+            print(f"This Pillow build can't write {fmt.upper()} - skipping it")
+    if not formats:
+        return
+
+    built, failed, removed = build(args.images_dir, widths, formats, args.quality, args.workers, args.force)
+    print(f"Built {built} images ({failed} failed), removed {removed} stale derivatives")
+    derived, source = payload_sizes(args.images_dir)
+    print(f"1x menu images: {derived / 1024 / 1024:.1f} MB, down from {source / 1024 / 1024:.1f} MB of source images")
+
+if __name__ == "__main__":
+    main()
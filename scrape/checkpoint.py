@@ -0,0 +1,178 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+
+# Crash-safe incremental checkpointing for the location crawl.
+#
+# Workers hand each finished city to add_city(), which only enqueues it. A
+# single writer thread appends the cities to an append-only JSON-lines journal,
+# fsyncing once per batch rather than once per city, records them in the
+# crawl state database, and every snapshot_interval seconds rewrites
+# locations.csv as temp file + fsync + rename. A crash therefore never leaves a
+# truncated locations.csv, and anything journaled since the last snapshot is
+# replayed on the next start.
+#
+# If the writer fails (disk full, permissions) it stops and keeps the error,
+# which the next add_city() or close() raises - the crawl must not carry on
+# believing its cities are saved.
+
+LOCATION_FIELDS = ['store_id', 'location', 'page', 'map']
+
+class LocationCheckpoint:
+    """Journal + periodic atomic snapshot of data/locations.csv"""
+
+    def __init__(self, csv_path='data/locations.csv', journal_path='data/locations.journal',
+                 existing_rows=None, crawl_state=None, fsync_every=20, fsync_interval=2.0,
+                 snapshot_interval=60.0, fields=LOCATION_FIELDS):
+        self.csv_path = csv_path
+        self.fields = fields
+        self.journal_path = journal_path
+        self.crawl_state = crawl_state
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+
+        self.rows = list(existing_rows) if existing_rows is not None else self._load_csv()
+        self.total = len(self.rows)
+        self.count_lock = threading.Lock()
+        self.queue = queue.Queue()
+        # Set by the writer thread if it dies
+        self.error = None
+
+        self._recover()
+
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.writer = threading.Thread(target=self._writer_loop, name='location-checkpoint', daemon=True)
+        self.writer.start()
+
+    def _load_csv(self):
+        if not os.path.exists(self.csv_path):
+            return []
+        with open(self.csv_path, 'r', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+
+    def _recover(self):
+        """Replay cities journaled after the last snapshot, then snapshot them"""
+        if not os.path.exists(self.journal_path):
+            return
+        known = {row['store_id'] for row in self.rows}
+        recovered = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append - everything before it is intact
+                    break
+                if self.crawl_state is not None:
+                    self.crawl_state.record_city(entry['state'], entry['city'], entry['locations'])
+                for location in entry['locations']:
+                    if location['store_id'] not in known:
+                        known.add(location['store_id'])
+                        self.rows.append(location)
+                        recovered += 1
+        self.total = len(self.rows)
+        if recovered:
+            print(f"Recovered {recovered} locations from {self.journal_path}")
+        self._snapshot()
+        self._truncate_journal()
+
+    def add_city(self, state, city, locations):
+        """Queue a finished city for the journal; returns the running location total
+
+        Raises the writer's error if it has failed.
+        """
+        self._raise_writer_error()
+        self.queue.put({'state': state, 'city': city, 'locations': locations})
+        with self.count_lock:
+            self.total += len(locations)
+            return self.total
+
+    def close(self):
+        """Flush everything, write a final snapshot and stop the writer thread
+
+        Raises the writer's error if anything could not be saved.
+        """
+        self.queue.put(None)
+        self.writer.join()
+        self.journal.close()
+        self._raise_writer_error()
+
+    def _raise_writer_error(self):
+        if self.error is not None:
+            raise RuntimeError(f"Location checkpoint writer failed: {self.error}") from self.error
+
+    def _writer_loop(self):
+        try:
+            self._write_until_closed()
+        except Exception as e:
+            self.error = e
+
+    def _write_until_closed(self):
+        pending = []
+        dirty = False
+        last_sync = time.monotonic()
+        last_snapshot = time.monotonic()
+        while True:
+            try:
+                entry = self.queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                entry = False
+
+            if entry:
+                pending.append(entry)
+
+            now = time.monotonic()
+            done = entry is None
+            if pending and (done or len(pending) >= self.fsync_every or now - last_sync >= self.fsync_interval):
+                self._flush(pending)
+                pending = []
+                last_sync = now
+                dirty = True
+
+            if dirty and (done or now - last_snapshot >= self.snapshot_interval):
+                self._snapshot()
+                self._truncate_journal()
+                last_snapshot = now
+                dirty = False
+
+            if done:
+                return
+
+    def _flush(self, entries):
+        # One write + fsync per batch of cities
+        for entry in entries:
+            self.journal.write(json.dumps(entry) + '\n')
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+        for entry in entries:
+            self.rows.extend(entry['locations'])
+            if self.crawl_state is not None:
+                self.crawl_state.record_city(entry['state'], entry['city'], entry['locations'])
+
+    def _snapshot(self):
+        """Write locations.csv atomically from the rows seen so far"""
+        directory = os.path.dirname(self.csv_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.csv_path + '.tmp'
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fields, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.csv_path)
+
+    def _truncate_journal(self):
+        # Everything in the journal is now in the snapshot
+        journal = getattr(self, 'journal', None)
+        if journal is not None:
+            journal.seek(0)
+            journal.truncate()
+        elif os.path.exists(self.journal_path):
+            open(self.journal_path, 'w').close()
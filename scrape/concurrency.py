@@ -0,0 +1,225 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Adaptive (AIMD) concurrency limiting.
+#
+# Instead of hand-picked worker counts, requests take a slot from an
+# AdaptiveConcurrency limiter. After every window of completed requests the
+# limit is adjusted: +1 while p95 latency stays near the best p95 seen so far,
+# multiplied down when latency climbs or the server answers 429/5xx.
+# HostConcurrency keeps one such limiter per host, so a slow host only
+# shrinks its own limit.
+
+def percentile(values, pct):
+    """Return the pct-th percentile (0-100) of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def is_error_status(status):
+    """True for responses that mean the server wants less load"""
+    return status is not None and (status == 429 or status >= 500)
+
+async def _notify_all(cond):
+    async with cond:
+        cond.notify_all()
+
+class Slot:
+    """One in-flight request; records its latency and status on exit"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.status = None
+        self.started = None
+
+    def __enter__(self):
+        self.limiter.acquire()
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.limiter.release(time.monotonic() - self.started, self.status, error=exc_type is not None)
+        return False
+
+    async def __aenter__(self):
+        await self.limiter.acquire_async()
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            # A cancelled request (e.g. the losing copy of a hedged pair) says
+            # nothing about the server - free the slot without a sample
+            await self.limiter.release_async(None)
+            return False
+        await self.limiter.release_async(time.monotonic() - self.started, self.status, error=exc_type is not None)
+        return False
+
+class AdaptiveConcurrency:
+    """AIMD in-flight request limit driven by observed latency and error rate"""
+
+    def __init__(self, initial=10, min_limit=1, max_limit=64, window=20,
+                 latency_tolerance=1.5, decrease_factor=0.7, name=''):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.in_flight = 0
+        self.baseline_p95 = None
+        self.latencies = []
+        self.errors = 0
+        self.started = time.monotonic()
+        # (seconds since start, limit, window p95, window error rate)
+        self.history = [(0.0, self.limit, None, 0.0)]
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        # Event loop -> asyncio.Condition its coroutines wait on; a condition
+        # belongs to one loop, so each loop that uses the limiter gets its own
+        self.async_conds = {}
+
+    def slot(self):
+        """Context manager (sync or async) holding one request slot"""
+        return Slot(self)
+
+    def _try_take(self):
+        with self.lock:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        """Block until a slot is free"""
+        with self.cond:
+            while self.in_flight >= self.limit:
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, status=None, error=False):
+        """Free a slot and feed its outcome to the controller (latency None: no sample)"""
+        with self.cond:
+            self.in_flight -= 1
+            if latency is not None:
+                self._record(latency, status, error)
+            self.cond.notify_all()
+        self._wake_async_waiters()
+
+    def _async_cond(self, loop):
+        with self.lock:
+            cond = self.async_conds.get(loop)
+            if cond is None:
+                cond = self.async_conds[loop] = asyncio.Condition()
+            return cond
+
+    def _wake_async_waiters(self, current_loop=None):
+        """Wake coroutines waiting for a slot on every loop but current_loop
+
+        Safe from any thread: each loop's condition is notified on that loop.
+        """
+        with self.lock:
+            for loop in [loop for loop in self.async_conds if loop.is_closed()]:
+                del self.async_conds[loop]
+            conds = [(loop, cond) for loop, cond in self.async_conds.items() if loop is not current_loop]
+        for loop, cond in conds:
+            try:
+                loop.call_soon_threadsafe(lambda cond=cond: asyncio.ensure_future(_notify_all(cond)))
+            except RuntimeError:
+                # The loop closed in the meantime - nothing is waiting on it
+                pass
+
+    async def acquire_async(self):
+        """Wait on the event loop until a slot is free"""
+        cond = self._async_cond(asyncio.get_running_loop())
+        async with cond:
+            await cond.wait_for(self._try_take)
+
+    async def release_async(self, latency, status=None, error=False):
+        """Asyncio version of release()"""
+        with self.cond:
+            self.in_flight -= 1
+            if latency is not None:
+                self._record(latency, status, error)
+            # Threads blocked in acquire() wait on the threading condition
+            self.cond.notify_all()
+        loop = asyncio.get_running_loop()
+        self._wake_async_waiters(loop)
+        await _notify_all(self._async_cond(loop))
+
+    def _record(self, latency, status, error):
+        # Caller holds self.lock
+        self.latencies.append(latency)
+        if error or is_error_status(status):
+            self.errors += 1
+        if len(self.latencies) >= max(self.window, self.limit):
+            self._adjust()
+
+    def _adjust(self):
+        p95 = percentile(self.latencies, 95)
+        error_rate = self.errors / len(self.latencies)
+        self.latencies = []
+        self.errors = 0
+
+        if self.baseline_p95 is None or p95 < self.baseline_p95:
+            self.baseline_p95 = p95
+        else:
+            # Let the baseline drift up slowly so one lucky window doesn't pin it forever
+            self.baseline_p95 *= 1.01
+
+        if error_rate > 0:
+            new_limit = int(self.limit * self.decrease_factor)
+        elif p95 > self.baseline_p95 * self.latency_tolerance:
+            new_limit = int(self.limit * 0.9)
+        else:
+            new_limit = self.limit + 1
+        new_limit = max(self.min_limit, min(self.max_limit, new_limit))
+
+        if new_limit != self.limit:
+            self.limit = new_limit
+            self.history.append((time.monotonic() - self.started, new_limit, p95, error_rate))
+
+    def format_history(self):
+        """Return a human readable log of how the limit changed over the run"""
+        label = f" ({self.name})" if self.name else ''
+        lines = [f"Concurrency limit history{label}:"]
+        for elapsed, limit, p95, error_rate in self.history:
+            p95_text = f"{p95 * 1000:.0f}ms" if p95 is not None else '-'
+            lines.append(f"  {elapsed:8.1f}s  limit={limit:<4} p95={p95_text:<8} errors={error_rate:.0%}")
+        return '\n'.join(lines)
+
+class HostConcurrency:
+    """One AdaptiveConcurrency per host, created on first use"""
+
+    def __init__(self, initial=10, max_limit=64, name=''):
+        self.initial = initial
+        self.max_limit = max_limit
+        self.name = name
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def for_url(self, url):
+        """Return the limiter for url's host"""
+        host = urlsplit(url).netloc
+        with self.lock:
+            limiter = self.limiters.get(host)
+            if limiter is None:
+                name = f"{self.name} {host}" if self.name else host
+                limiter = AdaptiveConcurrency(self.initial, max_limit=self.max_limit, name=name)
+                self.limiters[host] = limiter
+            return limiter
+
+    def slot(self, url):
+        """Context manager (sync or async) holding one request slot on url's host"""
+        return self.for_url(url).slot()
+
+    def format_history(self):
+        """Return the limit history of every host"""
+        with self.lock:
+            limiters = list(self.limiters.values())
+        return '\n'.join(limiter.format_history() for limiter in limiters)
@@ -0,0 +1,673 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# SQLite-backed crawl state shared by the location and menu scrapers.
+#
+# One embedded database holds states, cities, stores, per-store crawl status
+# and attempts, and menu prices. Resume and "what's left" questions become
+# indexed queries instead of re-reading every CSV from scratch. The CSV/JSON
+# files in data/ can be regenerated from it:
+#
+#   python scrape/crawl_state.py import   # seed from the existing data/ files
+#   python scrape/crawl_state.py export   # write data/ files from the database
+#   python scrape/crawl_state.py status   # progress summary
+#   python scrape/crawl_state.py snapshot --at 2025-06-01   # menu.csv as of a date
+#
+# menu_prices holds each store's current prices. price_history only gets a
+# row when a price changes (a NULL price marks an item that disappeared), so
+# refreshing a store whose prices are unchanged costs nothing, and any past
+# snapshot is the latest history row per (store, item) at or before T.
+#
+# Failed stores and category pages go to retry_queue (a dead-letter queue)
+# with their attempt count, error class and an exponential backoff, instead
+# of being written out as empty menus. menu.py retries whatever is due at the
+# end of each run, and `python scrape/menu.py --retry-failed` retries
+# everything, including entries that ran out of attempts.
+
+DEFAULT_STATE_PATH = 'data/crawl_state.sqlite'
+
+LOCATION_FIELDS = ['store_id', 'location', 'page', 'map']
+
+# Retry backoff: RETRY_BASE_DELAY * 2^(attempts - 1) seconds, capped
+RETRY_BASE_DELAY = 60
+RETRY_MAX_DELAY = 24 * 3600
+# After this many attempts an entry is only retried by --retry-failed
+MAX_RETRY_ATTEMPTS = 6
+
+# Older SQLite builds allow at most 999 bound variables per statement
+MAX_SQL_VARIABLES = 900
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS states (
+    name TEXT PRIMARY KEY,
+    url TEXT
+);
+CREATE TABLE IF NOT EXISTS cities (
+    state TEXT NOT NULL,
+    city TEXT NOT NULL,
+    url TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL,
+    PRIMARY KEY (state, city)
+);
+CREATE INDEX IF NOT EXISTS cities_status ON cities (status);
+CREATE TABLE IF NOT EXISTS stores (
+    store_id TEXT PRIMARY KEY,
+    state TEXT,
+    city TEXT,
+    location TEXT,
+    page TEXT,
+    map TEXT,
+    lat REAL,
+    lng REAL,
+    seq INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS stores_state_city ON stores (state, city);
+CREATE INDEX IF NOT EXISTS stores_status ON stores (status);
+CREATE INDEX IF NOT EXISTS stores_seq ON stores (seq);
+CREATE INDEX IF NOT EXISTS stores_updated ON stores (status, updated_at);
+CREATE TABLE IF NOT EXISTS menu_prices (
+    store_id TEXT NOT NULL,
+    item TEXT NOT NULL,
+    price REAL,
+    category TEXT,
+    crawled_at REAL,
+    PRIMARY KEY (store_id, item)
+);
+CREATE TABLE IF NOT EXISTS price_history (
+    store_id TEXT NOT NULL,
+    item TEXT NOT NULL,
+    price REAL,
+    observed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS price_history_store_item ON price_history (store_id, item, observed_at);
+CREATE INDEX IF NOT EXISTS price_history_observed ON price_history (observed_at);
+CREATE TABLE IF NOT EXISTS retry_queue (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    payload TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error_class TEXT,
+    last_error TEXT,
+    next_attempt_at REAL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS retry_queue_due ON retry_queue (next_attempt_at);
+CREATE TABLE IF NOT EXISTS pricing_zones (
+    store_id TEXT PRIMARY KEY,
+    zone TEXT NOT NULL,
+    representative INTEGER NOT NULL DEFAULT 0,
+    last_checked REAL
+);
+CREATE INDEX IF NOT EXISTS pricing_zones_zone ON pricing_zones (zone);
+'''
+
+SNAPSHOT_TIME_FORMATS = ['%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S']
+
+def parse_snapshot_time(value):
+    """Parse a local date/time (or Unix timestamp) given on the command line"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for time_format in SNAPSHOT_TIME_FORMATS:
+        try:
+            return time.mktime(time.strptime(value, time_format))
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time {value!r} - use YYYY-MM-DD[THH:MM[:SS]] or a Unix timestamp")
+
+def split_location(location):
+    """Split a "name, city, state" location string into (state, city)"""
+    parts = location.rsplit(', ', 2)
+    if len(parts) >= 2:
+        return parts[-1], parts[-2]
+    return None, None
+
+class CrawlState:
+    """Crawl progress and results stored in one SQLite database"""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        # Databases from before price history: current prices become the baseline
+        self.conn.execute(
+            'INSERT INTO price_history (store_id, item, price, observed_at) '
+            'SELECT store_id, item, price, COALESCE(crawled_at, 0) FROM menu_prices '
+            'WHERE NOT EXISTS (SELECT 1 FROM price_history)'
+        )
+        # Stores that failed before the retry queue existed are due right away
+        self.conn.execute(
+            "INSERT OR IGNORE INTO retry_queue (kind, key, store_id, attempts, error_class, last_error, next_attempt_at) "
+            "SELECT 'store', store_id, store_id, attempts, 'Unknown', last_error, 0 FROM stores WHERE status = 'failed'"
+        )
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _next_seq(self):
+        # Caller holds self.lock. Keeps stores in discovery order for exports
+        return self.conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM stores').fetchone()[0]
+
+    # -- states and cities ---------------------------------------------------
+
+    def upsert_states(self, states):
+        """Record {state name: url} from states.json"""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT INTO states (name, url) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET url = excluded.url',
+                list(states.items())
+            )
+
+    def upsert_cities(self, groups):
+        """Record {state: {city: url}} from groups.json, keeping existing status"""
+        rows = [(state, city, url) for state, cities in groups.items() for city, url in cities.items()]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT INTO cities (state, city, url) VALUES (?, ?, ?) '
+                'ON CONFLICT(state, city) DO UPDATE SET url = excluded.url',
+                rows
+            )
+
+    def record_city(self, state, city, locations):
+        """Store a city's scraped locations and mark the city done, in one transaction"""
+        now = time.time()
+        with self.lock, self.conn:
+            seq = self._next_seq()
+            for offset, location in enumerate(locations):
+                self._upsert_store(location, state, city, seq + offset, now)
+            self.conn.execute(
+                'INSERT INTO cities (state, city, status, attempts, updated_at) VALUES (?, ?, \'done\', 1, ?) '
+                'ON CONFLICT(state, city) DO UPDATE SET status = \'done\', '
+                'attempts = attempts + 1, last_error = NULL, updated_at = excluded.updated_at',
+                (state, city, now)
+            )
+
+    def record_city_failure(self, state, city, error):
+        """Count a failed attempt at a city"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO cities (state, city, status, attempts, last_error, updated_at) '
+                'VALUES (?, ?, \'failed\', 1, ?, ?) '
+                'ON CONFLICT(state, city) DO UPDATE SET status = \'failed\', attempts = attempts + 1, '
+                'last_error = excluded.last_error, updated_at = excluded.updated_at',
+                (state, city, str(error), time.time())
+            )
+
+    def import_completed_cities(self, completed):
+        """Mark (state, city) pairs finished by an earlier, pre-database run as done"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO cities (state, city, status, attempts, updated_at) VALUES (?, ?, 'done', 1, ?) "
+                "ON CONFLICT(state, city) DO UPDATE SET status = 'done'",
+                [(state, city, now) for state, city in set(completed) if state]
+            )
+
+    def completed_cities(self):
+        """Return the set of (state, city) pairs already scraped"""
+        with self.lock:
+            rows = self.conn.execute("SELECT state, city FROM cities WHERE status = 'done'").fetchall()
+        return set(rows)
+
+    def is_city_done(self, state, city):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT status FROM cities WHERE state = ? AND city = ?', (state, city)
+            ).fetchone()
+        return row is not None and row[0] == 'done'
+
+    def pending_cities(self):
+        """Return [(state, city, url)] for cities not yet scraped"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT state, city, url FROM cities WHERE status != 'done' ORDER BY state, city"
+            ).fetchall()
+
+    # -- stores --------------------------------------------------------------
+
+    def _upsert_store(self, location, state, city, seq, now):
+        # Caller holds self.lock inside a transaction. Discovery data is
+        # refreshed but crawl status and attempts are left alone.
+        self.conn.execute(
+            'INSERT INTO stores (store_id, state, city, location, page, map, lat, lng, seq, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(store_id) DO UPDATE SET state = excluded.state, city = excluded.city, '
+            'location = excluded.location, page = excluded.page, map = excluded.map, '
+            'lat = COALESCE(excluded.lat, lat), lng = COALESCE(excluded.lng, lng), seq = COALESCE(seq, excluded.seq)',
+            (location['store_id'], state, city, location.get('location'), location.get('page'),
+             location.get('map'), location.get('lat'), location.get('lng'), seq, now)
+        )
+
+    def upsert_stores(self, locations):
+        """Record store locations (rows shaped like locations.csv)"""
+        now = time.time()
+        with self.lock, self.conn:
+            seq = self._next_seq()
+            for offset, location in enumerate(locations):
+                state, city = split_location(location.get('location', ''))
+                self._upsert_store(location, state, city, seq + offset, now)
+
+    def store_count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM stores').fetchone()[0]
+
+    def is_store_done(self, store_id):
+        with self.lock:
+            row = self.conn.execute('SELECT status FROM stores WHERE store_id = ?', (store_id,)).fetchone()
+        return row is not None and row[0] != 'pending'
+
+    def processed_store_ids(self):
+        """Return the set of store IDs whose menu crawl has finished (successfully or not)"""
+        with self.lock:
+            rows = self.conn.execute("SELECT store_id FROM stores WHERE status != 'pending'").fetchall()
+        return {row[0] for row in rows}
+
+    def pending_stores(self):
+        """Return locations.csv-shaped dicts for stores whose menu hasn't been crawled"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT store_id, location, page, map FROM stores WHERE status = 'pending' ORDER BY seq"
+            ).fetchall()
+        return [dict(zip(LOCATION_FIELDS, row)) for row in rows]
+
+    def stores_by_id(self, store_ids):
+        """Return locations.csv-shaped dicts for the given store IDs, in discovery order"""
+        wanted = list(set(store_ids))
+        rows = []
+        with self.lock:
+            # Primary key lookups, chunked under SQLite's bound-variable limit
+            for start in range(0, len(wanted), MAX_SQL_VARIABLES):
+                chunk = wanted[start:start + MAX_SQL_VARIABLES]
+                rows.extend(self.conn.execute(
+                    f"SELECT seq, store_id, location, page, map FROM stores "
+                    f"WHERE store_id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+        rows.sort(key=lambda row: (row[0] is None, row[0] or 0))
+        return [dict(zip(LOCATION_FIELDS, row[1:])) for row in rows]
+
+    def mark_stores_processed(self, store_ids, status='done'):
+        """Mark stores as crawled without recording prices (used when importing old runs)"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'UPDATE stores SET status = ?, updated_at = ? WHERE store_id = ?',
+                [(status, now, store_id) for store_id in store_ids]
+            )
+
+    def stale_stores(self, max_age, limit=None):
+        """Return crawled stores whose menu is older than max_age seconds, oldest first"""
+        query = ("SELECT store_id, location, page, map FROM stores "
+                 "WHERE status != 'pending' AND COALESCE(updated_at, 0) < ? ORDER BY updated_at")
+        params = [time.time() - max_age]
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(zip(LOCATION_FIELDS, row)) for row in rows]
+
+    def record_menu_results(self, store_results):
+        """Save a batch of menu crawl results (status, attempts and prices) in one transaction
+
+        Only prices that differ from the store's current ones are added to
+        price_history. Failed stores, and failed categories of stores that
+        otherwise succeeded, are queued for retry; stores and categories
+        that now succeeded are taken off the queue.
+
+        A result with partial set only covers some of the store's categories
+        (a category retry), so items missing from it are not treated as
+        removed.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            for result in store_results:
+                store_id = result['store_id']
+                if result['success']:
+                    self._record_store_status(store_id, result, 'done', now)
+                    self.conn.execute("DELETE FROM retry_queue WHERE kind = 'store' AND key = ?", (store_id,))
+                    self._record_category_retries(result, now)
+                    menu_items = result.get('menu_items') or {}
+                    if menu_items:
+                        complete = not result.get('partial') and not result.get('failed_categories')
+                        self._record_prices(store_id, menu_items, now, record_removals=complete)
+                else:
+                    self._record_store_status(store_id, result, 'failed', now)
+                    self._enqueue_retry('store', store_id, store_id, None, result, now)
+
+    def _record_store_status(self, store_id, result, status, now):
+        # Caller holds self.lock inside a transaction
+        self.conn.execute(
+            'INSERT INTO stores (store_id, location, status, attempts, last_error, updated_at) '
+            'VALUES (?, ?, ?, 1, ?, ?) '
+            'ON CONFLICT(store_id) DO UPDATE SET status = excluded.status, '
+            'attempts = attempts + 1, last_error = excluded.last_error, updated_at = excluded.updated_at',
+            (store_id, result.get('location'), status, result.get('error'), now)
+        )
+
+    def _record_category_retries(self, result, now):
+        # Caller holds self.lock inside a transaction
+        store_id = result['store_id']
+        failed = {category['url']: category for category in result.get('failed_categories') or []}
+        if result.get('partial'):
+            succeeded = [url for url in result.get('retried_categories') or [] if url not in failed]
+            self.conn.executemany(
+                "DELETE FROM retry_queue WHERE kind = 'category' AND key = ?", [(url,) for url in succeeded]
+            )
+        else:
+            # A full crawl re-fetched every category - keep only the ones still failing
+            for key, in self.conn.execute(
+                "SELECT key FROM retry_queue WHERE kind = 'category' AND store_id = ?", (store_id,)
+            ).fetchall():
+                if key not in failed:
+                    self.conn.execute("DELETE FROM retry_queue WHERE kind = 'category' AND key = ?", (key,))
+        for url, category in failed.items():
+            payload = {field: category.get(field) for field in ('name', 'url', 'description')}
+            self._enqueue_retry('category', url, store_id, payload, category, now)
+
+    def _enqueue_retry(self, kind, key, store_id, payload, failure, now):
+        # Caller holds self.lock inside a transaction
+        row = self.conn.execute('SELECT attempts FROM retry_queue WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        self.conn.execute(
+            'INSERT OR REPLACE INTO retry_queue '
+            '(kind, key, store_id, payload, attempts, error_class, last_error, next_attempt_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (kind, key, store_id, json.dumps(payload) if payload is not None else None, attempts,
+             failure.get('error_class') or 'Unknown', failure.get('error'), now + delay)
+        )
+
+    def due_retries(self, include_all=False):
+        """Return queued retries as dicts, oldest due first
+
+        By default only entries whose backoff has expired and that still have
+        attempts left are returned; include_all returns the whole queue.
+        """
+        query = ('SELECT kind, key, store_id, payload, attempts, error_class, last_error, next_attempt_at '
+                 'FROM retry_queue')
+        params = []
+        if not include_all:
+            query += ' WHERE next_attempt_at <= ? AND attempts < ?'
+            params = [time.time(), MAX_RETRY_ATTEMPTS]
+        query += ' ORDER BY next_attempt_at'
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        fields = ['kind', 'key', 'store_id', 'payload', 'attempts', 'error_class', 'last_error', 'next_attempt_at']
+        entries = []
+        for row in rows:
+            entry = dict(zip(fields, row))
+            entry['payload'] = json.loads(entry['payload']) if entry['payload'] else None
+            entries.append(entry)
+        return entries
+
+    def retry_summary(self):
+        """Return a one-line count of queued retries by kind and error class"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT kind, error_class, COUNT(*), SUM(attempts >= ?) FROM retry_queue '
+                'GROUP BY kind, error_class ORDER BY kind, COUNT(*) DESC',
+                (MAX_RETRY_ATTEMPTS,)
+            ).fetchall()
+        if not rows:
+            return 'Retry queue: empty'
+        parts = [
+            f"{count} {kind} ({error_class}{f', {exhausted} out of attempts' if exhausted else ''})"
+            for kind, error_class, count, exhausted in rows
+        ]
+        return 'Retry queue: ' + ', '.join(parts)
+
+    def _record_prices(self, store_id, menu_items, now, record_removals=True):
+        # Caller holds self.lock inside a transaction
+        current = dict(self.conn.execute(
+            'SELECT item, price FROM menu_prices WHERE store_id = ?', (store_id,)
+        ).fetchall())
+
+        deltas = [
+            (store_id, item_name, item_data.get('price'), now)
+            for item_name, item_data in menu_items.items()
+            if item_name not in current or current[item_name] != item_data.get('price')
+        ]
+        removed = [item_name for item_name in current if item_name not in menu_items] if record_removals else []
+        deltas.extend((store_id, item_name, None, now) for item_name in removed)
+
+        self.conn.executemany(
+            'INSERT INTO price_history (store_id, item, price, observed_at) VALUES (?, ?, ?, ?)', deltas
+        )
+        self.conn.executemany(
+            'DELETE FROM menu_prices WHERE store_id = ? AND item = ?',
+            [(store_id, item_name) for item_name in removed]
+        )
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO menu_prices (store_id, item, price, category, crawled_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [
+                (store_id, item_name, item_data.get('price'), item_data.get('category', ''), now)
+                for item_name, item_data in menu_items.items()
+            ]
+        )
+
+    def prices_at(self, timestamp):
+        """Reconstruct {store_id: {item: price}} as it stood at a Unix timestamp"""
+        prices = {}
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT h.store_id, h.item, h.price FROM price_history h '
+                'JOIN (SELECT store_id, item, MAX(observed_at) AS observed_at FROM price_history '
+                '      WHERE observed_at <= ? GROUP BY store_id, item) latest '
+                'ON h.store_id = latest.store_id AND h.item = latest.item AND h.observed_at = latest.observed_at',
+                (timestamp,)
+            ).fetchall()
+        for store_id, item, price in rows:
+            store_prices = prices.setdefault(store_id, {})
+            if price is not None:
+                store_prices[item] = price
+        return prices
+
+    # -- pricing zones -------------------------------------------------------
+
+    def save_pricing_zones(self, assignments):
+        """Replace the pricing zones with [(store_id, zone, representative)] assignments"""
+        with self.lock, self.conn:
+            # Keep each store's spot-check history across re-analysis
+            last_checked = dict(self.conn.execute('SELECT store_id, last_checked FROM pricing_zones'))
+            self.conn.execute('DELETE FROM pricing_zones')
+            self.conn.executemany(
+                'INSERT INTO pricing_zones (store_id, zone, representative, last_checked) VALUES (?, ?, ?, ?)',
+                [
+                    (store_id, zone, int(representative), last_checked.get(store_id))
+                    for store_id, zone, representative in assignments
+                ]
+            )
+
+    def pricing_zones(self):
+        """Return {zone: [(store_id, representative, last_checked)]}"""
+        zones = {}
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT zone, store_id, representative, last_checked FROM pricing_zones ORDER BY zone'
+            ).fetchall()
+        for zone, store_id, representative, last_checked in rows:
+            zones.setdefault(zone, []).append((store_id, bool(representative), last_checked))
+        return zones
+
+    def mark_zone_checked(self, store_ids):
+        """Record that these stores were re-crawled by a zone refresh"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'UPDATE pricing_zones SET last_checked = ? WHERE store_id = ?',
+                [(now, store_id) for store_id in store_ids]
+            )
+
+    # -- import / export -----------------------------------------------------
+
+    def import_data_files(self, data_dir='data'):
+        """Seed the database from existing states.json, groups.json, locations.csv and menu.csv"""
+        states_path = os.path.join(data_dir, 'states.json')
+        if os.path.exists(states_path):
+            with open(states_path, 'r') as f:
+                self.upsert_states(json.load(f))
+
+        groups_path = os.path.join(data_dir, 'groups.json')
+        if os.path.exists(groups_path):
+            with open(groups_path, 'r') as f:
+                self.upsert_cities(json.load(f))
+
+        locations_path = os.path.join(data_dir, 'locations.csv')
+        if os.path.exists(locations_path):
+            with open(locations_path, 'r', encoding='utf-8') as f:
+                locations = list(csv.DictReader(f))
+            self.upsert_stores(locations)
+            # A city with stores in locations.csv was completed by an earlier run
+            self.import_completed_cities(split_location(location['location']) for location in locations)
+
+        menu_path = os.path.join(data_dir, 'menu.csv')
+        if os.path.exists(menu_path):
+            with open(menu_path, 'r', encoding='utf-8') as f:
+                # All-empty rows are failed stores from older runs - leave them pending
+                self.mark_stores_processed(
+                    row['store_id'] for row in csv.DictReader(f)
+                    if any(value for field, value in row.items() if field != 'store_id')
+                )
+
+    def export_locations_csv(self, path='data/locations.csv'):
+        """Write locations.csv from the database (temp file + rename)"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT store_id, location, page, map FROM stores WHERE page IS NOT NULL ORDER BY seq'
+            ).fetchall()
+        if not rows:
+            # Never replace real data with an empty export
+            return 0
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(LOCATION_FIELDS)
+            writer.writerows(rows)
+        os.replace(temp_path, path)
+        return len(rows)
+
+    def export_groups_json(self, path='data/groups.json'):
+        """Write groups.json ({state: {city: url}}) from the database"""
+        groups = {}
+        with self.lock:
+            rows = self.conn.execute('SELECT state, city, url FROM cities WHERE url IS NOT NULL ORDER BY rowid').fetchall()
+        for state, city, url in rows:
+            groups.setdefault(state, {})[city] = url
+        if not groups:
+            return 0
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(groups, f, indent=2)
+        os.replace(temp_path, path)
+        return len(rows)
+
+    def export_states_json(self, path='data/states.json'):
+        """Write states.json ({state: url}) from the database"""
+        with self.lock:
+            states = dict(self.conn.execute('SELECT name, url FROM states ORDER BY rowid').fetchall())
+        if not states:
+            return 0
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(states, f, indent=2)
+        os.replace(temp_path, path)
+        return len(states)
+
+    def export_menu_csv(self, path='data/menu.csv', at=None):
+        """Write the wide store x item menu.csv from the recorded prices, or as of a timestamp"""
+        if at is not None:
+            prices = self.prices_at(at)
+            with self.lock:
+                stores = [row[0] for row in self.conn.execute('SELECT store_id FROM stores ORDER BY seq')]
+            stores = [store_id for store_id in stores if store_id in prices]
+            items = sorted({item for store_prices in prices.values() for item in store_prices})
+        else:
+            with self.lock:
+                items = [row[0] for row in self.conn.execute('SELECT DISTINCT item FROM menu_prices ORDER BY item')]
+                stores = [row[0] for row in self.conn.execute(
+                    "SELECT store_id FROM stores WHERE status = 'done' ORDER BY seq"
+                )]
+                prices = {}
+                for store_id, item, price in self.conn.execute('SELECT store_id, item, price FROM menu_prices'):
+                    prices.setdefault(store_id, {})[item] = price
+        if not stores:
+            return 0, 0
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['store_id'] + items)
+            for store_id in stores:
+                store_prices = prices.get(store_id, {})
+                writer.writerow([store_id] + [
+                    store_prices[item] if store_prices.get(item) is not None else '' for item in items
+                ])
+        os.replace(temp_path, path)
+        return len(stores), len(items)
+
+    def summary(self):
+        """Return a short progress report"""
+        with self.lock:
+            cities = dict(self.conn.execute('SELECT status, COUNT(*) FROM cities GROUP BY status').fetchall())
+            stores = dict(self.conn.execute('SELECT status, COUNT(*) FROM stores GROUP BY status').fetchall())
+            prices = self.conn.execute('SELECT COUNT(*) FROM menu_prices').fetchone()[0]
+            changes = self.conn.execute('SELECT COUNT(*) FROM price_history').fetchone()[0]
+        return (f"Cities: {cities or 'none'}\n"
+                f"Stores: {stores or 'none'}\n"
+                f"Menu prices: {prices} (price history: {changes} changes)\n"
+                f"{self.retry_summary()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the SQLite crawl state database")
+    parser.add_argument('command', choices=['import', 'export', 'status', 'snapshot'])
+    parser.add_argument('--db', default=DEFAULT_STATE_PATH, help="Path to the state database")
+    parser.add_argument('--data-dir', default='data', help="Directory holding the CSV/JSON files")
+    parser.add_argument('--at', help="Snapshot time: YYYY-MM-DD[THH:MM[:SS]] local time, or a Unix timestamp")
+    parser.add_argument('--out', help="Snapshot output path (default: data/menu_<time>.csv)")
+    args = parser.parse_args()
+
+    state = CrawlState(args.db)
+    if args.command == 'import':
+        state.import_data_files(args.data_dir)
+        print(f"Imported {args.data_dir}/ into {args.db}")
+    elif args.command == 'export':
+        state.export_states_json(os.path.join(args.data_dir, 'states.json'))
+        state.export_groups_json(os.path.join(args.data_dir, 'groups.json'))
+        count = state.export_locations_csv(os.path.join(args.data_dir, 'locations.csv'))
+        stores, items = state.export_menu_csv(os.path.join(args.data_dir, 'menu.csv'))
+        print(f"Exported {count} locations and {stores} store menus ({items} items) to {args.data_dir}/")
+    elif args.command == 'snapshot':
+        at = parse_snapshot_time(args.at) if args.at else time.time()
+        out = args.out or os.path.join(args.data_dir, time.strftime('menu_%Y%m%dT%H%M%S.csv', time.localtime(at)))
+        stores, items = state.export_menu_csv(out, at=at)
+        print(f"Wrote prices as of {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(at))}: "
+              f"{stores} stores, {items} items to {out}")
+    print(state.summary())
+    state.close()
+
+if __name__ == "__main__":
+    main()
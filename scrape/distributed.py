@@ -0,0 +1,389 @@
+import argparse
+import heapq
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import brands
+import http_client
+import menu
+from checkpoint import LocationCheckpoint
+from crawl_state import CrawlState, split_location
+from locations import load_existing_locations, scrape_locations_from_city
+from menu_journal import compact_journal
+from sharding import STRATEGIES, make_shards
+from work_queue import DEFAULT_LEASE_SECONDS, WorkQueue
+
+# Coordinator / worker mode for the menu and location crawls.
+#
+# One machine's connections and one IP's rate budget cap a single-process
+# crawl, so the work can be spread over several worker processes - on one
+# host, or on several hosts sharing the data/ directory. Each run covers one
+# brand (--brand, default Taco Bell); its queue, shard files and outputs live
+# in that brand's data directory (see brands.py):
+#
+# 1. plan   - the coordinator shards the pending stores (menu job) or cities
+#             (locations job) by consistent hash or by expected stores per
+#             state (see sharding.py) and puts the shards in the work queue
+# 2. worker - each worker leases a shard, heartbeats while crawling it and
+#             writes the shard's results, sorted by key, to one JSON-lines file
+#             under <data dir>/shards/<job>/; a dead worker's lease expires and the
+#             shard is crawled again by someone else (see work_queue.py)
+# 3. merge  - the coordinator k-way merges the sorted shard files into the
+#             usual outputs: the menu journal, menu.csv, the crawl state
+#             database (and its retry queue) and images for the menu job;
+#             locations.csv and the crawl state for the locations job. Each
+#             shard is merged once, so a --partial merge while workers are
+#             still running can be followed by a full one
+#
+# Workers only write their own shard files and the queue, never the shared
+# outputs, so there's nothing for them to contend on. They don't use the
+# response cache or download images either - merge does the images.
+#
+#   python scrape/distributed.py local --job menu --workers 4 --shards 32
+#   python scrape/distributed.py local --job menu --brand <brand>
+#   python scrape/distributed.py plan --job locations --strategy state --shards 16
+#   python scrape/distributed.py worker --job locations     # on every worker host
+#   python scrape/distributed.py status --job locations
+#   python scrape/distributed.py merge --job locations
+
+JOBS = ('menu', 'locations')
+
+# Results handed to save_batch_results / the image store at a time during merge
+MERGE_BATCH = 100
+# How often an idle worker checks for expired leases to take over
+POLL_INTERVAL = 5.0
+
+# -- jobs ----------------------------------------------------------------------
+
+def menu_units(crawl_state, brand):
+    """Pending stores, as locations.csv-shaped dicts tagged with their brand"""
+    crawl_state.upsert_stores(menu.load_all_locations(brand))
+    return brands.tag_brand(crawl_state.pending_stores(), brand)
+
+def location_units(crawl_state, brand):
+    """Cities not yet scraped, weighted by the stores they had last time (1 for new cities)"""
+    with open(brand.groups_path, 'r') as f:
+        crawl_state.upsert_cities(json.load(f))
+    known = {}
+    for location in load_existing_locations(brand):
+        state, city = split_location(location['location'])
+        known[(state, city)] = known.get((state, city), 0) + 1
+    return [
+        {'state': state, 'city': city, 'url': url, 'stores': known.get((state, city), 1)}
+        for state, city, url in crawl_state.pending_cities()
+    ]
+
+def crawl_menu_shard(units, args, lost):
+    """Crawl a shard's stores in batches; stops early if the lease is lost"""
+    results = []
+    for i in range(0, len(units), args.batch_size):
+        if lost.is_set():
+            break
+        results.extend(menu.process_batch_fully_parallel(units[i:i + args.batch_size], download_images=False))
+    return results
+
+def crawl_locations_shard(units, args, lost):
+    """Scrape a shard's cities; stops early if the lease is lost"""
+    brand = brands.get_brand(args.brand)
+    records = []
+    for unit in units:
+        if lost.is_set():
+            break
+        try:
+            locations = scrape_locations_from_city(unit['url'], unit['state'], unit['city'], brand)
+        except Exception as e:
+            # Merged as a failure, so the city stays pending for the next plan
+            records.append({'state': unit['state'], 'city': unit['city'], 'error': str(e)})
+            continue
+        records.append({'state': unit['state'], 'city': unit['city'], 'locations': locations})
+    return records
+
+def merge_menu(records, crawl_state, args):
+    """Journal and record merged store results, then rebuild menu.csv"""
+    brand = brands.get_brand(args.brand)
+    stores = 0
+    batch = []
+
+    def flush():
+        menu.save_batch_results(batch, crawl_state)
+        if not args.skip_images:
+            menu.save_result_images(batch)
+        batch.clear()
+
+    for result in records:
+        batch.append(result)
+        stores += 1
+        if len(batch) >= MERGE_BATCH:
+            flush()
+    if batch:
+        flush()
+
+    total, items = compact_journal(brand.journal_path, brand.menu_csv_path)
+    print(f"Merged {stores} stores; compacted journal into {brand.menu_csv_path}: {total} stores, {items} items")
+
+def merge_locations(records, crawl_state, args):
+    """Feed merged cities through the location checkpoint into locations.csv and the crawl state"""
+    brand = brands.get_brand(args.brand)
+    checkpoint = LocationCheckpoint(brand.locations_csv_path, brand.locations_journal_path,
+                                    existing_rows=load_existing_locations(brand), crawl_state=crawl_state,
+                                    fields=brand.location_fields)
+    cities = 0
+    failed = 0
+    for record in records:
+        if 'error' in record:
+            crawl_state.record_city_failure(record['state'], record['city'], record['error'])
+            failed += 1
+            continue
+        checkpoint.add_city(record['state'], record['city'], record['locations'])
+        cities += 1
+    checkpoint.close()
+    print(f"Merged {cities} cities ({failed} failed); {checkpoint.total} locations in {brand.locations_csv_path}")
+
+# Per job: units to plan, sort key, shard crawler, merger
+JOB_SPECS = {
+    'menu': {
+        'units': menu_units,
+        'key': lambda unit: unit['store_id'],
+        'state': lambda unit: split_location(unit['location'])[0],
+        'weight': lambda unit: 1,
+        'crawl': crawl_menu_shard,
+        'merge': merge_menu
+    },
+    'locations': {
+        'units': location_units,
+        'key': lambda unit: f"{unit['state']}\0{unit['city']}",
+        'state': lambda unit: unit['state'],
+        'weight': lambda unit: unit['stores'],
+        'crawl': crawl_locations_shard,
+        'merge': merge_locations
+    }
+}
+
+# -- coordinator ---------------------------------------------------------------
+
+def queue_path_for(brand):
+    """Default work queue database of a brand's distributed crawls"""
+    return os.path.join(brand.data_dir, 'work_queue.sqlite')
+
+def shard_dir(job, brand):
+    return os.path.join(brand.data_dir, 'shards', job)
+
+def plan(job, shards, strategy, queue_path, state_path, brand):
+    """Shard the job's pending work units into the queue; returns the number of shards"""
+    spec = JOB_SPECS[job]
+    crawl_state = CrawlState(state_path)
+    units = spec['units'](crawl_state, brand)
+    crawl_state.close()
+
+    planned = make_shards(units, shards, strategy, spec['key'], spec['state'], spec['weight'])
+    queue = WorkQueue(queue_path)
+    queue.create_job(job, planned, strategy)
+    queue.close()
+
+    # Result files from an earlier plan belong to different shards
+    directory = shard_dir(job, brand)
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            os.remove(os.path.join(directory, filename))
+
+    sizes = sorted(len(shard) for shard in planned)
+    if sizes:
+        print(f"Planned {brand.display_name} {job}: {len(units)} units in {len(planned)} shards "
+              f"(smallest {sizes[0]}, largest {sizes[-1]}, {strategy} sharding)")
+    else:
+        print(f"Nothing to plan for {brand.display_name} {job} - no pending work")
+    return len(planned)
+
+def iter_shard_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def merged_records(paths, key):
+    """k-way merge of sorted shard files, keeping the first record of any duplicate key"""
+    last = None
+    for record in heapq.merge(*(iter_shard_file(path) for path in paths), key=key):
+        if last is not None and key(record) == last:
+            continue
+        last = key(record)
+        yield record
+
+def merge(job, args, queue_path, state_path, partial=False):
+    """Merge every finished shard of a job into the final outputs"""
+    queue = WorkQueue(queue_path)
+    if not queue.is_finished(job) and not partial:
+        print(f"{queue.summary(job)}\nNot merging until every shard is finished (use --partial to merge anyway)")
+        queue.close()
+        return False
+
+    spec = JOB_SPECS[job]
+    # Shards already merged by an earlier --partial merge are skipped
+    results = [(shard, path) for shard, path in queue.unmerged_results(job) if os.path.exists(path)]
+    crawl_state = CrawlState(state_path)
+    spec['merge'](merged_records([path for _, path in results], spec['key']), crawl_state, args)
+    crawl_state.close()
+    queue.mark_shards_merged(job, [shard for shard, _ in results])
+
+    failed = queue.failed_units(job)
+    if failed:
+        print(f"{len(failed)} units were in shards that ran out of attempts - they stay pending for the next plan")
+    if queue.is_finished(job):
+        queue.mark_merged(job)
+    queue.close()
+    return True
+
+# -- worker --------------------------------------------------------------------
+
+class Heartbeat:
+    """Keeps a shard's lease alive from a background thread; sets lost if it can't"""
+
+    def __init__(self, queue_path, job, shard, token, lease_seconds):
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, args=(queue_path, job, shard, token, lease_seconds),
+            name=f'heartbeat-{job}-{shard}', daemon=True
+        )
+        self.thread.start()
+
+    def _run(self, queue_path, job, shard, token, lease_seconds):
+        # SQLite connections belong to the thread that opened them
+        queue = WorkQueue(queue_path)
+        try:
+            while not self.stopped.wait(lease_seconds / 3):
+                if not queue.heartbeat(job, shard, token, lease_seconds):
+                    self.lost.set()
+                    return
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+def write_shard_file(job, shard, records, key, worker_id, brand):
+    """Write a shard's records sorted by key, atomically; returns the path"""
+    directory = shard_dir(job, brand)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"shard-{shard:05d}.jsonl")
+    temp_path = f"{path}.{worker_id}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for record in sorted(records, key=key):
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    os.replace(temp_path, path)
+    return path
+
+def run_worker(job, args, queue_path):
+    """Lease and crawl shards until the job has none left; returns the shards this worker finished"""
+    spec = JOB_SPECS[job]
+    brand = brands.get_brand(args.brand)
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(queue_path)
+    finished = 0
+    while True:
+        lease = queue.lease(job, worker_id, args.lease)
+        if lease is None:
+            if queue.is_finished(job):
+                break
+            # Other workers hold the remaining shards - take over any whose lease expires
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        shard, token, units = lease
+        print(f"[{worker_id}] shard {shard}: {len(units)} units")
+        heartbeat = Heartbeat(queue_path, job, shard, token, args.lease)
+        try:
+            records = spec['crawl'](units, args, heartbeat.lost)
+            if heartbeat.lost.is_set():
+                print(f"[{worker_id}] lost the lease on shard {shard} - dropping its results")
+                continue
+            path = write_shard_file(job, shard, records, spec['key'], worker_id, brand)
+            heartbeat.stop()
+            if queue.complete(job, shard, token, path):
+                finished += 1
+            else:
+                print(f"[{worker_id}] shard {shard} was taken over before it finished")
+        except Exception as e:
+            heartbeat.stop()
+            queue.release(job, shard, token, e)
+            print(f"[{worker_id}] shard {shard} failed: {e}")
+        finally:
+            heartbeat.stop()
+    queue.close()
+    print(f"[{worker_id}] done - finished {finished} shards")
+    return finished
+
+def run_local(job, args):
+    """Plan (unless an unmerged plan exists), run args.workers worker processes on this host, then merge"""
+    queue = WorkQueue(args.queue)
+    # A finished but unmerged plan is kept - its shard files just need merging
+    fresh = args.replan or not queue.counts(job) or queue.is_merged(job)
+    queue.close()
+    if fresh and not plan(job, args.shards, args.strategy, args.queue, args.db, brands.get_brand(args.brand)):
+        return
+
+    # The workers share this host's IP, so they split its rate budget
+    worker_rate = args.rate / args.workers
+    command = [
+        sys.executable, os.path.abspath(__file__), 'worker', '--job', job,
+        '--brand', args.brand, '--queue', args.queue, '--lease', str(args.lease),
+        '--batch-size', str(args.batch_size), '--rate', str(worker_rate)
+    ]
+    host = socket.gethostname()
+    workers = [
+        subprocess.Popen(command + ['--worker-id', f"{host}-{number}"])
+        for number in range(args.workers)
+    ]
+    for worker in workers:
+        worker.wait()
+    merge(job, args, args.queue, args.db)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the menu or location crawl as a coordinator and several workers")
+    parser.add_argument('command', choices=['plan', 'worker', 'merge', 'status', 'local'])
+    parser.add_argument('--job', choices=JOBS, default='menu', help="Which crawl to distribute (default: menu)")
+    parser.add_argument('--brand', choices=sorted(brands.BRANDS), default=brands.DEFAULT_BRAND,
+                        help=f"Brand to crawl (default: {brands.DEFAULT_BRAND})")
+    parser.add_argument('--queue', help="Path to the shared work queue database (default: in the brand's data directory)")
+    parser.add_argument('--db', help="Path to the crawl state database (default: the brand's)")
+    parser.add_argument('--shards', type=int, default=32, help="Number of shards to plan (default: 32)")
+    parser.add_argument('--strategy', choices=STRATEGIES, default='hash',
+                        help="hash: consistent hash of the store/city; state: balance expected stores per state")
+    parser.add_argument('--workers', type=int, default=4, help="Worker processes started by 'local' (default: 4)")
+    parser.add_argument('--worker-id', help="Name this worker reports in the queue (default: host-pid)")
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f"Seconds a shard lease lasts without a heartbeat (default: {DEFAULT_LEASE_SECONDS})")
+    parser.add_argument('--batch-size', type=int, default=5, help="Stores crawled at once by a menu worker (default: 5)")
+    parser.add_argument('--rate', type=float, default=http_client.DEFAULT_RATE,
+                        help="Requests per second per host for a worker; 'local' divides it among its workers")
+    parser.add_argument('--skip-images', action='store_true', help="Don't download item images while merging")
+    parser.add_argument('--partial', action='store_true', help="Merge the finished shards even if others are still running")
+    parser.add_argument('--replan', action='store_true', help="'local': discard an unfinished plan and shard again")
+    args = parser.parse_args()
+    brand = brands.get_brand(args.brand)
+    args.queue = args.queue or queue_path_for(brand)
+    args.db = args.db or brand.state_path
+    os.makedirs(brand.data_dir, exist_ok=True)
+
+    http_client.configure_rate_limit(args.rate)
+
+    if args.command == 'plan':
+        plan(args.job, args.shards, args.strategy, args.queue, args.db, brand)
+    elif args.command == 'worker':
+        run_worker(args.job, args, args.queue)
+    elif args.command == 'merge':
+        merge(args.job, args, args.queue, args.db, partial=args.partial)
+    elif args.command == 'local':
+        run_local(args.job, args)
+
+    queue = WorkQueue(args.queue)
+    print(queue.summary(args.job))
+    queue.close()
+
+if __name__ == "__main__":
+    main()
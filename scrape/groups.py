@@ -1,36 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import http_client
+import brands
 import json
-import time
-import re
 import os
 
-def clean_name(name):
-    """Remove the count numbers in parentheses from names"""
-    return re.sub(r'\(\d+\)$', '', name).strip()
-
-def scrape_locations_from_state(state_url, state_name):
+def scrape_locations_from_state(state_url, state_name, brand=None):
     """Scrape all location links from a state page"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
+    brand = brand or brands.get_brand()
     try:
-        response = requests.get(state_url, headers=headers)
+        response = http_client.get(state_url)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        directory_container = soup.find('div', class_='directory-container')
-        
-        locations = {}
-        
-        if directory_container:
-            location_links = directory_container.find_all('a', class_='DirLinks')
-            
-            for link in location_links:
-                location_name = clean_name(link.get_text(strip=True))
-                location_url = f"https://locations.tacobell.com/{link.get('href', '')}"
-                locations[location_name] = location_url
+        locations = brand.parse_directory(response.text)
         
         print(f"Found {len(locations)} locations in {state_name}")
         return locations
@@ -39,33 +20,37 @@ def scrape_locations_from_state(state_url, state_name):
         print(f"Error scraping {state_name}: {e}")
         return {}
 
-def scrape_all_locations():
+def scrape_all_locations(brand=None):
     """Loop through all states and scrape their locations"""
-    # Load the states from data/states.json
-    with open('data/states.json', 'r') as f:
+    brand = brand or brands.get_brand()
+    # Load the states from states.json
+    with open(brand.states_path, 'r') as f:
         states = json.load(f)
     
     all_locations = {}
     
     # Loop through each state
     for state_name, state_url in states.items():
-        clean_state = clean_name(state_name)
+        clean_state = brands.clean_name(state_name)
         print(f"\nScraping {clean_state}...")
-        locations = scrape_locations_from_state(state_url, clean_state)
+        locations = scrape_locations_from_state(state_url, clean_state, brand)
         all_locations[clean_state] = locations
-          # Be polite and add a small delay between requests
-        time.sleep(1)
     
     # Create data folder if it doesn't exist
-    os.makedirs('data', exist_ok=True)
+    os.makedirs(brand.data_dir, exist_ok=True)
     
-    # Save all locations to data/group.json
-    with open('data/groups.json', 'w') as f:
+    # Save all locations to groups.json
+    with open(brand.groups_path, 'w') as f:
         json.dump(all_locations, f, indent=2)
     
     total_count = sum(len(locs) for locs in all_locations.values())
     print(f"\nScraping complete! Total locations found: {total_count}")
-    print(f"Data saved to data/group.json")
+    print(f"Data saved to {brand.groups_path}")
 
 if __name__ == "__main__":
-    scrape_all_locations()
+    parser = argparse.ArgumentParser(description="Scrape the city directory of every state in a brand's states.json")
+    parser.add_argument('--brand', choices=sorted(brands.BRANDS), default=brands.DEFAULT_BRAND,
+                        help=f"Brand to scrape (default: {brands.DEFAULT_BRAND})")
+    args = parser.parse_args()
+    http_client.enable_cache()
+    scrape_all_locations(brands.get_brand(args.brand))
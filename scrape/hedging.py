@@ -0,0 +1,252 @@
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from concurrency import percentile
+
+# Adaptive timeouts and hedged requests.
+#
+# Each host keeps a rolling window of request latencies. Once there are
+# enough samples, the per-request timeout becomes a multiple of the observed
+# p99 (clamped to sane bounds) instead of a fixed 10 seconds, and a request
+# still outstanding after the host's p95 gets a second copy - whichever
+# answers first wins and the other is cancelled (asyncio) or discarded when
+# it lands (threads). Hedges are paid for out of a budget that refills by a
+# fixed share of all requests, so hedging can never more than slightly
+# increase the load on the server, even when the host slows down as a whole.
+#
+# The hedge clock only starts once a request is on the wire: send() gets an
+# on_wire callback to call after it has its rate-limit token and concurrency
+# slot. Time queued behind those is our own backlog, not server latency - a
+# hedge fired for it would only queue behind the same limits.
+
+WINDOW = 500
+MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 95
+TIMEOUT_PERCENTILE = 99
+TIMEOUT_MULTIPLIER = 3.0
+MIN_TIMEOUT = 2.0
+MAX_TIMEOUT = 30.0
+
+DEFAULT_HEDGE_RATIO = 0.05
+DEFAULT_HEDGE_BURST = 10
+
+class LatencyTracker:
+    """Rolling window of one host's request latencies"""
+
+    def __init__(self, window=WINDOW, min_samples=MIN_SAMPLES):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        # Percentiles are recomputed every few samples rather than per request
+        self.cached = None
+        self.since_update = 0
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.since_update += 1
+
+    def percentiles(self):
+        """Return (p95, p99), or None until there are enough samples"""
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            if self.cached is None or self.since_update >= 10:
+                samples = list(self.samples)
+                self.cached = (percentile(samples, HEDGE_PERCENTILE), percentile(samples, TIMEOUT_PERCENTILE))
+                self.since_update = 0
+            return self.cached
+
+class HedgeBudget:
+    """Allows hedges for at most ratio of all requests, plus a small burst"""
+
+    def __init__(self, ratio=DEFAULT_HEDGE_RATIO, burst=DEFAULT_HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = float(burst)
+        self.lock = threading.Lock()
+
+    def note_request(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self):
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+def _on_wire_ignored():
+    # on_wire for sends whose start nobody waits on
+    pass
+
+def _discard(future):
+    # Close the losing copy's response so its connection goes back to the pool
+    if not future.cancelled() and future.exception() is None:
+        response = future.result()
+        if hasattr(response, 'close'):
+            response.close()
+
+class Hedger:
+    """Adaptive timeouts and hedged sends for every host"""
+
+    def __init__(self, ratio=DEFAULT_HEDGE_RATIO, burst=DEFAULT_HEDGE_BURST,
+                 default_timeout=10, max_workers=256):
+        self.budget = HedgeBudget(ratio, burst)
+        self.default_timeout = default_timeout
+        self.max_workers = max_workers
+        self.trackers = {}
+        self.lock = threading.Lock()
+        self.executor = None
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    @property
+    def enabled(self):
+        return self.budget.ratio > 0
+
+    def configure(self, ratio, burst=None):
+        """Change the hedge budget; a ratio of 0 turns hedging off"""
+        self.budget = HedgeBudget(ratio, burst if burst is not None else self.budget.burst)
+
+    def tracker(self, host):
+        with self.lock:
+            tracker = self.trackers.get(host)
+            if tracker is None:
+                tracker = LatencyTracker()
+                self.trackers[host] = tracker
+            return tracker
+
+    def timeout(self, host):
+        """Per-request timeout for host: TIMEOUT_MULTIPLIER x p99, or the default until warmed up"""
+        stats = self.tracker(host).percentiles()
+        if stats is None:
+            return self.default_timeout
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, stats[1] * TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self, host):
+        """Seconds to wait before hedging a request to host, or None while warming up"""
+        stats = self.tracker(host).percentiles()
+        return stats[0] if stats is not None else None
+
+    def _count(self, field):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def record(self, host, seconds):
+        """Feed one request's time on the wire into the host's latency window"""
+        self.tracker(host).record(seconds)
+
+    def _pool(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hedge')
+            return self.executor
+
+    def run(self, host, send):
+        """Call send(on_wire) (a blocking request), hedging it with a second call if it runs past p95
+
+        send must call on_wire() once it has been throttled and holds its
+        concurrency slot, right before the request goes out, and should
+        report its time on the wire with record().
+        """
+        self._count('requests')
+        self.budget.note_request()
+        delay = self.hedge_delay(host)
+        if not self.enabled or delay is None:
+            return send(_on_wire_ignored)
+
+        executor = self._pool()
+        on_wire = threading.Event()
+        primary = executor.submit(send, on_wire.set)
+        # A send that fails before reaching the wire mustn't leave us waiting
+        primary.add_done_callback(lambda _: on_wire.set())
+        on_wire.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        if not self.budget.try_spend():
+            self._count('denied')
+            return primary.result()
+
+        self._count('hedged')
+        backup = executor.submit(send, _on_wire_ignored)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                if future is backup:
+                    self._count('hedge_wins')
+                # Whatever is still running loses; requests can't be interrupted
+                # mid-flight, so its response is closed when it arrives
+                for loser in pending:
+                    loser.add_done_callback(_discard)
+                for other in done:
+                    if other is not future:
+                        _discard(other)
+                return future.result()
+        raise error
+
+    async def run_async(self, host, send):
+        """Await send(on_wire) (a coroutine function), hedging it with a second copy if it runs past p95
+
+        on_wire works as in run().
+        """
+        self._count('requests')
+        self.budget.note_request()
+        delay = self.hedge_delay(host)
+        if not self.enabled or delay is None:
+            return await send(_on_wire_ignored)
+
+        on_wire = asyncio.Event()
+        primary = asyncio.ensure_future(send(on_wire.set))
+        primary.add_done_callback(lambda _: on_wire.set())
+        try:
+            await on_wire.wait()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            # asyncio.wait doesn't cancel what it waits on
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+        if not self.budget.try_spend():
+            self._count('denied')
+            return await primary
+
+        self._count('hedged')
+        backup = asyncio.ensure_future(send(_on_wire_ignored))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is backup:
+                        self._count('hedge_wins')
+                    return task.result()
+            raise error
+        finally:
+            # The loser is cancelled outright, freeing its slot and connection
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        """Return a one-line summary of hedging activity"""
+        with self.lock:
+            requests, hedged, wins, denied = self.requests, self.hedged, self.hedge_wins, self.denied
+        share = hedged / requests * 100 if requests else 0.0
+        return (f"Hedged requests: {hedged} of {requests} ({share:.1f}%), "
+                f"{wins} won by the hedge, {denied} over budget")
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+# Persistent HTTP response cache for re-crawls.
+#
+# Bodies are stored zlib-compressed in a single SQLite file together with the
+# validators (ETag / Last-Modified) the server sent. Entries younger than the
+# TTL are served without touching the network; older ones are revalidated with
+# If-None-Match / If-Modified-Since so unchanged pages cost a 304. The total
+# compressed size is capped and the least recently used entries are evicted.
+
+DEFAULT_CACHE_PATH = '.cache/http_cache.sqlite'
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+CacheEntry = namedtuple('CacheEntry', [
+    'url', 'body', 'etag', 'last_modified', 'content_type', 'encoding', 'fetched_at'
+])
+
+class ResponseCache:
+    """URL-keyed response cache with conditional GET validators and LRU size cap"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                encoding TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        self.conn.commit()
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def lookup(self, url):
+        """Return the CacheEntry for url, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT url, body, etag, last_modified, content_type, encoding, fetched_at '
+                'FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+        return CacheEntry(row[0], zlib.decompress(row[1]), *row[2:])
+
+    def record_hit(self):
+        """Count a response served straight from the cache"""
+        with self.lock:
+            self.hits += 1
+
+    def is_fresh(self, entry):
+        """True if the entry is young enough to use without revalidating"""
+        return time.time() - entry.fetched_at < self.ttl
+
+    def conditional_headers(self, entry):
+        """Request headers that turn a re-fetch into a conditional GET"""
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, url, body, headers, encoding=None):
+        """Save a 200 response body and its validators"""
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        with self.lock:
+            previous = self.conn.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(url, body, size, etag, last_modified, content_type, encoding, fetched_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, compressed, len(compressed), headers.get('ETag'), headers.get('Last-Modified'),
+                 headers.get('Content-Type'), encoding, now, now)
+            )
+            self.misses += 1
+            self.total_bytes += len(compressed) - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def mark_revalidated(self, url, headers):
+        """Record a 304: the cached body is current again"""
+        with self.lock:
+            self.revalidated += 1
+            self.conn.execute(
+                'UPDATE responses SET fetched_at = ?, etag = COALESCE(?, etag), '
+                'last_modified = COALESCE(?, last_modified) WHERE url = ?',
+                (time.time(), headers.get('ETag'), headers.get('Last-Modified'), url)
+            )
+            self.conn.commit()
+
+    def _evict(self):
+        # Caller holds self.lock. Drop least recently used entries until we are
+        # back under 90% of the cap, so eviction doesn't run on every store.
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute('SELECT url, size FROM responses ORDER BY accessed_at').fetchall()
+        victims = []
+        for url, size in rows:
+            if self.total_bytes <= target:
+                break
+            victims.append((url,))
+            self.total_bytes -= size
+        self.conn.executemany('DELETE FROM responses WHERE url = ?', victims)
+
+    def stats(self):
+        """Return a one-line summary of cache effectiveness"""
+        return (f"HTTP cache: {self.hits} fresh hits, {self.revalidated} revalidated (304), "
+                f"{self.misses} misses, {self.total_bytes / 1024 ** 2:.1f} MB stored")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,236 @@
+import asyncio
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+from concurrency import AdaptiveConcurrency
+from hedging import DEFAULT_HEDGE_RATIO, Hedger
+from http_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, DEFAULT_TTL, ResponseCache
+from rate_limit import HostRateLimiter, parse_retry_after
+
+# Shared HTTP client used by every scraper so all requests go through one
+# keep-alive connection pool with the same headers, retries and timeouts.
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+DEFAULT_TIMEOUT = 10
+
+RETRY_STATUSES = [500, 502, 503, 504]
+
+# Default politeness budget per host - override with configure_rate_limit()
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 10
+
+# Ceiling and starting point for the adaptive per-host in-flight limit.
+# Thread pools are sized to MAX_CONCURRENCY; the limiter decides how many
+# of those threads actually have a request on the wire.
+MAX_CONCURRENCY = 64
+INITIAL_CONCURRENCY = 10
+
+# 429 responses are retried here rather than inside urllib3 so the pause
+# applies to every thread hitting the same host, not just the one that got it
+MAX_RATE_LIMIT_RETRIES = 3
+
+def create_session():
+    """Create a requests session with connection pooling and retries"""
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=['GET', 'HEAD'],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=100,
+        pool_maxsize=100
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Create global session and rate limiter for reuse
+SESSION = create_session()
+RATE_LIMITER = HostRateLimiter(DEFAULT_RATE, DEFAULT_BURST)
+
+# Adaptive per-host timeouts and hedged requests - see hedging.py
+HEDGER = Hedger(DEFAULT_HEDGE_RATIO, default_timeout=DEFAULT_TIMEOUT)
+
+# Response cache, off until a script calls enable_cache()
+CACHE = None
+
+_robots_checked = set()
+_robots_lock = threading.Lock()
+
+_concurrency_limiters = {}
+_concurrency_lock = threading.Lock()
+
+def configure_rate_limit(rate, burst=None, host=None):
+    """Set the requests/sec budget for one host, or the default for all hosts"""
+    RATE_LIMITER.configure(rate, burst, host)
+
+def configure_hedging(ratio):
+    """Hedge at most this share of requests (0 turns hedging off)"""
+    HEDGER.configure(ratio)
+
+def request_timeout(url):
+    """Adaptive timeout for a request to url's host"""
+    return HEDGER.timeout(urlsplit(url).netloc)
+
+def record_latency(url, seconds):
+    """Feed a request's time on the wire into its host's adaptive timeout and hedge delay"""
+    HEDGER.record(urlsplit(url).netloc, seconds)
+
+async def hedged_async(url, send):
+    """Await send(on_wire), hedging it with a second copy if it runs past the host's p95 on the wire"""
+    return await HEDGER.run_async(urlsplit(url).netloc, send)
+
+def enable_cache(path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+    """Turn on the persistent response cache for page fetches"""
+    global CACHE
+    CACHE = ResponseCache(path, ttl, max_bytes)
+    return CACHE
+
+def cached_response(url, entry):
+    """Build a requests.Response from a cache entry"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = entry.body
+    response.encoding = entry.encoding
+    if entry.content_type:
+        response.headers['Content-Type'] = entry.content_type
+    return response
+
+def concurrency_limiter(url):
+    """Return the adaptive in-flight limiter for url's host"""
+    host = urlsplit(url).netloc
+    with _concurrency_lock:
+        limiter = _concurrency_limiters.get(host)
+        if limiter is None:
+            limiter = AdaptiveConcurrency(INITIAL_CONCURRENCY, max_limit=MAX_CONCURRENCY, name=host)
+            _concurrency_limiters[host] = limiter
+        return limiter
+
+def format_concurrency_report():
+    """Return the limit history of every host contacted so far"""
+    with _concurrency_lock:
+        limiters = list(_concurrency_limiters.values())
+    return '\n'.join(limiter.format_history() for limiter in limiters)
+
+def apply_robots_crawl_delay(url):
+    """Slow the host's bucket down to its robots.txt Crawl-delay / Request-rate, once per host"""
+    parts = urlsplit(url)
+    host = parts.netloc
+    with _robots_lock:
+        if host in _robots_checked:
+            return
+        _robots_checked.add(host)
+    
+    parser = RobotFileParser()
+    try:
+        response = SESSION.get(f"{parts.scheme}://{host}/robots.txt", timeout=DEFAULT_TIMEOUT)
+        if response.status_code != 200:
+            return
+        parser.parse(response.text.splitlines())
+    except Exception:
+        return
+    
+    user_agent = DEFAULT_HEADERS['User-Agent']
+    min_interval = 0.0
+    crawl_delay = parser.crawl_delay(user_agent)
+    if crawl_delay:
+        min_interval = float(crawl_delay)
+    request_rate = parser.request_rate(user_agent)
+    if request_rate and request_rate.requests:
+        min_interval = max(min_interval, request_rate.seconds / request_rate.requests)
+    
+    if min_interval > 0:
+        bucket = RATE_LIMITER.bucket(host)
+        if bucket.rate > 1 / min_interval:
+            # A crawl delay means one request at a time, so no bursting either
+            bucket.set_rate(1 / min_interval, 1)
+
+def throttle(url):
+    """Wait for permission to send a request to url's host"""
+    apply_robots_crawl_delay(url)
+    RATE_LIMITER.acquire(url)
+
+async def throttle_async(url):
+    """Asyncio version of throttle()"""
+    if urlsplit(url).netloc not in _robots_checked:
+        await asyncio.to_thread(apply_robots_crawl_delay, url)
+    await RATE_LIMITER.acquire_async(url)
+
+def note_response(url, status, headers):
+    """Pause the host when the server asks us to back off; returns the pause in seconds"""
+    retry_after = parse_retry_after(headers.get('Retry-After'))
+    if retry_after is None and status == 429:
+        retry_after = 1.0
+    if retry_after:
+        RATE_LIMITER.pause(url, retry_after)
+    return retry_after
+
+def fetch(url, timeout=None, **kwargs):
+    """GET a URL through the shared session, rate and concurrency limiters
+    
+    timeout defaults to the host's adaptive timeout. Requests that run past
+    the host's p95 latency are hedged, except streamed ones whose body the
+    caller reads incrementally.
+    """
+    host = urlsplit(url).netloc
+    if timeout is None:
+        timeout = HEDGER.timeout(host)
+    
+    def send(on_wire=None):
+        throttle(url)
+        with concurrency_limiter(url).slot() as slot:
+            # Queued behind the rate and concurrency limits until here - the
+            # hedge delay and the latency sample start now
+            if on_wire is not None:
+                on_wire()
+            started = time.monotonic()
+            response = SESSION.get(url, timeout=timeout, **kwargs)
+            slot.status = response.status_code
+        # Time on the wire only - rate limiter waits don't count
+        record_latency(url, time.monotonic() - started)
+        note_response(url, response.status_code, response.headers)
+        return response
+    
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        if kwargs.get('stream'):
+            response = send()
+        else:
+            response = HEDGER.run(host, send)
+        if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+            return response
+        response.close()
+    return response
+
+def get(url, timeout=None, cache=True, **kwargs):
+    """GET a URL, serving or revalidating it from the response cache when enabled"""
+    if not cache or CACHE is None or kwargs.get('stream'):
+        return fetch(url, timeout, **kwargs)
+    
+    entry = CACHE.lookup(url)
+    if entry is not None:
+        if CACHE.is_fresh(entry):
+            CACHE.record_hit()
+            return cached_response(url, entry)
+        kwargs['headers'] = {**(kwargs.get('headers') or {}), **CACHE.conditional_headers(entry)}
+    
+    response = fetch(url, timeout, **kwargs)
+    if entry is not None and response.status_code == 304:
+        CACHE.mark_revalidated(url, response.headers)
+        return cached_response(url, entry)
+    if response.status_code == 200:
+        CACHE.store(url, response.content, response.headers, response.encoding)
+    return response
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import Future
+
+import http_client
+
+# Streaming, resumable image downloads.
+#
+# Bodies are streamed in chunks to <partial_dir>/<hash of URL>.part rather
+# than buffered in memory, and only handed on (renamed into the image store)
+# once the byte count matches the Content-Length / Content-Range total, so a
+# failed or interrupted download can never look like a finished image.
+#
+# An incomplete .part file is kept. The next attempt - in this run or a later
+# one - asks for the rest with a Range request, guarded by If-Range with the
+# ETag / Last-Modified seen when the file was started, so a changed image is
+# downloaded again from scratch instead of being spliced together.
+#
+# Concurrent requests for the same URL (e.g. one image shared by items in
+# different batches or pipeline workers) are coalesced: the first caller
+# downloads, everyone else waits for and shares its result.
+
+CHUNK_SIZE = 64 * 1024
+MAX_ATTEMPTS = 3
+
+_content_range = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+# One manager per partial directory (i.e. per image store)
+DOWNLOADERS = {}
+_downloader_lock = threading.Lock()
+
+class IncompleteDownload(Exception):
+    """The body ended before the advertised length"""
+
+def expected_length(response, offset):
+    """Total size of the file being downloaded, or None if the server didn't say
+
+    Lengths are only trusted for identity-encoded bodies - requests decodes
+    gzip and friends on the fly, so the byte counts wouldn't match.
+    """
+    if response.headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    if response.status_code == 206:
+        match = _content_range.match(response.headers.get('Content-Range', ''))
+        if match is None or int(match.group(1)) != offset:
+            raise IncompleteDownload(f"unexpected Content-Range {response.headers.get('Content-Range')!r}")
+        return int(match.group(3)) if match.group(3) != '*' else None
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+class DownloadManager:
+    """Streams image downloads to disk, resuming partial files and coalescing duplicate URLs"""
+
+    def __init__(self, partial_dir):
+        self.partial_dir = partial_dir
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.downloads = 0
+        self.resumed = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def _count(self, field, amount=1):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def partial_path(self, url):
+        return os.path.join(self.partial_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.part')
+
+    def download(self, url, finish):
+        """Download url and return finish(path) for the completed file, or None on failure
+
+        finish is called once per download, with the finished file; it is
+        expected to move the file away (e.g. into the image store). Callers
+        asking for a URL that is already downloading wait for that download
+        and get the same return value.
+        """
+        with self.lock:
+            future = self.in_flight.get(url)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[url] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        result = None
+        try:
+            path = self.fetch(url)
+            if path is not None:
+                result = finish(path)
+                self._count('downloads')
+            else:
+                self._count('failed')
+        except Exception:
+            self._count('failed')
+        finally:
+            with self.lock:
+                del self.in_flight[url]
+            future.set_result(result)
+        return result
+
+    def fetch(self, url):
+        """Stream url to its .part file, resuming what's there; returns the path once complete, else None"""
+        path = self.partial_path(url)
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return path if self._fetch_once(url, path) else None
+            except Exception:
+                # Keep what arrived - the next attempt asks for the remainder
+                continue
+        return None
+
+    def _read_validator(self, path):
+        try:
+            with open(path + '.json', 'r', encoding='utf-8') as f:
+                return json.load(f).get('validator')
+        except (OSError, ValueError):
+            return None
+
+    def _write_validator(self, path, validator):
+        with open(path + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'validator': validator}, f)
+
+    def _discard(self, path):
+        for stale in (path, path + '.json'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    def _fetch_once(self, url, path):
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        validator = self._read_validator(path) if offset else None
+        if offset and validator is None:
+            # Nothing to prove the server still has the same file - start over
+            self._discard(path)
+            offset = 0
+
+        headers = {}
+        if offset:
+            headers = {'Range': f'bytes={offset}-', 'If-Range': validator}
+        response = http_client.get(url, cache=False, stream=True, headers=headers)
+        try:
+            if response.status_code == 416:
+                # Already have every byte (or the file shrank) - fetch it whole next time
+                self._discard(path)
+                raise IncompleteDownload("range not satisfiable")
+            if 400 <= response.status_code < 500:
+                # Missing or forbidden - retrying won't help
+                return False
+            response.raise_for_status()
+
+            if response.status_code == 206:
+                mode = 'ab'
+                self._count('resumed')
+            else:
+                # A full response: no resume asked for, or the file changed since
+                mode = 'wb'
+                offset = 0
+                validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                os.makedirs(self.partial_dir, exist_ok=True)
+                if validator:
+                    self._write_validator(path, validator)
+                elif os.path.exists(path + '.json'):
+                    os.remove(path + '.json')
+            total = expected_length(response, offset)
+
+            with open(path, mode) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    self._count('bytes', len(chunk))
+        finally:
+            response.close()
+
+        size = os.path.getsize(path)
+        if total is not None and size != total:
+            if size > total:
+                self._discard(path)
+            raise IncompleteDownload(f"got {size} of {total} bytes")
+        if os.path.exists(path + '.json'):
+            os.remove(path + '.json')
+        return True
+
+    def stats(self):
+        """Return a one-line summary of download activity"""
+        with self.lock:
+            return (
+                f"Image downloads: {self.downloads} completed ({self.bytes / 1024 / 1024:.1f} MB), "
+                f"{self.resumed} resumed, {self.coalesced} coalesced, {self.failed} failed"
+            )
+
+def get_downloader(partial_dir):
+    """Return the shared download manager for partial_dir, so coalescing spans every batch and engine"""
+    with _downloader_lock:
+        downloader = DOWNLOADERS.get(partial_dir)
+        if downloader is None:
+            downloader = DOWNLOADERS[partial_dir] = DownloadManager(partial_dir)
+        return downloader
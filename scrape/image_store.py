@@ -0,0 +1,383 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+# Pillow is optional - without it images are only deduplicated by exact bytes
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Content-addressed image store.
+#
+# Every downloaded image is stored once under images/blobs/<xx>/<sha256><ext>,
+# however many items, categories or URLs it belongs to. images/manifest.json
+# maps:
+#
+#   items  - category -> item name -> {blob, url, path}
+#   urls   - image URL -> blob digest, so a URL already fetched (in this run
+#            or an earlier one) is never downloaded again
+#   blobs  - digest -> {file, size, phash}
+#   aliases - digest of a re-encoded copy -> the blob it duplicates
+#
+# The web UI still reads images/<category>/<item>.jpg, so each item is also
+# emitted into that layout as a hard link to its blob (default), a relative
+# symlink, a plain copy, or not at all (manifest entries only).
+#
+# With Pillow installed each blob also gets a 64-bit difference hash, and
+# --phash-distance makes an image within that many bits of an existing blob
+# count as the same picture (e.g. the same photo served re-compressed).
+#
+#   python scrape/image_store.py import                 # move images/ into the store
+#   python scrape/image_store.py import --layout symlink
+#   python scrape/image_store.py stats
+
+DEFAULT_IMAGES_DIR = 'images'
+BLOB_DIR = 'blobs'
+MANIFEST_NAME = 'manifest.json'
+PARTIAL_DIR = '.partial'
+
+LAYOUTS = ('hardlink', 'symlink', 'copy', 'none')
+DEFAULT_LAYOUT = 'hardlink'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# Manifest is rewritten after this many changes, and at the end of every run
+SAVE_EVERY = 50
+
+# One store per images directory (each brand has its own), opened with these options
+IMAGE_STORES = {}
+STORE_OPTIONS = {'layout': DEFAULT_LAYOUT, 'phash_distance': None}
+_store_lock = threading.Lock()
+
+def sanitize_filename(name):
+    """Sanitize a string to be used as a filename"""
+    # Remove or replace invalid characters
+    invalid_chars = '<>:"/\\|?*'
+    for char in invalid_chars:
+        name = name.replace(char, '_')
+
+    # Remove leading/trailing spaces and periods
+    name = name.strip('. ')
+
+    # Limit length
+    if len(name) > 200:
+        name = name[:200]
+
+    return name
+
+def url_extension(url, default='.jpg'):
+    """Return the image extension in a URL's path, or default"""
+    if url and '.' in url:
+        ext = '.' + url.split('?')[0].split('.')[-1].lower()
+        if ext in IMAGE_EXTENSIONS:
+            return ext
+    return default
+
+def file_digest(path):
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def perceptual_hash(path):
+    """64-bit difference hash of an image as hex, or None without Pillow or for unreadable files"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            pixels = list(image.convert('L').resize((9, 8)).getdata())
+    except Exception:
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+def hamming_distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+class ImageStore:
+    """Deduplicated blob store for item images plus the manifest that maps items to blobs"""
+
+    def __init__(self, images_dir=DEFAULT_IMAGES_DIR, layout=DEFAULT_LAYOUT, phash_distance=None):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout {layout!r}; expected one of {', '.join(LAYOUTS)}")
+        self.images_dir = images_dir
+        self.blob_dir = os.path.join(images_dir, BLOB_DIR)
+        self.manifest_path = os.path.join(images_dir, MANIFEST_NAME)
+        # Downloads in progress - inside the store so finished files are renamed, not copied, in
+        self.partial_dir = os.path.join(self.blob_dir, PARTIAL_DIR)
+        self.layout = layout
+        self.phash_distance = phash_distance
+        self.lock = threading.Lock()
+        self.items = {}
+        self.urls = {}
+        self.blobs = {}
+        self.aliases = {}
+        self.changes = 0
+        self.downloaded = 0
+        self.url_hits = 0
+        self.byte_duplicates = 0
+        self.phash_duplicates = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.items = manifest.get('items', {})
+        self.urls = manifest.get('urls', {})
+        self.blobs = manifest.get('blobs', {})
+        self.aliases = manifest.get('aliases', {})
+
+    def save(self):
+        """Write the manifest atomically if anything changed since the last save"""
+        with self.lock:
+            if not self.changes:
+                return
+            self._write_manifest()
+
+    def _write_manifest(self):
+        manifest = {'items': self.items, 'urls': self.urls, 'blobs': self.blobs, 'aliases': self.aliases}
+        os.makedirs(self.images_dir, exist_ok=True)
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+        self.changes = 0
+
+    def _changed(self):
+        # Called with the lock held
+        self.changes += 1
+        if self.changes >= SAVE_EVERY:
+            self._write_manifest()
+
+    def blob_path(self, digest):
+        """Path of a stored blob, or None if the digest isn't in the store"""
+        digest = self.aliases.get(digest, digest)
+        blob = self.blobs.get(digest)
+        if blob is None:
+            return None
+        return os.path.join(self.blob_dir, blob['file'])
+
+    def layout_path(self, category, item_name, ext='.jpg'):
+        """Where the web UI expects an item's image: images/<category>/<item><ext>"""
+        return os.path.join(self.images_dir, sanitize_filename(category), sanitize_filename(item_name) + ext)
+
+    def lookup_url(self, url):
+        """Digest of the blob already fetched from url, or None"""
+        with self.lock:
+            digest = self.urls.get(url)
+            path = self.blob_path(digest) if digest is not None else None
+            if path is None or not os.path.exists(path):
+                return None
+            self.url_hits += 1
+            return digest
+
+    def _near_duplicate(self, phash):
+        # Called with the lock held
+        if phash is None or self.phash_distance is None:
+            return None
+        for digest, blob in self.blobs.items():
+            if blob.get('phash') and hamming_distance(phash, blob['phash']) <= self.phash_distance:
+                return digest
+        return None
+
+    def add_file(self, path, ext='.jpg', url=None, move=True):
+        """Store the image at path and return its canonical digest
+
+        A file whose bytes (or, with phash_distance set, whose picture) are
+        already stored is not kept a second time. With move the file is
+        renamed into the store or removed; otherwise it is copied.
+        """
+        digest = file_digest(path)
+        phash = perceptual_hash(path)
+        with self.lock:
+            canonical = self.aliases.get(digest, digest)
+            if canonical in self.blobs:
+                self.byte_duplicates += 1
+            else:
+                canonical = self._near_duplicate(phash)
+                if canonical is not None:
+                    self.aliases[digest] = canonical
+                    self.phash_duplicates += 1
+            if canonical is not None:
+                if url:
+                    self.urls[url] = canonical
+                self._changed()
+                if move:
+                    os.remove(path)
+                return canonical
+
+            relative = os.path.join(digest[:2], digest + ext)
+            target = os.path.join(self.blob_dir, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if move:
+                os.replace(path, target)
+            else:
+                shutil.copyfile(path, target + '.tmp')
+                os.replace(target + '.tmp', target)
+            self.blobs[digest] = {'file': relative.replace(os.sep, '/'), 'size': os.path.getsize(target), 'phash': phash}
+            if url:
+                self.urls[url] = digest
+            self._changed()
+            return digest
+
+    def assign(self, category, item_name, digest, url=None, ext='.jpg'):
+        """Point an item at a blob and emit it into the directory layout"""
+        path = self.layout_path(category, item_name, ext)
+        with self.lock:
+            digest = self.aliases.get(digest, digest)
+            entry = {'blob': digest, 'url': url, 'path': os.path.relpath(path, self.images_dir).replace(os.sep, '/')}
+            if self.items.get(category, {}).get(item_name) != entry:
+                self.items.setdefault(category, {})[item_name] = entry
+                self._changed()
+            source = self.blob_path(digest)
+        self.emit_layout(source, path)
+
+    def emit_layout(self, source, path):
+        """Make path show the blob at source according to the store's layout"""
+        if self.layout == 'none':
+            return
+        if os.path.lexists(path):
+            try:
+                if os.path.samefile(source, path):
+                    return
+            except OSError:
+                pass
+            if self.layout == 'copy' and not os.path.islink(path) and file_digest(path) == file_digest(source):
+                return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp'
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        if self.layout == 'symlink':
+            os.symlink(os.path.relpath(source, os.path.dirname(path)), temp_path)
+        elif self.layout == 'hardlink':
+            try:
+                os.link(source, temp_path)
+            except OSError:
+                # Different filesystem or no hard link support - fall back to a copy
+                shutil.copyfile(source, temp_path)
+        else:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, path)
+
+    def has_item(self, category, item_name, url):
+        """True if the item already points at a stored blob fetched from url"""
+        with self.lock:
+            entry = self.items.get(category, {}).get(item_name)
+            if entry is None or entry.get('url') != url:
+                return False
+            source = self.blob_path(entry['blob'])
+        if source is None or not os.path.exists(source):
+            return False
+        return self.layout == 'none' or os.path.exists(os.path.join(self.images_dir, entry['path']))
+
+    def save_item(self, category, item_name, url, download):
+        """Store one item's image, downloading url only if no stored blob came from it
+
+        download(url, finish) must fetch url to a file and return
+        finish(path) - see DownloadManager.download. Returns 'downloaded',
+        'skipped' (already stored, or its URL was) or 'failed'.
+        """
+        ext = url_extension(url)
+        if self.has_item(category, item_name, url):
+            return 'skipped'
+        digest = self.lookup_url(url)
+        finished = []
+        if digest is None:
+            def finish(path):
+                digest = self.add_file(path, ext, url)
+                with self.lock:
+                    self.downloaded += 1
+                finished.append(digest)
+                return digest
+            digest = download(url, finish)
+            if digest is None:
+                return 'failed'
+        self.assign(category, item_name, digest, url, ext)
+        # Callers that shared another caller's download count as skipped
+        return 'downloaded' if finished else 'skipped'
+
+    def import_tree(self):
+        """Move images already in the category layout into the store; returns (files, blobs added)"""
+        files = 0
+        before = len(self.blobs)
+        for category in sorted(os.listdir(self.images_dir)):
+            category_dir = os.path.join(self.images_dir, category)
+            if category == BLOB_DIR or not os.path.isdir(category_dir):
+                continue
+            for filename in sorted(os.listdir(category_dir)):
+                item_name, ext = os.path.splitext(filename)
+                path = os.path.join(category_dir, filename)
+                if ext.lower() not in IMAGE_EXTENSIONS or os.path.islink(path):
+                    continue
+                digest = self.add_file(path, ext.lower(), move=False)
+                self.assign(category, item_name, digest, ext=ext)
+                files += 1
+        self.save()
+        return files, len(self.blobs) - before
+
+    def stats(self):
+        """Return a one-line summary of the store and this run's deduplication"""
+        with self.lock:
+            items = sum(len(entries) for entries in self.items.values())
+            blobs = len(self.blobs)
+            size = sum(blob['size'] for blob in self.blobs.values())
+        return (
+            f"Image store: {blobs} blobs ({size / 1024 / 1024:.1f} MB) for {items} item images; "
+            f"{self.downloaded} downloaded, {self.url_hits} URL hits, "
+            f"{self.byte_duplicates} duplicate files, {self.phash_duplicates} perceptual duplicates"
+        )
+
+def configure_image_store(images_dir=DEFAULT_IMAGES_DIR, layout=DEFAULT_LAYOUT, phash_distance=None):
+    """Open a shared image store, and any opened later, with the given layout and near-duplicate threshold"""
+    with _store_lock:
+        STORE_OPTIONS.update(layout=layout, phash_distance=phash_distance)
+        IMAGE_STORES[images_dir] = ImageStore(images_dir, layout, phash_distance)
+        return IMAGE_STORES[images_dir]
+
+def get_image_store(images_dir=DEFAULT_IMAGES_DIR):
+    """Return the shared store for images_dir, opening it on first use"""
+    with _store_lock:
+        store = IMAGE_STORES.get(images_dir)
+        if store is None:
+            store = IMAGE_STORES[images_dir] = ImageStore(images_dir, **STORE_OPTIONS)
+        return store
+
+def open_image_stores():
+    """The shared stores opened so far"""
+    with _store_lock:
+        return list(IMAGE_STORES.values())
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the content-addressed menu image store")
+    parser.add_argument('command', choices=['import', 'stats'],
+                        help="import: move the existing images/<category>/ files into the store; stats: summarize it")
+    parser.add_argument('--images-dir', default=DEFAULT_IMAGES_DIR, help="Image directory (default: images)")
+    parser.add_argument('--layout', choices=LAYOUTS, default=DEFAULT_LAYOUT,
+                        help="How items are emitted into images/<category>/ (default: hardlink)")
+    parser.add_argument('--phash-distance', type=int,
+                        help="Treat images within this many bits of perceptual hash as duplicates (needs Pillow)")
+    args = parser.parse_args()
+
+    if args.phash_distance is not None and Image is None:
+        print("Pillow is not installed - deduplicating by exact bytes only")
+
+    store = ImageStore(args.images_dir, args.layout, args.phash_distance)
+    if args.command == 'import':
+        files, added = store.import_tree()
+        print(f"Imported {files} files as {added} new blobs")
+    print(store.stats())
+
+if __name__ == "__main__":
+    main()
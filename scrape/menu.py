@@ -1,42 +1,45 @@
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import argparse
+import asyncio
 import csv
 import os
-import json
-import re
-from bs4 import BeautifulSoup
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
-# Create a global session with connection pooling and retries
-def create_session():
-    """Create a requests session with connection pooling and retries"""
-    session = requests.Session()
-    retry = Retry(
-        total=3,
-        backoff_factor=0.3,
-        status_forcelist=[500, 502, 503, 504]
-    )
-    adapter = HTTPAdapter(
-        max_retries=retry,
-        pool_connections=100,
-        pool_maxsize=100
-    )
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
+import brands
+import http_client
+import image_downloads
+import image_store
+import parse_cache
+import parse_pool
+import pricing_zones
+from concurrency import HostConcurrency
+from crawl_state import CrawlState
+from pipeline import Pipeline, Stage
+from menu_journal import append_store_results, compact_journal, load_journal_store_ids
 
-# Create global session for reuse
-SESSION = create_session()
+# resource is Unix-only - it is just used to report peak memory
+try:
+    import resource
+except ImportError:
+    resource = None
 
-def load_first_location():
+# aiohttp is optional - without it the crawler falls back to the threaded mode
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+def load_first_location(brand=None):
     """Load the first store from locations.csv"""
-    if not os.path.exists('data/locations.csv'):
-        print("Error: data/locations.csv not found!")
+    csv_path = (brand or brands.get_brand()).locations_csv_path
+    if not os.path.exists(csv_path):
+        print(f"Error: {csv_path} not found!")
         return None
     
-    with open('data/locations.csv', 'r', encoding='utf-8') as f:
+    with open(csv_path, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         # Get the first row
         for row in reader:
@@ -44,118 +47,92 @@ def load_first_location():
     
     return None
 
-def load_all_locations():
+def load_all_locations(brand=None):
     """Load all stores from locations.csv"""
-    if not os.path.exists('data/locations.csv'):
-        print("Error: data/locations.csv not found!")
+    csv_path = (brand or brands.get_brand()).locations_csv_path
+    if not os.path.exists(csv_path):
+        print(f"Error: {csv_path} not found!")
         return []
     
     locations = []
-    with open('data/locations.csv', 'r', encoding='utf-8') as f:
+    with open(csv_path, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             locations.append(row)
     
     return locations
 
-def load_processed_store_ids():
+def load_processed_store_ids(brand=None):
     """Load the list of store IDs that have already been processed"""
-    csv_path = 'data/menu.csv'
+    brand = brand or brands.get_brand()
+    csv_path = brand.menu_csv_path
+    
+    # Stores journaled since the last compaction count as processed too
+    processed_ids = load_journal_store_ids(brand.journal_path)
     
     if not os.path.exists(csv_path):
-        return set()
+        return processed_ids
     
-    processed_ids = set()
     try:
         with open(csv_path, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
-                if 'store_id' in row:
+                # All-empty rows are stores that failed in older runs - crawl them again
+                if 'store_id' in row and any(value for field, value in row.items() if field != 'store_id'):
                     processed_ids.add(row['store_id'])
         
         return processed_ids
     except Exception as e:
         print(f"Warning: Could not read existing CSV: {e}")
-        return set()
+        return processed_ids
 
-def load_existing_menu_data():
-    """Load existing menu data from CSV if it exists"""
-    csv_path = 'data/menu.csv'
-    
-    if not os.path.exists(csv_path):
-        return [], set()
+def fetch_menu_page(store_id, brand=None):
+    """Fetch the menu page for a given store ID (raises on request errors)"""
+    url = (brand or brands.get_brand()).menu_url(store_id)
     
-    try:
-        existing_rows = []
-        all_menu_items = set()
-        
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            
-            if fieldnames and len(fieldnames) > 1:
-                # All columns except store_id are menu items
-                all_menu_items = set(fieldnames[1:])
-            
-            for row in reader:
-                existing_rows.append(row)
-        
-        return existing_rows, all_menu_items
-    except Exception as e:
-        print(f"Warning: Could not read existing CSV: {e}")
-        return [], set()
+    response = http_client.get(url)
+    response.raise_for_status()
+    return response.text
 
-def fetch_menu_page(store_id):
-    """Fetch the menu page for a given store ID"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+def error_class(e):
+    """Short error class for the retry queue, e.g. 'HTTP 503' or 'Timeout'"""
+    response = getattr(e, 'response', None)
+    status = getattr(e, 'status', None) or getattr(response, 'status_code', None)
+    if status:
+        return f"HTTP {status}"
+    if isinstance(e, (requests.exceptions.Timeout, asyncio.TimeoutError)):
+        return 'Timeout'
+    return type(e).__name__
+
+def failed_store(location, failure_class, error=None):
+    """Result for a store whose menu page couldn't be fetched or parsed"""
+    return {
+        'store_id': location['store_id'],
+        'brand': brands.brand_of(location).name,
+        'location': location['location'],
+        'menu_items': {},
+        'success': False,
+        'error_class': failure_class,
+        'error': error
     }
-    
-    url = f"https://www.tacobell.com/food?store={store_id}"
-    
-    try:
-        response = SESSION.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except Exception as e:
-        return None
 
-def parse_categories(html_content, store_id):
+def category_failure(category, failure_class, error=None):
+    """A failed category page, as queued for retry"""
+    return dict(category, error_class=failure_class, error=error)
+
+def parse_categories(html_content, store_id, brand=None):
     """Parse the category data from the HTML content"""
+    brand = brand or brands.get_brand()
     try:
-        # Find the __NEXT_DATA__ script tag which contains all the menu data
-        soup = BeautifulSoup(html_content, 'html.parser')
-        next_data_script = soup.find('script', {'id': '__NEXT_DATA__'})
+        categories = brand.parse_categories(html_content, store_id)
         
-        if not next_data_script:
-            print("Error: Could not find __NEXT_DATA__ script tag")
+        if categories is None:
+            print(f"Error: Could not find the {brand.display_name} menu data")
             return None
         
-        # Parse the JSON data
-        data = json.loads(next_data_script.string)
-        
-        # Navigate to the product categories
-        product_categories = data.get('props', {}).get('pageProps', {}).get('productCategories', [])
-        
-        categories = []
-        for category in product_categories:
-            label = category.get('label', 'Unknown')
-            slug = category.get('slug', '')
-            subtitle = category.get('subtitle', '')
-            
-            # Build the full URL with store parameter
-            if slug:
-                url = f"https://www.tacobell.com{slug}?store={store_id}"
-            else:
-                url = ''
-            
-            categories.append({
-                'name': label,
-                'url': url,
-                'description': subtitle
-            })
-        
-        return categories
+        # Categories remember their brand, so their pages (and retries) are
+        # parsed by the right adapter
+        return [dict(category, brand=brand.name) for category in categories]
         
     except Exception as e:
         return None
@@ -182,22 +159,21 @@ def display_categories(categories):
 
 def fetch_category_page(category):
     """Fetch the HTML content for a single category page"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
     category_name = category['name']
     category_url = category['url']
     
     try:
-        response = SESSION.get(category_url, headers=headers, timeout=10)
+        response = http_client.get(category_url)
         response.raise_for_status()
         
+        # Raw bytes - only the __NEXT_DATA__ slice is ever decoded, and the
+        # parse pool gets them without re-encoding
         return {
             'category': category,
-            'html': response.text,
+            'html': response.content,
             'success': True,
-            'error': None
+            'error': None,
+            'error_class': None
         }
         
     except requests.exceptions.HTTPError as e:
@@ -205,305 +181,176 @@ def fetch_category_page(category):
             'category': category,
             'html': None,
             'success': False,
-            'error': str(e)
+            'error': str(e),
+            'error_class': error_class(e)
         }
     except requests.exceptions.Timeout:
         return {
             'category': category,
             'html': None,
             'success': False,
-            'error': 'Timeout'
+            'error': 'Timeout',
+            'error_class': 'Timeout'
         }
     except Exception as e:
         return {
             'category': category,
             'html': None,
             'success': False,
-            'error': str(e)
-        }
-
-def fetch_all_categories_parallel(categories, max_workers=5):
-    """Fetch all category pages in parallel"""
-    results = []
-    
-    # Use ThreadPoolExecutor to fetch pages in parallel
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all fetch tasks
-        future_to_category = {
-            executor.submit(fetch_category_page, category): category 
-            for category in categories
+            'error': str(e),
+            'error_class': error_class(e)
         }
-        
-        # Process completed tasks as they finish
-        for future in as_completed(future_to_category):
-            result = future.result()
-            results.append(result)
-    
-    return results
 
-def parse_menu_items(html_content, category_name=''):
+def parse_menu_items(html_content, category_name='', brand=None):
     """Parse menu items, prices, and image URLs from HTML content"""
+    brand = brand or brands.get_brand()
+    pool = parse_pool.POOL
+    cache = parse_cache.PARSE_CACHE
+    if pool is not None:
+        # CPU-bound - a worker process extracts, hashes (against its own parse
+        # cache) and decodes the page instead of this thread taking the GIL
+        items, hit, seconds = pool.parse(html_content, category_name, brand.name)
+        if cache is not None and hit is not None:
+            cache.note_worker_lookup(hit, seconds)
+        return items
+    
     try:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        next_data_script = soup.find('script', {'id': '__NEXT_DATA__'})
+        payload = brand.extract_menu_payload(html_content)
         
-        if not next_data_script:
+        if payload is None:
             return []
         
-        data = json.loads(next_data_script.string)
-        
-        # Navigate to products in the page data
-        products = data.get('props', {}).get('pageProps', {}).get('products', [])
-        
-        menu_items = []
-        for product in products:
-            name = product.get('name', '')
-            # Price is in the price object
-            price_obj = product.get('price', {})
-            
-            # Image URL - try different possible locations
-            image_url = None
-            if 'image' in product:
-                if isinstance(product['image'], dict):
-                    image_url = product['image'].get('url') or product['image'].get('src')
-                elif isinstance(product['image'], str):
-                    image_url = product['image']
-            
-            # Also try 'imageUrl' or 'images' fields
-            if not image_url:
-                image_url = product.get('imageUrl') or product.get('img')
-                if not image_url and 'images' in product:
-                    images = product['images']
-                    if isinstance(images, list) and len(images) > 0:
-                        if isinstance(images[0], dict):
-                            image_url = images[0].get('url') or images[0].get('src')
-                        else:
-                            image_url = images[0]
-            
-            if name and price_obj and isinstance(price_obj, dict):
-                price = price_obj.get('value')
-                if price is not None:
-                    menu_items.append({
-                        'name': name,
-                        'price': float(price),
-                        'image_url': image_url,
-                        'category': category_name
-                    })
-        
-        return menu_items
+        # Only name, price, category and image URL are decoded from the products
+        if cache is None:
+            return brand.decode_menu_items(payload, category_name)
+        # Identical payloads (same category in the same region) are decoded once
+        return cache.get_or_parse(payload, category_name, brand.decode_menu_items)
         
     except Exception as e:
         return []
 
-def parse_all_menu_items_parallel(category_results):
-    """Parse menu items from all category results in parallel"""
-    all_items = {}
-    
-    def parse_result(result):
-        if not result['success'] or not result['html']:
-            return []
-        
-        category_name = result['category'].get('name', '')
-        items = parse_menu_items(result['html'], category_name)
-        return items
+def merge_menu_items(menu_items, items):
+    """Add parsed items to an item name -> {price, image_url, category} dict"""
+    for item in items:
+        # If item already exists, keep the first one we found
+        if item['name'] not in menu_items:
+            menu_items[item['name']] = {
+                'price': item['price'],
+                'image_url': item.get('image_url'),
+                'category': item.get('category', '')
+            }
+    return menu_items
+
+def fetch_category_items(category):
+    """Fetch and parse one category page; returns (items, failure or None)
+    
+    The page is released as soon as it is parsed.
+    """
+    result = fetch_category_page(category)
+    if not result['success']:
+        return [], category_failure(category, result['error_class'], result['error'])
+    if not result['html']:
+        return [], category_failure(category, 'EmptyPage')
+    return parse_menu_items(result['html'], category.get('name', ''), brands.brand_of(category)), None
+
+def iter_category_items(categories, max_workers=http_client.MAX_CONCURRENCY):
+    """Fetch and parse category pages in parallel, yielding (items, failure) as each finishes
     
-    # Parse all results in parallel
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = [executor.submit(parse_result, result) for result in category_results]
+    Only the pages currently in flight are held in memory - never the whole set.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch_category_items, category) for category in categories if category['url']]
         
         for future in as_completed(futures):
-            items = future.result()
-            # Add items to dictionary (item name -> {price, image_url, category})
-            for item in items:
-                # If item already exists, keep the first one we found
-                if item['name'] not in all_items:
-                    all_items[item['name']] = {
-                        'price': item['price'],
-                        'image_url': item.get('image_url'),
-                        'category': item.get('category', '')
-                    }
-    
-
-    return all_items
-
-def download_image(url, filepath):
-    """Download an image from a URL and save it to filepath"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = SESSION.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
-        
-        return True
-    except Exception as e:
-        return False
+            yield future.result()
 
-def sanitize_filename(name):
-    """Sanitize a string to be used as a filename"""
-    # Remove or replace invalid characters
-    invalid_chars = '<>:"/\\|?*'
-    for char in invalid_chars:
-        name = name.replace(char, '_')
+def save_menu_item_image(item_name, item_data, images_dir='images'):
+    """Store one menu item's image; returns 'downloaded', 'skipped' or 'failed'
     
-    # Remove leading/trailing spaces and periods
-    name = name.strip('. ')
+    Images go through the content-addressed store (see image_store.py), so a
+    URL or picture shared by several items is only downloaded and kept once,
+    and are streamed to disk by the shared download manager (image_downloads.py).
+    """
+    image_url = item_data.get('image_url')
+    category = item_data.get('category') or 'uncategorized'
     
-    # Limit length
-    if len(name) > 200:
-        name = name[:200]
+    if not image_url:
+        return 'skipped'
     
-    return name
+    store = image_store.get_image_store(images_dir)
+    downloader = image_downloads.get_downloader(store.partial_dir)
+    try:
+        return store.save_item(category, item_name, image_url, downloader.download)
+    except OSError:
+        return 'failed'
 
-def save_menu_item_images(menu_items):
+def save_menu_item_images(menu_items, images_dir='images'):
     """Download and save images for all menu items"""
     # Create images directory structure
-    images_dir = 'images'
     os.makedirs(images_dir, exist_ok=True)
     
     # Track statistics
-    downloaded = 0
-    skipped = 0
-    failed = 0
-    
-    def download_task(item_name, item_data):
-        nonlocal downloaded, skipped, failed
-        
-        image_url = item_data.get('image_url')
-        category = item_data.get('category', 'uncategorized')
-        
-        if not image_url:
-            skipped += 1
-            return False
-        
-        # Create category folder
-        category_dir = os.path.join(images_dir, sanitize_filename(category))
-        os.makedirs(category_dir, exist_ok=True)
-        
-        # Determine file extension from URL
-        ext = '.jpg'  # default
-        if '.' in image_url:
-            url_ext = image_url.split('.')[-1].split('?')[0].lower()
-            if url_ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
-                ext = '.' + url_ext
-        
-        # Create filename from item name
-        filename = sanitize_filename(item_name) + ext
-        filepath = os.path.join(category_dir, filename)
-        
-        # Skip if already exists
-        if os.path.exists(filepath):
-            skipped += 1
-            return True
-        
-        # Download the image
-        if download_image(image_url, filepath):
-            downloaded += 1
-            return True
-        else:
-            failed += 1
-            return False
+    outcomes = {'downloaded': 0, 'skipped': 0, 'failed': 0}
     
     # Download images in parallel
-    with ThreadPoolExecutor(max_workers=10) as executor:
+    with ThreadPoolExecutor(max_workers=http_client.MAX_CONCURRENCY) as executor:
         futures = [
-            executor.submit(download_task, item_name, item_data)
+            executor.submit(save_menu_item_image, item_name, item_data, images_dir)
             for item_name, item_data in menu_items.items()
         ]
         
         for future in as_completed(futures):
-            future.result()
+            outcomes[future.result()] += 1
     
-    return downloaded, skipped, failed
+    image_store.get_image_store(images_dir).save()
+    return outcomes['downloaded'], outcomes['skipped'], outcomes['failed']
 
-def write_menu_csv(store_id, menu_items):
-    """Write menu items to CSV file"""
-    if not menu_items:
-        print("No menu items to write")
-        return
-    
-    # Ensure data directory exists
-    os.makedirs('data', exist_ok=True)
-    
-    csv_path = 'data/menu.csv'
-    
-    # Sort items by name for consistent ordering
-    sorted_items = sorted(menu_items.items())
-    
-    # Prepare headers and data row
-    headers = ['store_id'] + [item_name for item_name, _ in sorted_items]
-    data_row = [store_id] + [price for _, price in sorted_items]
-    
-    print("\n" + "="*80)
-    print("WRITING MENU CSV")
-    print("="*80)
-    print(f"Output file: {csv_path}")
-    print(f"Total columns: {len(headers)}")
-    print(f"Store ID: {store_id}")
-    print(f"Menu items: {len(menu_items)}")
-    
-    try:
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(headers)
-            writer.writerow(data_row)
-        
-        print(f"✓ Successfully wrote menu data to {csv_path}")
-        print("="*80 + "\n")
-        
-        # Display sample of items
-        print("Sample menu items (first 10):")
-        for i, (item_name, price) in enumerate(sorted_items[:10], 1):
-            print(f"  {i}. {item_name}: ${price:.2f}")
-        
-        if len(sorted_items) > 10:
-            print(f"  ... and {len(sorted_items) - 10} more items")
-        print()
-        
-    except Exception as e:
-        print(f"✗ Error writing CSV: {e}")
-        print("="*80 + "\n")
+def result_images(results):
+    """Unique items with an image across store results, as {images_dir: {item name: item data}}"""
+    images = {}
+    for result in results:
+        if not result['menu_items']:
+            continue
+        # Each brand keeps its own image store
+        batch_items = images.setdefault(brands.brand_of(result).images_dir, {})
+        for item_name, item_data in result['menu_items'].items():
+            if item_name not in batch_items and item_data.get('image_url'):
+                batch_items[item_name] = item_data
+    return images
+
+def save_result_images(results):
+    """Download and save the images of a batch of store results"""
+    for images_dir, menu_items in result_images(results).items():
+        if menu_items:
+            save_menu_item_images(menu_items, images_dir)
 
 def fetch_and_parse_store(location):
     """Fetch and parse the main menu page for a store"""
     store_id = location['store_id']
     location_name = location['location']
+    brand = brands.brand_of(location)
     
     try:
-        html_content = fetch_menu_page(store_id)
+        html_content = fetch_menu_page(store_id, brand)
         if not html_content:
-            return {
-                'store_id': store_id,
-                'location': location_name,
-                'success': False
-            }
+            return failed_store(location, 'EmptyPage')
         
-        categories = parse_categories(html_content, store_id)
+        categories = parse_categories(html_content, store_id, brand)
         if not categories:
-            return {
-                'store_id': store_id,
-                'location': location_name,
-                'success': False
-            }
+            return failed_store(location, 'NoCategories')
         
         return {
             'store_id': store_id,
+            'brand': brand.name,
             'location': location_name,
             'categories': categories,
             'success': True
         }
         
     except Exception as e:
-        return {
-            'store_id': store_id,
-            'location': location_name,
-            'success': False
-        }
+        return failed_store(location, error_class(e), str(e))
 
-def process_batch_fully_parallel(batch):
+def process_batch_fully_parallel(batch, download_images=True):
     """Process a batch of stores with fully parallel category fetching"""
     all_store_categories = {}
     failed_stores = []
@@ -519,67 +366,60 @@ def process_batch_fully_parallel(batch):
             location = future_to_store[future]
             result = future.result()
             if result['success']:
-                all_store_categories[result['store_id']] = result
+                # Store IDs are only unique within a brand
+                all_store_categories[(result['brand'], result['store_id'])] = result
             else:
-                # Track failed stores and add them to results with empty menu
-                failed_stores.append({
-                    'store_id': result['store_id'],
-                    'location': result['location'],
-                    'menu_items': {},
-                    'success': False
-                })
+                # Failed stores go to the retry queue, not the journal
+                failed_stores.append(result)
     
     # Step 2: Collect all category URLs from all stores
     all_category_tasks = []
-    for store_id, store_data in all_store_categories.items():
+    for store_key, store_data in all_store_categories.items():
         for category in store_data['categories']:
             all_category_tasks.append({
-                'store_id': store_id,
+                'store_key': store_key,
                 'category': category
             })
     
-    # Step 3: Fetch ALL category pages in parallel (across all stores)
-    category_results = {}
-    with ThreadPoolExecutor(max_workers=50) as executor:
+    # Step 3: Fetch and parse ALL category pages in parallel (across all stores)
+    # The adaptive limiter in http_client decides how many are actually in flight.
+    # Each page is parsed by the thread that fetched it and merged straight into
+    # its store, so no raw HTML outlives its own request
+    store_items = {store_key: {} for store_key in all_store_categories}
+    store_failures = {store_key: [] for store_key in all_store_categories}
+    with ThreadPoolExecutor(max_workers=http_client.MAX_CONCURRENCY) as executor:
         future_to_task = {
-            executor.submit(fetch_category_page, task['category']): task
+            executor.submit(fetch_category_items, task['category']): task
             for task in all_category_tasks
+            if task['category']['url']
         }
         
         for future in as_completed(future_to_task):
             task = future_to_task[future]
-            result = future.result()
-            store_id = task['store_id']
-            
-            if store_id not in category_results:
-                category_results[store_id] = []
-            category_results[store_id].append(result)
+            items, failure = future.result()
+            merge_menu_items(store_items[task['store_key']], items)
+            if failure:
+                store_failures[task['store_key']].append(failure)
     
-    # Step 4: Parse menu items for each store
+    # Step 4: Assemble the results for each store
     batch_results = []
-    all_batch_items = {}
-    
-    for store_id, store_data in all_store_categories.items():
-        store_category_results = category_results.get(store_id, [])
-        menu_items = parse_all_menu_items_parallel(store_category_results)
-          # Collect all unique items from this batch for image downloading
-        for item_name, item_data in menu_items.items():
-            if item_name not in all_batch_items and item_data.get('image_url'):
-                all_batch_items[item_name] = item_data
-        
+    
+    for store_key, store_data in all_store_categories.items():
         batch_results.append({
-            'store_id': store_id,
+            'store_id': store_data['store_id'],
+            'brand': store_data['brand'],
             'location': store_data['location'],
-            'menu_items': menu_items,
+            'menu_items': store_items[store_key],
+            'failed_categories': store_failures[store_key],
             'success': True
         })
     
-    # Add failed stores to results (so they get written to CSV with empty values)
-    batch_results.extend(failed_stores)
-    
     # Download images for all unique items in this batch
-    if all_batch_items:
-        save_menu_item_images(all_batch_items)
+    if download_images:
+        save_result_images(batch_results)
+    
+    # Failed stores are returned too, so they are recorded in the retry queue
+    batch_results.extend(failed_stores)
     
     return batch_results
 
@@ -587,6 +427,7 @@ def process_single_store(location):
     """Process a single store and return its menu items"""
     store_id = location['store_id']
     location_name = location['location']
+    brand = brands.brand_of(location)
     
     print(f"\n{'='*80}")
     print(f"Processing: {location_name} (Store ID: {store_id})")
@@ -594,59 +435,44 @@ def process_single_store(location):
     
     try:
         # Fetch the menu page
-        html_content = fetch_menu_page(store_id)
+        html_content = fetch_menu_page(store_id, brand)
         if not html_content:
             print(f"✗ Failed to fetch menu page for {store_id}")
-            return {
-                'store_id': store_id,
-                'location': location_name,
-                'menu_items': {},
-                'success': False
-            }
+            return failed_store(location, 'EmptyPage')
         
         # Parse the categories
-        categories = parse_categories(html_content, store_id)
+        categories = parse_categories(html_content, store_id, brand)
         if not categories:
             print(f"✗ Failed to parse categories for {store_id}")
-            return {
-                'store_id': store_id,
-                'location': location_name,
-                'menu_items': {},
-                'success': False
-            }
+            return failed_store(location, 'NoCategories')
         
         print(f"Found {len(categories)} categories")
         
-        # Fetch all category pages in parallel
-        category_results = fetch_all_categories_parallel(categories, max_workers=5)
-        
-        # Parse all menu items in parallel
-        menu_items = parse_all_menu_items_parallel(category_results)
+        # Fetch and parse all category pages in parallel, merging as they arrive
+        menu_items = {}
+        failed_categories = []
+        for items, failure in iter_category_items(categories):
+            merge_menu_items(menu_items, items)
+            if failure:
+                failed_categories.append(failure)
         
         print(f"✓ Successfully processed {store_id}: {len(menu_items)} unique items")
         
         return {
             'store_id': store_id,
+            'brand': brand.name,
             'location': location_name,
             'menu_items': menu_items,
+            'failed_categories': failed_categories,
             'success': True
         }
         
     except Exception as e:
         print(f"✗ Error processing store {store_id}: {e}")
-        return {
-            'store_id': store_id,
-            'location': location_name,
-            'menu_items': {},
-            'success': False
-        }
+        return failed_store(location, error_class(e), str(e))
 
-def process_stores_in_batches(locations, batch_size=5):
-    """Process all stores in batches, saving after each batch"""
-    # Load only menu items (not all rows) to track what columns exist
-    _, existing_items = load_existing_menu_data()
-    current_menu_items = existing_items
-    
+def process_stores_in_batches(locations, batch_size=5, crawl_state=None):
+    """Process all stores in batches, journaling results after each batch"""
     # Calculate total batches
     total_batches = (len(locations) + batch_size - 1) // batch_size
     
@@ -658,165 +484,663 @@ def process_stores_in_batches(locations, batch_size=5):
             # Process batch with fully parallelized category fetching
             batch_results = process_batch_fully_parallel(batch)
             
-            # Check if new menu items were discovered
-            batch_menu_items = set()
-            for result in batch_results:
-                if result['success']:
-                    batch_menu_items.update(result['menu_items'].keys())
-            
-            new_items_found = batch_menu_items - current_menu_items
-            
-            # Save CSV after each batch
-            if new_items_found:
-                # New columns found - need to rewrite entire CSV
-                existing_rows, _ = load_existing_menu_data()
-                current_menu_items = write_comprehensive_menu_csv(batch_results, existing_rows, current_menu_items)
-            else:
-                # No new columns - just append new rows
-                current_menu_items = append_to_menu_csv(batch_results, current_menu_items)
+            # Append results to the journal after each batch
+            save_batch_results(batch_results, crawl_state)
             
             pbar.update(1)
 
-def append_to_menu_csv(store_results, existing_items):
-    """Append new store rows to CSV without rewriting entire file"""
-    if not store_results:
-        return existing_items
-    
-    csv_path = 'data/menu.csv'
+class StoreAssembly:
+    """Collects one store's parsed category pages as they finish, in any order"""
+    
+    def __init__(self, location, pending_categories):
+        self.location = location
+        self.remaining = pending_categories
+        self.menu_items = {}
+        self.failed_categories = []
+        self.lock = threading.Lock()
+    
+    def add_items(self, items, failure=None):
+        """Merge one category's items; returns True when this was the store's last category"""
+        with self.lock:
+            merge_menu_items(self.menu_items, items)
+            if failure:
+                self.failed_categories.append(failure)
+            self.remaining -= 1
+            return self.remaining == 0
+    
+    def result(self):
+        return {
+            'store_id': self.location['store_id'],
+            'brand': brands.brand_of(self.location).name,
+            'location': self.location['location'],
+            'menu_items': self.menu_items,
+            'failed_categories': self.failed_categories,
+            'success': True
+        }
+
+def process_stores_pipelined(locations, batch_size=5, crawl_state=None):
+    """Process all stores through a continuous fetch -> parse -> persist -> image pipeline"""
+    seen_images = set()
+    seen_lock = threading.Lock()
+    pending_results = []
+    
+    pbar = tqdm(total=len(locations), desc="Processing stores", unit="store")
+    
+    def fetch_store(location, emit):
+        result = fetch_and_parse_store(location)
+        if not result['success']:
+            emit('persist', result)
+            return
+        categories = [category for category in result['categories'] if category['url']]
+        assembly = StoreAssembly(location, len(categories))
+        if not categories:
+            emit('persist', assembly.result())
+        for category in categories:
+            emit('fetch_categories', (assembly, category))
+    
+    def fetch_store_failed(location, error, emit):
+        # Queued for retry like a store whose menu page failed to load
+        emit('persist', failed_store(location, error_class(error), str(error)))
+    
+    def fetch_category(task, emit):
+        assembly, category = task
+        emit('parse', (assembly, fetch_category_page(category)))
+    
+    def category_failed(assembly, category, error, emit):
+        # The category goes to the retry queue and the store still completes
+        failure = category_failure(category, error_class(error), str(error))
+        if assembly.add_items([], failure):
+            emit('persist', assembly.result())
+    
+    def fetch_category_failed(task, error, emit):
+        assembly, category = task
+        category_failed(assembly, category, error, emit)
+    
+    def parse_failed(task, error, emit):
+        assembly, result = task
+        category_failed(assembly, result['category'], error, emit)
+    
+    def parse(task, emit):
+        assembly, result = task
+        items = []
+        failure = None
+        if not result['success']:
+            failure = category_failure(result['category'], result['error_class'], result['error'])
+        elif not result['html']:
+            failure = category_failure(result['category'], 'EmptyPage')
+        else:
+            category = result['category']
+            items = parse_menu_items(result['html'], category.get('name', ''), brands.brand_of(category))
+        if assembly.add_items(items, failure):
+            emit('persist', assembly.result())
+    
+    def persist(result, emit):
+        pending_results.append(result)
+        if len(pending_results) >= batch_size:
+            flush_results()
+        pbar.update(1)
+        
+        # Each unique image is downloaded once per brand for the whole run
+        images_dir = brands.brand_of(result).images_dir
+        for item_name, item_data in result['menu_items'].items():
+            if not item_data.get('image_url'):
+                continue
+            with seen_lock:
+                if (images_dir, item_name) in seen_images:
+                    continue
+                seen_images.add((images_dir, item_name))
+            emit('images', (item_name, item_data, images_dir))
+    
+    def flush_results():
+        if pending_results:
+            save_batch_results(pending_results[:], crawl_state)
+            pending_results.clear()
+    
+    def save_image(task, emit):
+        item_name, item_data, images_dir = task
+        save_menu_item_image(item_name, item_data, images_dir)
+    
+    fetch_workers = http_client.MAX_CONCURRENCY
+    pipeline = Pipeline([
+        Stage('fetch_store', fetch_store, workers=max(1, fetch_workers // 4), on_error=fetch_store_failed),
+        Stage('fetch_categories', fetch_category, workers=fetch_workers, on_error=fetch_category_failed),
+        Stage('parse', parse, workers=os.cpu_count() or 4, on_error=parse_failed),
+        # A single persist worker keeps journal writes ordered and lock-free
+        Stage('persist', persist, workers=1, maxsize=batch_size * 4, on_finish=flush_results),
+        Stage('images', save_image, workers=max(1, fetch_workers // 4), maxsize=fetch_workers * 4)
+    ])
+    
+    def report(depths):
+        pbar.set_postfix(depths)
+    
+    pipeline.run('fetch_store', locations, on_tick=report)
+    pbar.close()
+    print(f"Pipeline stages - {pipeline.summary()}")
+
+def save_batch_results(batch_results, crawl_state=None):
+    """Append a batch of store results to the menu journal and the crawl state database
+    
+    Failed stores are only recorded in the crawl state (its retry queue) - an
+    empty journal row would make them look crawled. Each brand's results go
+    to its own journal; crawl_state may be a BrandCrawlStates to route the
+    results of a multi-brand run.
+    """
+    succeeded = [result for result in batch_results if result['success']]
+    for brand, results in brands.group_by_brand(succeeded):
+        append_store_results(results, brand.journal_path)
+    if crawl_state is not None:
+        crawl_state.record_menu_results(batch_results)
+
+class BrandCrawlStates:
+    """Routes menu results to the crawl state database of the brand they belong to"""
     
-    if not os.path.exists(csv_path):
-        # If CSV doesn't exist, create it with these results
-        return write_comprehensive_menu_csv(store_results, None, existing_items)
+    def __init__(self, crawl_states):
+        # brand name -> CrawlState
+        self.crawl_states = crawl_states
     
-    # Sort menu items alphabetically for consistent ordering
-    sorted_menu_items = sorted(existing_items)
+    def record_menu_results(self, store_results):
+        for brand, results in brands.group_by_brand(store_results):
+            self.crawl_states[brand.name].record_menu_results(results)
+
+# ---------------------------------------------------------------------------
+# Asyncio crawl engine
+#
+# One event loop and one aiohttp session drive every store for the whole run.
+# Requests share a single connection pool and an adaptive in-flight limit per
+# host, so the crawl is bounded by each remote host rather than by per-batch
+# thread pools, and the hosts of several brands are crawled side by side.
+# The synchronous functions above remain available as the fallback mode.
+# ---------------------------------------------------------------------------
+
+ASYNC_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+async def async_fetch_text(session, url, limiters, retries=3, backoff_factor=0.3, raw=False):
+    """Fetch a URL with the shared aiohttp session, retrying on 5xx and network errors
+
+    Returns the decoded text, or the undecoded body bytes when raw is set.
+    Raises the last error once retries are exhausted.
+    """
+    cache = http_client.CACHE
+    entry = await asyncio.to_thread(cache.lookup, url) if cache is not None else None
+    if entry is not None and cache.is_fresh(entry):
+        cache.record_hit()
+        if raw:
+            return entry.body
+        return entry.body.decode(entry.encoding or 'utf-8', errors='replace')
+    request_headers = cache.conditional_headers(entry) if entry is not None else {}
+    
+    async def send(on_wire):
+        await http_client.throttle_async(url)
+        async with limiters.slot(url) as slot:
+            # The hedge delay and the latency sample count from here, not
+            # from before the rate limit and slot waits
+            on_wire()
+            started = time.monotonic()
+            timeout = aiohttp.ClientTimeout(total=http_client.request_timeout(url))
+            async with session.get(url, headers=request_headers, timeout=timeout) as response:
+                slot.status = response.status
+                http_client.note_response(url, response.status, response.headers)
+                body = await response.read() if 200 <= response.status < 300 else None
+                http_client.record_latency(url, time.monotonic() - started)
+                return response, body
+    
+    for attempt in range(retries + 1):
+        try:
+            # Adaptive timeout, and a hedged second copy if this runs past the host's p95
+            response, body = await http_client.hedged_async(url, send)
+            if entry is not None and response.status == 304:
+                await asyncio.to_thread(cache.mark_revalidated, url, response.headers)
+                if raw:
+                    return entry.body
+                return entry.body.decode(entry.encoding or 'utf-8', errors='replace')
+            if response.status in ASYNC_RETRY_STATUSES and attempt < retries:
+                raise aiohttp.ClientResponseError(
+                    response.request_info, response.history, status=response.status
+                )
+            response.raise_for_status()
+            if body is None:
+                # e.g. a 304 without a cache entry - a failed fetch like any other
+                raise aiohttp.ClientResponseError(
+                    response.request_info, response.history, status=response.status,
+                    message='Unexpected status without a body'
+                )
+            encoding = response.get_encoding()
+            if cache is not None:
+                await asyncio.to_thread(cache.store, url, body, response.headers, encoding)
+            if raw:
+                return body
+            return body.decode(encoding, errors='replace')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if isinstance(e, aiohttp.ClientResponseError) and e.status not in ASYNC_RETRY_STATUSES:
+                raise
+            if attempt >= retries:
+                raise
+            # Same schedule as urllib3's Retry: backoff_factor * 2^(attempt).
+            # 429s also pause the host in the rate limiter via note_response
+            await asyncio.sleep(backoff_factor * (2 ** attempt))
+
+async def async_fetch_category_items(session, category, limiters):
+    """Fetch one category page and parse it as soon as it arrives; returns (items, failure or None)"""
+    try:
+        html = await async_fetch_text(session, category['url'], limiters, raw=True)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return [], category_failure(category, error_class(e), str(e))
+    if not html:
+        return [], category_failure(category, 'EmptyPage')
+    # Parse off the event loop so slow pages don't stall other stores' I/O;
+    # the page is dropped as soon as this returns
+    brand = brands.brand_of(category)
+    return await asyncio.to_thread(parse_menu_items, html, category.get('name', ''), brand), None
+
+async def async_process_store(session, location, limiters):
+    """Fetch the store page, all category pages and parse the menu for one store"""
+    store_id = location['store_id']
+    location_name = location['location']
+    brand = brands.brand_of(location)
     
     try:
-        # Append new rows to existing CSV
-        with open(csv_path, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            for result in store_results:
-                # Write row for both successful and failed stores
-                # Failed stores will have empty values for all menu items
-                row = [result['store_id']]
-                for item_name in sorted_menu_items:
-                    item_data = result['menu_items'].get(item_name)
-                    # Extract price from nested dictionary
-                    if item_data:
-                        price = item_data.get('price') if isinstance(item_data, dict) else item_data
-                    else:
-                        price = None
-                    row.append(price if price is not None else '')
-                writer.writerow(row)
-        
-        return set(existing_items)  # Ensure we return a set
+        html_content = await async_fetch_text(session, brand.menu_url(store_id), limiters)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return failed_store(location, error_class(e), str(e))
+    if not html_content:
+        return failed_store(location, 'EmptyPage')
+    
+    categories = await asyncio.to_thread(parse_categories, html_content, store_id, brand)
+    if not categories:
+        return failed_store(location, 'NoCategories')
+    
+    # Fetch every category page concurrently - the host's limiter bounds the total
+    menu_items = {}
+    failed_categories = []
+    for parsed in asyncio.as_completed([
+        async_fetch_category_items(session, category, limiters)
+        for category in categories if category['url']
+    ]):
+        items, failure = await parsed
+        merge_menu_items(menu_items, items)
+        if failure:
+            failed_categories.append(failure)
+    
+    return {
+        'store_id': store_id,
+        'brand': brand.name,
+        'location': location_name,
+        'menu_items': menu_items,
+        'failed_categories': failed_categories,
+        'success': True
+    }
+
+async def crawl_stores_async(locations, on_result, max_concurrency=50, max_stores_in_flight=20, timeout=http_client.DEFAULT_TIMEOUT):
+    """Crawl all stores on one event loop, calling on_result(result) as each store finishes"""
+    # Each host's limiter bounds its own connections - no global cap across hosts
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=max_concurrency, ttl_dns_cache=300)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    limiters = HostConcurrency(
+        min(http_client.INITIAL_CONCURRENCY, max_concurrency),
+        max_limit=max_concurrency,
+        name='asyncio engine'
+    )
+    
+    queue = asyncio.Queue()
+    for location in locations:
+        queue.put_nowait(location)
+    
+    async with aiohttp.ClientSession(connector=connector, headers=http_client.DEFAULT_HEADERS, timeout=client_timeout) as session:
+        async def store_worker():
+            while True:
+                try:
+                    location = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    result = await async_process_store(session, location, limiters)
+                except Exception as e:
+                    result = failed_store(location, error_class(e), str(e))
+                await on_result(result)
         
-    except Exception as e:
-        print(f"Error appending to CSV: {e}")
-        return set(existing_items)
-
-def write_comprehensive_menu_csv(store_results, existing_rows=None, existing_items=None):
-    """Write comprehensive CSV with all stores and all menu items"""
-    if not store_results and not existing_rows:
-        print("No store results to write")
-        return set()
-    
-    # Ensure data directory exists
-    os.makedirs('data', exist_ok=True)
-    
-    csv_path = 'data/menu.csv'
-    
-    # Start with existing menu items if any
-    all_menu_items = set(existing_items) if existing_items else set()
-    
-    # Add new menu items from current batch
-    for result in store_results:
-        if result['success']:
-            # menu_items is now a dict of {name: {price, image_url, category}}
-            all_menu_items.update(result['menu_items'].keys())
-    
-    # Sort menu items alphabetically for consistent ordering
-    sorted_menu_items = sorted(all_menu_items)
-    
-    # Prepare headers
-    headers = ['store_id'] + sorted_menu_items
-    
-    # Start with existing rows, updated with new columns if needed
-    rows = []
-    if existing_rows:
-        for existing_row in existing_rows:
-            row = [existing_row['store_id']]
-            for item_name in sorted_menu_items:
-                # Use existing value or empty string for new items
-                price = existing_row.get(item_name, '')
-                row.append(price)
-            rows.append(row)
-      # Add new rows from current batch
-    successful_stores = 0
-    failed_stores = 0
-    
-    for result in store_results:
-        if result['success']:
-            successful_stores += 1
+        workers = [asyncio.create_task(store_worker()) for _ in range(min(max_stores_in_flight, len(locations)))]
+        await asyncio.gather(*workers)
+    
+    return limiters
+
+def process_stores_async(locations, batch_size=5, max_concurrency=50, max_stores_in_flight=20, crawl_state=None):
+    """Crawl all stores with the asyncio engine, journaling results every batch_size stores"""
+    pending = []
+    write_lock = asyncio.Lock()
+    
+    async def flush():
+        batch_results = pending[:]
+        pending.clear()
+        # Disk and image work runs in a thread so fetching continues meanwhile
+        await asyncio.to_thread(save_batch_results, batch_results, crawl_state)
+        await asyncio.to_thread(save_result_images, batch_results)
+    
+    async def run():
+        with tqdm(total=len(locations), desc="Processing stores", unit="store") as pbar:
+            async def on_result(result):
+                pending.append(result)
+                pbar.update(1)
+                if len(pending) >= batch_size:
+                    async with write_lock:
+                        await flush()
+            
+            limiters = await crawl_stores_async(locations, on_result, max_concurrency, max_stores_in_flight)
+            async with write_lock:
+                if pending:
+                    await flush()
+        return limiters
+    
+    limiters = asyncio.run(run())
+    print(limiters.format_history())
+
+def peak_rss_mb():
+    """Return this process's peak resident set size in MB, or None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / 1024 ** 2 if os.uname().sysname == 'Darwin' else peak / 1024
+
+def run_crawl(locations, crawl_state, args):
+    """Crawl the given stores with the engine chosen on the command line"""
+    if args.parse_workers and parse_pool.POOL is None:
+        cache = parse_cache.PARSE_CACHE
+        pool = parse_pool.enable_parse_pool(None if args.parse_workers < 0 else args.parse_workers,
+                                            cache.max_entries if cache is not None else 0)
+        print(f"Parsing pages in {pool.workers} worker processes")
+    
+    engine = args.engine
+    if engine == 'async' and aiohttp is None:
+        print("aiohttp is not installed - falling back to the threaded pipeline")
+        engine = 'pipeline'
+    
+    if engine == 'async':
+        process_stores_async(
+            locations,
+            batch_size=args.batch_size,
+            max_concurrency=args.concurrency,
+            max_stores_in_flight=args.stores_in_flight,
+            crawl_state=crawl_state
+        )
+    else:
+        if engine == 'pipeline':
+            process_stores_pipelined(locations, batch_size=args.batch_size, crawl_state=crawl_state)
         else:
-            failed_stores += 1
-        
-        # Build row with prices or empty string for missing items
-        row = [result['store_id']]
-        for item_name in sorted_menu_items:
-            item_data = result['menu_items'].get(item_name)
-            # Extract price from nested dictionary
-            if item_data:
-                price = item_data.get('price') if isinstance(item_data, dict) else item_data
-            else:
-                price = None
-            row.append(price if price is not None else '')
-        rows.append(row)
+            # Process remaining stores in batches
+            process_stores_in_batches(locations, batch_size=args.batch_size, crawl_state=crawl_state)
+        print(http_client.format_concurrency_report())
+
+def zone_refresh(crawl_state, args, brand=None):
+    """Re-crawl zone representatives and a spot-check sample, escalating zones whose prices moved"""
+    brand = brand or brands.get_brand()
+    zones = crawl_state.pricing_zones()
+    if not zones:
+        print(f"No {brand.display_name} pricing zones yet - run "
+              f"`python scrape/pricing_zones.py --brand {brand.name} --save` first")
+        return
     
-    try:
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(headers)
-            writer.writerows(rows)
-        
-        return all_menu_items  # Return set, not sorted list
+    store_ids, store_zone = pricing_zones.plan_zone_refresh(zones, args.spot_check)
+    print(f"Zone refresh: checking {len(store_ids)} {brand.display_name} stores across {len(zones)} pricing zones")
+    
+    before = pricing_zones.load_price_vectors(brand.menu_csv_path)
+    run_crawl(brands.tag_brand(crawl_state.stores_by_id(store_ids), brand), crawl_state, args)
+    crawl_state.mark_zone_checked(store_ids)
+    compact_journal(brand.journal_path, brand.menu_csv_path)
+    
+    after = pricing_zones.load_price_vectors(brand.menu_csv_path)
+    changed = pricing_zones.changed_zones(before, {store_id: after.get(store_id, {}) for store_id in store_ids}, store_zone)
+    if not changed:
+        print("No price changes in any checked store - zones are unchanged")
+        return
+    
+    # A representative or sampled store moved - re-crawl the rest of its zone
+    checked = set(store_ids)
+    escalated = [
+        store_id
+        for zone in changed
+        for store_id, _, _ in zones[zone]
+        if store_id not in checked
+    ]
+    print(f"Prices changed in {len(changed)} zones - re-crawling their other {len(escalated)} stores")
+    if escalated:
+        run_crawl(brands.tag_brand(crawl_state.stores_by_id(escalated), brand), crawl_state, args)
+        crawl_state.mark_zone_checked(escalated)
+    print(f"Re-run `python scrape/pricing_zones.py --brand {brand.name} --save` to re-cluster "
+          f"the changed zones in {brand.state_path}")
+
+def retry_failed_categories(entries, crawl_state, brand=None):
+    """Re-fetch only the failed category pages and record them as partial store results"""
+    brand = brand or brands.get_brand()
+    by_store = {}
+    for entry in entries:
+        # Each brand has its own retry queue, so its entries are its categories
+        by_store.setdefault(entry['store_id'], []).append(dict(entry['payload'], brand=brand.name))
+    locations = {location['store_id']: location for location in crawl_state.stores_by_id(by_store)}
+    
+    results = {
+        store_id: {
+            'store_id': store_id,
+            'brand': brand.name,
+            'location': locations.get(store_id, {}).get('location'),
+            'menu_items': {},
+            'failed_categories': [],
+            'retried_categories': [category['url'] for category in categories],
+            'partial': True,
+            'success': True
+        }
+        for store_id, categories in by_store.items()
+    }
+    
+    with ThreadPoolExecutor(max_workers=http_client.MAX_CONCURRENCY) as executor:
+        future_to_store = {
+            executor.submit(fetch_category_items, category): store_id
+            for store_id, categories in by_store.items()
+            for category in categories
+        }
         
-    except Exception as e:
-        return existing_items if existing_items else set()
+        for future in tqdm(as_completed(future_to_store), total=len(future_to_store),
+                           desc="Retrying categories", unit="page"):
+            result = results[future_to_store[future]]
+            items, failure = future.result()
+            merge_menu_items(result['menu_items'], items)
+            if failure:
+                result['failed_categories'].append(failure)
+    
+    save_batch_results(list(results.values()), crawl_state)
 
-def main():
-    """Main function to fetch and display the menu categories"""
-    # Load all locations
-    all_locations = load_all_locations()
+def drain_retry_queue(crawl_state, args, include_all=False, brand=None):
+    """Retry failed stores and category pages from the retry queue
+    
+    Only entries whose backoff has expired are retried unless include_all is
+    set (--retry-failed), which retries the whole queue.
+    """
+    entries = crawl_state.due_retries(include_all)
+    if not entries:
+        return
+    
+    store_ids = [entry['store_id'] for entry in entries if entry['kind'] == 'store']
+    # A store being retried re-fetches all its categories anyway
+    retrying = set(store_ids)
+    categories = [entry for entry in entries if entry['kind'] == 'category' and entry['store_id'] not in retrying]
+    
+    brand = brand or brands.get_brand()
+    print(f"\nRetrying {len(store_ids)} failed {brand.display_name} stores and {len(categories)} failed category pages")
+    if store_ids:
+        run_crawl(brands.tag_brand(crawl_state.stores_by_id(store_ids), brand), crawl_state, args)
+    if categories:
+        retry_failed_categories(categories, crawl_state, brand)
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Scrape menus for every store in each brand's locations.csv")
+    parser.add_argument('--brands', default=brands.DEFAULT_BRAND,
+                        help=f"Comma-separated brands crawled together in one run, from {', '.join(sorted(brands.BRANDS))} (default: {brands.DEFAULT_BRAND})")
+    parser.add_argument('--engine', choices=['async', 'pipeline', 'batch'], default='async',
+                        help="Crawl engine: asyncio (default), threaded pipeline, or threaded fixed batches")
+    parser.add_argument('--batch-size', type=int, default=5,
+                        help="Number of stores per journal write (default: 5)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Only rebuild each brand's menu.csv from its menu journal and exit")
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help="Upper bound for the adaptive per-host in-flight request limit of the asyncio engine (default: 50)")
+    parser.add_argument('--stores-in-flight', type=int, default=20,
+                        help="Maximum stores crawled at once by the asyncio engine (default: 20)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Fetch every page from the network instead of the response cache")
+    parser.add_argument('--cache-ttl', type=float, default=http_client.DEFAULT_TTL,
+                        help="Seconds a cached page is used without revalidating (default: one day)")
+    parser.add_argument('--rate', type=float, default=http_client.DEFAULT_RATE,
+                        help=f"Requests per second allowed per host (default: {http_client.DEFAULT_RATE})")
+    parser.add_argument('--hedge-budget', type=float, default=http_client.DEFAULT_HEDGE_RATIO,
+                        help=f"Share of requests that may be hedged with a second copy, 0 to disable (default: {http_client.DEFAULT_HEDGE_RATIO})")
+    parser.add_argument('--burst', type=int, default=http_client.DEFAULT_BURST,
+                        help=f"Burst size for the per-host rate limit (default: {http_client.DEFAULT_BURST})")
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="Parse pages in this many worker processes, -1 for one per core (default: 0, parse in threads)")
+    parser.add_argument('--parse-cache-size', type=int, default=parse_cache.DEFAULT_MAX_ENTRIES,
+                        help=f"Parsed category payloads kept for reuse, per parse worker with --parse-workers, 0 to disable (default: {parse_cache.DEFAULT_MAX_ENTRIES})")
+    parser.add_argument('--zone-refresh', action='store_true',
+                        help="Refresh prices by re-crawling pricing-zone representatives (see pricing_zones.py)")
+    parser.add_argument('--spot-check', type=float, default=0.1,
+                        help="Share of non-representative stores per zone re-checked by --zone-refresh (default: 0.1)")
+    parser.add_argument('--refresh-older-than', type=float, metavar='HOURS',
+                        help="Re-crawl stores whose menu is older than HOURS; only changed prices are added to the price history")
+    parser.add_argument('--refresh-limit', type=int,
+                        help="Maximum stores re-crawled by --refresh-older-than in one run (oldest first)")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Only retry the stores and category pages in the retry queue, ignoring their backoff")
+    parser.add_argument('--image-layout', choices=image_store.LAYOUTS, default=image_store.DEFAULT_LAYOUT,
+                        help="How stored images appear under images/<category>/ (default: hardlink)")
+    parser.add_argument('--image-phash-distance', type=int,
+                        help="Treat images within this many bits of perceptual hash as duplicates (needs Pillow)")
+    return parser.parse_args()
+
+def open_crawl_state(brand):
+    """Open a brand's crawl state database and add new stores from its locations.csv
+    
+    Returns (crawl_state, processed store IDs), or None if the brand has no locations yet.
+    """
+    all_locations = load_all_locations(brand)
     
     if not all_locations:
-        print("No locations found in data/locations.csv")
-        return
+        print(f"No locations found in {brand.locations_csv_path}")
+        return None
     
-    print(f"\nFound {len(all_locations)} total locations")
+    print(f"\nFound {len(all_locations)} total {brand.display_name} locations")
     
-    # Check for already processed stores
-    processed_store_ids = load_processed_store_ids()
+    # Resume from the crawl state database - new locations are added as pending
+    crawl_state = CrawlState(brand.state_path)
+    crawl_state.upsert_stores(all_locations)
     
-    if processed_store_ids:
-        print(f"Found {len(processed_store_ids)} already processed stores")
-        print(f"Resuming from where we left off...\n")
-        
-        # Filter out already processed stores
-        locations_to_process = [loc for loc in all_locations if loc['store_id'] not in processed_store_ids]
-        
-        print(f"Remaining stores to process: {len(locations_to_process)}")
+    processed_store_ids = crawl_state.processed_store_ids()
+    if not processed_store_ids:
+        # First run with the database - carry over progress from menu.csv / the journal
+        processed_store_ids = load_processed_store_ids(brand)
+        crawl_state.mark_stores_processed(processed_store_ids)
+    return crawl_state, processed_store_ids
+
+def main():
+    """Main function to fetch and display the menu categories"""
+    args = parse_args()
+    try:
+        selected = [brands.get_brand(name.strip()) for name in args.brands.split(',') if name.strip()]
+    except ValueError as e:
+        print(e)
+        return
+    http_client.configure_rate_limit(args.rate, args.burst)
+    http_client.configure_hedging(args.hedge_budget)
+    
+    if args.compact:
+        for brand in selected:
+            stores, items = compact_journal(brand.journal_path, brand.menu_csv_path)
+            print(f"Compacted journal into {brand.menu_csv_path}: {stores} stores, {items} items")
+        return
+    if not args.no_cache:
+        # A refresh must see current prices, so every cached page is revalidated
+        refreshing = args.zone_refresh or args.refresh_older_than is not None
+        http_client.enable_cache(ttl=0 if refreshing else args.cache_ttl)
+    
+    crawl_states = {}
+    processed_store_ids = {}
+    for brand in selected:
+        opened = open_crawl_state(brand)
+        if opened is not None:
+            crawl_states[brand.name], processed_store_ids[brand.name] = opened
+    if not crawl_states:
+        return
+    active = [brand for brand in selected if brand.name in crawl_states]
+    # Results of an interleaved crawl go to the crawl state of their brand
+    brand_states = BrandCrawlStates(crawl_states)
+    
+    parse_cache.configure_parse_cache(args.parse_cache_size)
+    for brand in active:
+        image_store.configure_image_store(brand.images_dir, args.image_layout, args.image_phash_distance)
+    
+    if args.retry_failed:
+        for brand in active:
+            drain_retry_queue(crawl_states[brand.name], args, include_all=True, brand=brand)
+    elif args.zone_refresh:
+        for brand in active:
+            zone_refresh(crawl_states[brand.name], args, brand)
+    elif args.refresh_older_than is not None:
+        stale = brands.interleave(*[
+            brands.tag_brand(crawl_states[brand.name].stale_stores(args.refresh_older_than * 3600, args.refresh_limit), brand)
+            for brand in active
+        ])
+        print(f"Refreshing {len(stale)} stores last crawled over {args.refresh_older_than:g} hours ago")
+        if stale:
+            run_crawl(stale, brand_states, args)
+    else:
+        pending = []
+        for brand in active:
+            locations_to_process = brands.tag_brand(crawl_states[brand.name].pending_stores(), brand)
+            pending.append(locations_to_process)
+            
+            if processed_store_ids[brand.name]:
+                print(f"Found {len(processed_store_ids[brand.name])} already processed {brand.display_name} stores")
+                print(f"Resuming from where we left off...\n")
+                print(f"Remaining stores to process: {len(locations_to_process)}")
+            else:
+                print(f"Starting fresh - no existing {brand.display_name} data found\n")
         
-        if not locations_to_process:
+        # One queue for every brand, alternating between them so each
+        # brand's hosts get requests (at their own per-host limits) all run
+        locations_to_process = brands.interleave(*pending)
+        if locations_to_process:
+            run_crawl(locations_to_process, brand_states, args)
+        else:
             print("\nAll stores have already been processed!")
-            return
-    else:
-        print("Starting fresh - no existing data found\n")
-        locations_to_process = all_locations
     
-    # Process remaining stores in batches
-    process_stores_in_batches(locations_to_process, batch_size=5)
+    if not args.retry_failed:
+        # Failures from this run (and earlier ones) whose backoff has expired
+        for brand in active:
+            drain_retry_queue(crawl_states[brand.name], args, brand=brand)
+    
+    parse_pool.close_parse_pool()
+    stores = image_store.open_image_stores()
+    for store in stores:
+        store.save()
+    
+    # Pivot each journal into the wide CSV the web UI reads
+    for brand in active:
+        total, items = compact_journal(brand.journal_path, brand.menu_csv_path)
+        print(f"Compacted journal into {brand.menu_csv_path}: {total} stores, {items} items")
+    
+    if http_client.CACHE is not None:
+        print(http_client.CACHE.stats())
+    if parse_cache.PARSE_CACHE is not None:
+        print(parse_cache.PARSE_CACHE.stats())
+    print(http_client.HEDGER.stats())
+    for store in stores:
+        print(store.stats())
+    for downloader in image_downloads.DOWNLOADERS.values():
+        print(downloader.stats())
+    for brand in active:
+        print(f"{brand.display_name}: {crawl_states[brand.name].retry_summary()}")
+    
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"Peak memory: {peak:.0f} MB")
     
     print("\n" + "="*80)
     print("PROCESSING COMPLETE!")
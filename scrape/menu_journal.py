@@ -0,0 +1,172 @@
+import csv
+import os
+import threading
+import time
+
+# Append-only, long-format menu journal.
+#
+# The crawler appends one (store_id, item, price, category, timestamp) row per
+# menu item as results arrive, instead of rewriting the wide store x item
+# data/menu.csv whenever a new item shows up. compact_journal() pivots the
+# journal into the wide menu.csv that js/csvParser.js reads - once at the end
+# of a run or on demand with `python scrape/menu.py --compact`.
+#
+# Once compacted, everything in the journal is in menu.csv, so the journal is
+# emptied - refreshes don't pile up full copies of every menu. Compaction
+# first renames the journal to a sealed <journal>.compacting segment under the
+# append lock, so rows appended while it runs go to a fresh journal and are
+# never deleted with the compacted ones. Price history
+# lives in the crawl state database (see crawl_state.py).
+#
+# A store that was crawled but produced no items is recorded as a single row
+# with an empty item, so it still gets a (blank) row in menu.csv.
+#
+# Rows of a complete result (every category fetched) are marked complete, and
+# compaction replaces the store's whole row with them - an item a full
+# re-crawl no longer returns is dropped, as crawl_state records it removed.
+# Partial results (category retries, stores with failed categories) are laid
+# over the existing row item by item.
+
+JOURNAL_PATH = 'data/menu_journal.csv'
+MENU_CSV_PATH = 'data/menu.csv'
+JOURNAL_FIELDS = ['store_id', 'item', 'price', 'category', 'timestamp', 'complete']
+
+SEGMENT_SUFFIX = '.compacting'
+
+_journal_lock = threading.Lock()
+# Only one compaction at a time works on the sealed segment
+_compact_lock = threading.Lock()
+
+def is_complete(result):
+    """Whether a store result covers the store's whole menu (same rule as crawl_state's removals)"""
+    return not result.get('partial') and not result.get('failed_categories')
+
+def append_store_results(store_results, journal_path=JOURNAL_PATH):
+    """Append a batch of store results to the journal"""
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+    rows = []
+    for result in store_results:
+        menu_items = result.get('menu_items') or {}
+        if not menu_items:
+            rows.append([result['store_id'], '', '', '', timestamp, ''])
+            continue
+        complete = '1' if is_complete(result) else ''
+        for item_name, item_data in menu_items.items():
+            if isinstance(item_data, dict):
+                price = item_data.get('price')
+                category = item_data.get('category', '')
+            else:
+                price, category = item_data, ''
+            rows.append([result['store_id'], item_name, '' if price is None else price, category, timestamp, complete])
+
+    directory = os.path.dirname(journal_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with _journal_lock:
+        new_file = not os.path.exists(journal_path)
+        with open(journal_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(JOURNAL_FIELDS)
+            writer.writerows(rows)
+    return len(rows)
+
+def iter_journal(journal_path=JOURNAL_PATH):
+    """Yield journal rows as dicts, oldest first"""
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            # Journals written before the complete column read as partial
+            yield dict(zip(JOURNAL_FIELDS, row + [''] * (len(JOURNAL_FIELDS) - len(row))))
+
+def load_journal_store_ids(journal_path=JOURNAL_PATH):
+    """Return the set of store IDs recorded in the journal (and any segment not yet compacted)"""
+    store_ids = {row['store_id'] for row in iter_journal(journal_path + SEGMENT_SUFFIX)}
+    store_ids.update(row['store_id'] for row in iter_journal(journal_path))
+    return store_ids
+
+def seal_journal(journal_path=JOURNAL_PATH):
+    """Move the journal's rows into the sealed segment; returns the segment path
+
+    A segment left behind by an interrupted compaction is kept, and the live
+    journal's rows are appended to it so they are compacted after it.
+    """
+    segment_path = journal_path + SEGMENT_SUFFIX
+    with _journal_lock:
+        if not os.path.exists(journal_path):
+            return segment_path
+        if not os.path.exists(segment_path):
+            os.replace(journal_path, segment_path)
+            return segment_path
+        with open(journal_path, 'r', encoding='utf-8', newline='') as source:
+            rows = list(csv.reader(source))[1:]
+        with open(segment_path, 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(rows)
+        os.remove(journal_path)
+    return segment_path
+
+def compact_journal(journal_path=JOURNAL_PATH, menu_csv_path=MENU_CSV_PATH):
+    """Pivot the journal (on top of any existing menu.csv) into the wide menu.csv
+
+    Later journal rows win over earlier ones and over the existing CSV, and a
+    complete result replaces its store's row outright. The new
+    file is written next to the old one and renamed into place, so readers
+    never see a half-written menu.csv. Returns (stores, items).
+    """
+    with _compact_lock:
+        return _compact_segment(seal_journal(journal_path), menu_csv_path)
+
+def _compact_segment(segment_path, menu_csv_path):
+    prices = {}
+
+    # Start from the existing wide CSV so data from before the journal is kept
+    if os.path.exists(menu_csv_path):
+        with open(menu_csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            items = (reader.fieldnames or [])[1:]
+            for row in reader:
+                store_prices = prices.setdefault(row['store_id'], {})
+                for item_name in items:
+                    if row.get(item_name):
+                        store_prices[item_name] = row[item_name]
+
+    # A result's rows are appended together and share their timestamp
+    result_key = None
+    for row in iter_journal(segment_path):
+        key = (row['store_id'], row['timestamp'], row['complete'])
+        if key != result_key and row['complete']:
+            prices[row['store_id']] = {}
+        result_key = key
+        store_prices = prices.setdefault(row['store_id'], {})
+        if row['item']:
+            store_prices[row['item']] = row['price']
+
+    if not prices:
+        return 0, 0
+
+    # Items no store offers any more lose their column
+    all_items = {item_name for store_prices in prices.values() for item_name in store_prices}
+    # Sort menu items alphabetically for consistent ordering
+    sorted_items = sorted(all_items)
+
+    directory = os.path.dirname(menu_csv_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = menu_csv_path + '.tmp'
+    with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['store_id'] + sorted_items)
+        for store_id, store_prices in prices.items():
+            writer.writerow([store_id] + [store_prices.get(item_name, '') for item_name in sorted_items])
+    os.replace(temp_path, menu_csv_path)
+
+    # Only after menu.csv is safely in place - a crash before this just compacts again.
+    # Appends go to the live journal, never the segment, so this loses nothing
+    if os.path.exists(segment_path):
+        os.remove(segment_path)
+
+    return len(prices), len(sorted_items)
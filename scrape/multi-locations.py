@@ -1,157 +1,126 @@
-import requests
+import argparse
+import http_client
+import brands
+from checkpoint import LocationCheckpoint
+from crawl_state import CrawlState
+from store_pages import store_map_url, store_page_key
 from bs4 import BeautifulSoup
 import json
-import time
 import re
 import os
 import csv
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
 
-def clean_name(name):
-    """Remove the count numbers in parentheses from names"""
-    return re.sub(r'\(\d+\)$', '', name).strip()
+clean_name = brands.clean_name
 
-def get_store_id_from_page(store_page_url):
+def get_store_id_from_page(store_page_url, brand=None):
     """Visit a store page and extract the store ID from the 'Start Your Order' link"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
     try:
-        response = requests.get(store_page_url, headers=headers)
-        response.raise_for_status()
-        
-        # Search the raw HTML for store ID in the pattern store=XXXXXX
-        # The store ID appears in the JSON-LD schema: "menu":"https://www.tacobell.com/food?store=019953"
-        matches = re.findall(r'store=(\d+)', response.text)
-        if matches:
-            # Return the first match (should be the store ID)
-            return matches[0]
-        
-        # If regex didn't work, try parsing with BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Look for the "Start Your Order" link
-        order_link = soup.find('a', string=re.compile(r'start your order', re.IGNORECASE))
-        
-        # Also try finding by href pattern
-        if not order_link:
-            order_link = soup.find('a', href=re.compile(r'tacobell\.com/food\?store='))
-        
-        if order_link:
-            href = str(order_link.get('href', ''))
-            # Extract store ID from URL like "https://www.tacobell.com/food?store=019953"
-            match = re.search(r'store=(\d+)', href)
-            if match:
-                return match.group(1)
-        
-        return None
-        
+        details = (brand or brands.get_brand()).store_details(store_page_url)
+        return details['store_id'] if details else None
     except Exception as e:
         return None
 
-def scrape_locations_from_city(city_url, state_name, city_name):
-    """Scrape all individual Taco Bell locations from a city page"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
+def scrape_locations_from_city(city_url, state_name, city_name, brand=None):
+    """Scrape all individual locations of a brand from a city page
+
+    Raises if the city page can't be fetched, so the city stays pending
+    instead of being recorded as done with no stores.
+    """
+    brand = brand or brands.get_brand()
+    response = http_client.get(city_url)
+    response.raise_for_status()
     
-    try:
-        response = requests.get(city_url, headers=headers)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        locations_data = []
-        
-        # Find all store links - they have the pattern ending in .html
-        # Example: ../ak/anchorage/8825-old-seward-hwy.html
-        all_links = soup.find_all('a', href=re.compile(r'\.html$'))
-        
-        # Filter to only store page links (not the same city page)
-        # Store links appear twice: once as location name, once as "View Store Page"
-        seen_hrefs = set()
-        store_links = []
-        
-        for link in all_links:
-            href = link.get('href', '')
-            text = link.get_text(strip=True)
+    soup = BeautifulSoup(response.text, 'html.parser')
+    
+    # Stores described in the city page's JSON-LD / embedded JSON
+    city_stores = brand.parse_city_stores(response.text)
+    
+    locations_data = []
+    
+    # Find all store links - they have the pattern ending in .html
+    # Example: ../ak/anchorage/8825-old-seward-hwy.html
+    all_links = soup.find_all('a', href=re.compile(r'\.html$'))
+    
+    # Filter to only store page links (not the same city page)
+    # Store links appear twice: once as location name, once as "View Store Page"
+    seen_hrefs = set()
+    store_links = []
+    
+    for link in all_links:
+        href = link.get('href', '')
+        text = link.get_text(strip=True)
+        
+        # Skip if already seen or if it's just "View Store Page" text
+        if href in seen_hrefs:
+            continue
+              # Store links are relative paths with multiple segments
+        if href and href != '#' and href.count('/') >= 2:
+            seen_hrefs.add(href)
+            store_links.append(link)
+    
+    for store_link in store_links:
+        try:
+            href = store_link.get('href', '')
             
-            # Skip if already seen or if it's just "View Store Page" text
-            if href in seen_hrefs:
-                continue
-                  # Store links are relative paths with multiple segments
-            if href and href != '#' and href.count('/') >= 2:
-                seen_hrefs.add(href)
-                store_links.append(link)
-        
-        for store_link in store_links:
-            try:
-                href = store_link.get('href', '')
-                
-                # Convert relative URL to absolute
-                if href.startswith('../'):
-                    # ../ak/anchorage/store.html -> https://locations.tacobell.com/ak/anchorage/store.html
-                    href = href.replace('../', '')
-                    store_page_url = f"https://locations.tacobell.com/{href}"
-                elif href.startswith('/'):
-                    store_page_url = f"https://locations.tacobell.com{href}"
-                elif not href.startswith('http'):
-                    store_page_url = f"https://locations.tacobell.com/{href}"
-                else:
-                    store_page_url = href
-                
-                # Get location name from link text
-                location_name = clean_name(store_link.get_text(strip=True))
-                if not location_name or location_name == "View Store Page":
-                    # Try to extract from URL
-                    location_name = href.split('/')[-1].replace('.html', '').replace('-', ' ').title()
-                
-                # Find the "Get Directions" link for this store
-                # Look for Google Maps link near this store link
-                map_url = None
-                parent = store_link.parent
-                if parent:
-                    # Search for Google Maps link in the parent or nearby elements
-                    map_link = parent.find('a', href=re.compile(r'google\.com/maps'))
-                    if not map_link:
-                        # Try searching in grandparent
-                        grandparent = parent.parent
-                        if grandparent:
-                            map_link = grandparent.find('a', href=re.compile(r'google\.com/maps'))
-                    
-                    if map_link:
-                        map_url = map_link.get('href', '')
-                
-                # Visit the store page to get the store ID
-                store_id = get_store_id_from_page(store_page_url)
-                
-                if store_id:
-                    locations_data.append({
-                        'store_id': store_id,
-                        'location': f"{location_name}, {city_name}, {state_name}",
-                        'page': store_page_url,
-                        'map': map_url or ''
-                    })
+            # Convert relative URL to absolute
+            store_page_url = brand.location_url(href)
+            
+            # Get location name from link text
+            location_name = clean_name(store_link.get_text(strip=True))
+            if not location_name or location_name == "View Store Page":
+                # Try to extract from URL
+                location_name = href.split('/')[-1].replace('.html', '').replace('-', ' ').title()
+            
+            # Find the "Get Directions" link for this store
+            # Look for Google Maps link near this store link
+            map_url = None
+            parent = store_link.parent
+            if parent:
+                # Search for Google Maps link in the parent or nearby elements
+                map_link = parent.find('a', href=re.compile(r'google\.com/maps'))
+                if not map_link:
+                    # Try searching in grandparent
+                    grandparent = parent.parent
+                    if grandparent:
+                        map_link = grandparent.find('a', href=re.compile(r'google\.com/maps'))
                 
-                # Be polite with rate limiting
-                time.sleep(0.5)
+                if map_link:
+                    map_url = map_link.get('href', '')
+            
+            # Take the store ID from the city page's structured data when it has one,
+            # and only visit the store page (streamed - stops at the JSON-LD) otherwise
+            details = city_stores.get(store_page_key(store_page_url))
+            if not details or not details['store_id']:
+                details = brand.store_details(store_page_url)
+            
+            if details:
+                # Fall back to the JSON-LD coordinates when the city page had no map link
+                if not map_url and details['lat'] is not None and details['lng'] is not None:
+                    map_url = store_map_url(details['lat'], details['lng'])
                 
-            except Exception as e:
-                continue
-        
-        return locations_data
-        
-    except Exception as e:
-        return []
+                locations_data.append({
+                    'store_id': details['store_id'],
+                    'location': f"{location_name}, {city_name}, {state_name}",
+                    'page': store_page_url,
+                    'map': map_url or '',
+                    # Only kept by brands whose locations.csv has coordinates (KFC)
+                    'lat': details['lat'],
+                    'lng': details['lng']
+                })
+            
+        except Exception as e:
+            continue
+    
+    return locations_data
 
-def load_existing_locations():
+def load_existing_locations(brand=None):
     """Load existing locations from CSV if it exists"""
-    if os.path.exists('data/locations.csv'):
+    csv_path = (brand or brands.get_brand()).locations_csv_path
+    if os.path.exists(csv_path):
         existing = []
-        with open('data/locations.csv', 'r', encoding='utf-8') as f:
+        with open(csv_path, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
                 existing.append(row)
@@ -170,52 +139,53 @@ def get_completed_groups(existing_locations):
             completed.add((state, city))
     return completed
 
-def save_locations(all_locations, lock):
-    """Save all locations to CSV (thread-safe)"""
-    with lock:
-        with open('data/locations.csv', 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['store_id', 'location', 'page', 'map'])
-            writer.writeheader()
-            writer.writerows(all_locations)
-
-def process_city(state_name, city_name, city_url, all_locations, lock, pbar):
-    """Process a single city and update shared data structures"""
+def process_city(state_name, city_name, city_url, checkpoint, pbar, crawl_state, brand=None):
+    """Process a single city and hand its locations to the checkpoint writer"""
     try:
-        locations = scrape_locations_from_city(city_url, state_name, city_name)
-        
-        # Thread-safe update of all_locations
-        with lock:
-            all_locations.extend(locations)
-            total_count = len(all_locations)
-        
-        # Save progress after each group
-        save_locations(all_locations, lock)
-        
-        # Update progress bar
-        pbar.update(1)
-        pbar.set_postfix({"Found": len(locations), "Total": total_count})
-        
-        # Be polite and add a small delay between city requests
-        time.sleep(0.3)
-        
-        return True
-        
+        locations = scrape_locations_from_city(city_url, state_name, city_name, brand)
     except Exception as e:
+        # The city page couldn't be fetched - it stays pending for the next run
+        crawl_state.record_city_failure(state_name, city_name, e)
         pbar.update(1)
         return False
 
-def scrape_all_taco_bell_locations():
+    # Save progress after each group - this only queues the city for the
+    # checkpoint writer thread, so workers never wait on disk. A failed
+    # writer raises here, outside the try, so it isn't taken for a bad city
+    total_count = checkpoint.add_city(state_name, city_name, locations)
+
+    # Update progress bar
+    pbar.update(1)
+    pbar.set_postfix({"Found": len(locations), "Total": total_count})
+
+    return True
+
+def scrape_all_taco_bell_locations(brand=None):
     """Loop through all cities in groups.json and scrape individual locations with parallel processing"""
-    # Load the groups from data/groups.json
-    with open('data/groups.json', 'r') as f:
+    brand = brand or brands.get_brand()
+    # Load the groups from groups.json
+    with open(brand.groups_path, 'r') as f:
         groups = json.load(f)
     
     # Create data folder if it doesn't exist
-    os.makedirs('data', exist_ok=True)
+    os.makedirs(brand.data_dir, exist_ok=True)
     
     # Load existing progress
-    all_locations = load_existing_locations()
-    completed_groups = get_completed_groups(all_locations)
+    all_locations = load_existing_locations(brand)
+    
+    crawl_state = CrawlState(brand.state_path)
+    crawl_state.upsert_cities(groups)
+    if all_locations and not crawl_state.completed_cities():
+        # First run with the state database - seed it from the existing CSV
+        crawl_state.upsert_stores(all_locations)
+        crawl_state.import_completed_cities(get_completed_groups(all_locations))
+    
+    # Cities are journaled as they finish and locations.csv is snapshotted
+    # periodically by a background writer - workers never rewrite the CSV
+    checkpoint = LocationCheckpoint(brand.locations_csv_path, brand.locations_journal_path,
+                                    existing_rows=all_locations, crawl_state=crawl_state,
+                                    fields=brand.location_fields)
+    completed_groups = crawl_state.completed_cities()
     
     # Count total groups and groups to process
     total_groups = sum(len(cities) for cities in groups.values())
@@ -231,14 +201,12 @@ def scrape_all_taco_bell_locations():
             if (state_name, city_name) not in completed_groups:
                 tasks.append((state_name, city_name, city_url))
     
-    # Create a lock for thread-safe operations
-    lock = threading.Lock()
-    
     # Create progress bar
     pbar = tqdm(total=total_groups, desc="Scraping locations", unit="city", initial=len(completed_groups))
     
-    # Process cities in parallel with 3 workers
-    with ThreadPoolExecutor(max_workers=5) as executor:
+    # Process cities in parallel - the adaptive limiter in http_client decides
+    # how many requests are actually in flight
+    with ThreadPoolExecutor(max_workers=http_client.MAX_CONCURRENCY) as executor:
         futures = []
         for state_name, city_name, city_url in tasks:
             future = executor.submit(
@@ -246,23 +214,35 @@ def scrape_all_taco_bell_locations():
                 state_name, 
                 city_name, 
                 city_url, 
-                all_locations, 
-                lock, 
-                pbar
+                checkpoint, 
+                pbar,
+                crawl_state,
+                brand
             )
             futures.append(future)
         
         # Wait for all tasks to complete
-        for future in as_completed(futures):
-            try:
+        # Only a failed checkpoint writer raises here - stop instead of
+        # crawling cities that can't be saved
+        try:
+            for future in as_completed(futures):
                 future.result()
-            except Exception as e:
-                pass
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
     
     pbar.close()
+    checkpoint.close()
     
-    print(f"\nScraping complete! Total locations found: {len(all_locations)}")
-    print(f"Data saved to data/locations.csv")
+    print(f"\nScraping complete! Total locations found: {checkpoint.total}")
+    print(f"Data saved to {brand.locations_csv_path}")
+    print(http_client.format_concurrency_report())
 
 if __name__ == "__main__":
-    scrape_all_taco_bell_locations()
+    parser = argparse.ArgumentParser(description="Scrape every store of a brand from the cities in its groups.json")
+    parser.add_argument('--brand', choices=sorted(brands.BRANDS), default=brands.DEFAULT_BRAND,
+                        help=f"Brand to scrape (default: {brands.DEFAULT_BRAND})")
+    args = parser.parse_args()
+    http_client.enable_cache()
+    scrape_all_taco_bell_locations(brands.get_brand(args.brand))
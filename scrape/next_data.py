@@ -0,0 +1,52 @@
+import re
+
+from bs4 import BeautifulSoup
+
+# Fast extraction of the Next.js __NEXT_DATA__ payload.
+#
+# Taco Bell menu pages are large Next.js documents and all the data we need
+# lives in one <script id="__NEXT_DATA__"> tag. Building a full BeautifulSoup
+# tree just to find that tag dominates parse time, so the fast path scans the
+# raw text for the tag and decodes only that slice. If the markup ever changes
+# shape the DOM parser is used as a fallback.
+
+# Matches the opening tag wherever the id attribute sits and however it is quoted
+NEXT_DATA_TAG = re.compile(r'<script[^>]*\bid=["\']?__NEXT_DATA__["\']?[^>]*>', re.IGNORECASE)
+NEXT_DATA_TAG_BYTES = re.compile(NEXT_DATA_TAG.pattern.encode(), re.IGNORECASE)
+
+def extract_next_data_text(html_content):
+    """Return the raw JSON text of the __NEXT_DATA__ script by scanning, or None"""
+    if isinstance(html_content, bytes):
+        match = NEXT_DATA_TAG_BYTES.search(html_content)
+        if not match:
+            return None
+        end = html_content.find(b'</script>', match.end())
+        if end == -1:
+            return None
+        return html_content[match.end():end].decode('utf-8')
+
+    match = NEXT_DATA_TAG.search(html_content)
+    if not match:
+        return None
+    end = html_content.find('</script>', match.end())
+    if end == -1:
+        return None
+    return html_content[match.end():end]
+
+def extract_next_data_text_dom(html_content):
+    """Return the raw JSON text of the __NEXT_DATA__ script via BeautifulSoup, or None"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    next_data_script = soup.find('script', {'id': '__NEXT_DATA__'})
+    if not next_data_script:
+        return None
+    return next_data_script.string
+
+def extract_next_data_payload(html_content):
+    """Return the __NEXT_DATA__ JSON text, scanning first and falling back to the DOM parser"""
+    try:
+        payload = extract_next_data_text(html_content)
+    except UnicodeDecodeError:
+        payload = None
+    if payload is not None and payload.strip():
+        return payload
+    return extract_next_data_text_dom(html_content)
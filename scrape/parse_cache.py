@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from parse_pool import ITEM_FIELDS, item_dicts
+
+# Memoized decoding of __NEXT_DATA__ product payloads.
+#
+# Stores in the same region usually return byte-identical payloads for a
+# category, so parsed items are cached under a hash of the extracted JSON
+# text (plus the category name, which ends up in every item). Items are kept
+# as compact tuples in an LRU-ordered dict and expanded into fresh dicts on
+# every hit, so callers can't mutate each other's results.
+#
+# With the parse pool enabled each worker process has its own cache, and the
+# crawler's cache only counts the hits and misses the workers report.
+
+DEFAULT_MAX_ENTRIES = 4096
+
+class ParseCache:
+    """Bounded LRU cache of parsed menu items keyed by payload hash"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Time spent decoding on misses - used to estimate what the hits saved
+        self.miss_seconds = 0.0
+        # Set once lookups happen in parse pool workers instead of here
+        self.in_workers = False
+
+    @staticmethod
+    def key(payload, category_name=''):
+        """Return the cache key for a payload: a 128-bit BLAKE2b digest"""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        digest = hashlib.blake2b(payload, digest_size=16)
+        digest.update(b'\0' + category_name.encode('utf-8'))
+        return digest.digest()
+
+    def get_rows(self, key):
+        """Return the cached item tuples for a key, or None (counted as a miss)"""
+        with self.lock:
+            rows = self.entries.get(key)
+            if rows is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return rows
+
+    def get(self, key):
+        """Return cached item dicts for a key, or None (counted as a miss)"""
+        rows = self.get_rows(key)
+        return item_dicts(rows) if rows is not None else None
+
+    def note_worker_lookup(self, hit, seconds=0.0):
+        """Count a lookup done by a parse pool worker's own cache"""
+        with self.lock:
+            self.in_workers = True
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def put(self, key, items, seconds=0.0):
+        """Cache parsed item dicts (or tuples) that took seconds to decode"""
+        rows = tuple(
+            item if isinstance(item, tuple) else tuple(item.get(field) for field in ITEM_FIELDS)
+            for item in items
+        )
+        with self.lock:
+            self.miss_seconds += seconds
+            self.entries[key] = rows
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_parse(self, payload, category_name, parse):
+        """Return items for a payload, calling parse(payload, category_name) only on a miss"""
+        key = self.key(payload, category_name)
+        items = self.get(key)
+        if items is not None:
+            return items
+        start = time.perf_counter()
+        items = parse(payload, category_name)
+        self.put(key, items, time.perf_counter() - start)
+        return items
+
+    def stats(self):
+        """Return a one-line summary of hits, misses and the decode time saved"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            hit_rate = self.hits / lookups * 100 if lookups else 0.0
+            saved = self.hits * (self.miss_seconds / self.misses) if self.misses else 0.0
+            if self.in_workers:
+                where = "cached in the parse workers"
+            else:
+                where = f"{len(self.entries)} entries, {self.evictions} evictions"
+            return (
+                f"Parse cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+                f"{where}, ~{saved:.1f}s of decoding saved"
+            )
+
+PARSE_CACHE = ParseCache()
+
+def configure_parse_cache(max_entries):
+    """Resize the shared parse cache; 0 disables it"""
+    global PARSE_CACHE
+    PARSE_CACHE = ParseCache(max_entries) if max_entries > 0 else None
+    return PARSE_CACHE
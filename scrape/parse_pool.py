@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import brands
+
+# Optional process pool for the CPU-bound parsing stage.
+#
+# Extracting and decoding menu payloads is pure Python, so parse threads
+# mostly take turns holding the GIL. With the pool enabled, fetch threads (or
+# the event loop) keep doing the I/O and hand each category page's raw bytes
+# to a worker process, which sends back compact (name, price, image_url,
+# category) tuples instead of dicts to keep the pickling cost down.
+#
+# With the parse cache on, each worker keeps its own ParseCache (see
+# parse_cache.py) and does the extraction, hashing and lookup itself, so none
+# of the CPU work is left on the crawler's threads. Workers report whether
+# each page was a hit, which the crawler adds to its cache statistics.
+#
+# Pages are parsed by the brand adapter named in each call (see brands.py),
+# which workers look up in their own copy of the registry.
+#
+# Workers are started with "spawn" because the crawler forks from a process
+# that already has many threads running, and forking threads can deadlock.
+
+ITEM_FIELDS = ('name', 'price', 'image_url', 'category')
+
+POOL = None
+
+# This worker process's parse cache (set up by _init_worker)
+_worker_cache = None
+
+def parse_page(page, category_name='', brand_name=None):
+    """Parse one category page into a list of (name, price, image_url, category) tuples"""
+    try:
+        brand = brands.get_brand(brand_name)
+        payload = brand.extract_menu_payload(page)
+        if payload is None:
+            return []
+        return [
+            (item['name'], item['price'], item['image_url'], item['category'])
+            for item in brand.decode_menu_items(payload, category_name)
+        ]
+    except Exception:
+        return []
+
+def decode_payload(payload, category_name='', brand_name=None):
+    """Decode an already extracted menu payload into item tuples"""
+    return [
+        (item['name'], item['price'], item['image_url'], item['category'])
+        for item in brands.get_brand(brand_name).decode_menu_items(payload, category_name)
+    ]
+
+def parse_page_cached(page, category_name='', brand_name=None):
+    """Worker entry point: parse a page through the worker's cache
+
+    Returns (item tuples, hit, decode seconds); hit is None when the worker
+    has no cache.
+    """
+    if _worker_cache is None:
+        return parse_page(page, category_name, brand_name), None, 0.0
+    try:
+        payload = brands.get_brand(brand_name).extract_menu_payload(page)
+        if payload is None:
+            return [], None, 0.0
+        key = _worker_cache.key(payload, category_name)
+        rows = _worker_cache.get_rows(key)
+        if rows is not None:
+            return list(rows), True, 0.0
+        start = time.perf_counter()
+        rows = decode_payload(payload, category_name, brand_name)
+        seconds = time.perf_counter() - start
+        _worker_cache.put(key, rows, seconds)
+        return rows, False, seconds
+    except Exception:
+        return [], None, 0.0
+
+def item_dicts(rows):
+    """Expand parsed item tuples back into the menu item dicts the crawler uses"""
+    return [dict(zip(ITEM_FIELDS, row)) for row in rows]
+
+def _init_worker(cache_size):
+    global _worker_cache
+    if cache_size:
+        # Imported here - parse_cache imports this module
+        from parse_cache import ParseCache
+        _worker_cache = ParseCache(cache_size)
+
+def _warm_up(_):
+    return os.getpid()
+
+class ParsePool:
+    """A process pool that parses raw category pages into item tuples"""
+
+    def __init__(self, workers=None, cache_size=0):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(cache_size,)
+        )
+        # Start every worker now rather than on the first page mid-crawl
+        list(self.executor.map(_warm_up, range(self.workers)))
+
+    def submit(self, page, category_name='', brand_name=None):
+        """Queue a page for parsing; returns a Future of (item tuples, hit, decode seconds)"""
+        return self.executor.submit(parse_page_cached, page, category_name, brand_name)
+
+    def parse(self, page, category_name='', brand_name=None):
+        """Parse a page in a worker process; returns (item dicts, hit, decode seconds)"""
+        rows, hit, seconds = self.submit(page, category_name, brand_name).result()
+        return item_dicts(rows), hit, seconds
+
+    def close(self):
+        self.executor.shutdown()
+
+def enable_parse_pool(workers=None, cache_size=0):
+    """Route parse_menu_items through a process pool, each worker caching up to cache_size payloads"""
+    global POOL
+    if POOL is None:
+        POOL = ParsePool(workers, cache_size)
+    return POOL
+
+def close_parse_pool():
+    """Shut the process pool down, if one was started"""
+    global POOL
+    if POOL is not None:
+        POOL.close()
+        POOL = None
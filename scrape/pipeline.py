@@ -0,0 +1,139 @@
+import queue
+import threading
+
+# Staged, continuously flowing pipeline for the threaded crawl.
+#
+# Each stage owns a bounded queue and a pool of worker threads that all pull
+# from it, so whichever worker is free takes the next task (no per-worker
+# assignment, no batch barrier). A handler receives a task plus an emit()
+# callback and may emit any number of tasks to any later stage. Bounded queues
+# give backpressure: a fast stage blocks on put() instead of piling up work in
+# memory, so throughput settles at the rate of the slowest stage.
+#
+# A handler that raises doesn't stop the pipeline: the error is printed and
+# passed to the stage's on_error(task, error, emit) hook, which can emit a
+# failure result so the task isn't silently lost.
+
+class Stage:
+    """One pipeline stage: a handler, its worker count and its bounded input queue"""
+
+    def __init__(self, name, handler, workers=1, maxsize=None, on_finish=None, on_error=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=maxsize if maxsize is not None else workers * 2)
+        # Called once, from a worker-free context, after the pipeline drains
+        self.on_finish = on_finish
+        # Called from the worker with (task, exception, emit) when the handler raises
+        self.on_error = on_error
+        self.processed = 0
+        self.errors = 0
+
+class Pipeline:
+    """Runs a set of stages until every submitted task (and its descendants) is done"""
+
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = [stage.name for stage in stages]
+        self.outstanding = 0
+        self.cond = threading.Condition()
+        self.threads = []
+
+    def emit(self, stage_name, task):
+        """Queue a task for a stage; blocks while that stage's queue is full"""
+        with self.cond:
+            self.outstanding += 1
+        self.stages[stage_name].queue.put(task)
+
+    def _task_done(self, stage, ok):
+        with self.cond:
+            if ok:
+                stage.processed += 1
+            else:
+                stage.errors += 1
+            self.outstanding -= 1
+            if self.outstanding == 0:
+                self.cond.notify_all()
+
+    def _worker(self, stage):
+        while True:
+            task = stage.queue.get()
+            if task is None:
+                return
+            ok = False
+            try:
+                stage.handler(task, self.emit)
+                ok = True
+            except Exception as e:
+                self._handle_error(stage, task, e)
+            finally:
+                self._task_done(stage, ok)
+
+    def _handle_error(self, stage, task, error):
+        print(f"Pipeline stage {stage.name} failed: {type(error).__name__}: {error}")
+        if stage.on_error is None:
+            return
+        try:
+            stage.on_error(task, error, self.emit)
+        except Exception as e:
+            print(f"Pipeline stage {stage.name} error handler failed: {type(e).__name__}: {e}")
+
+    def queue_depths(self):
+        """Return {stage name: tasks waiting in its queue}"""
+        return {name: self.stages[name].queue.qsize() for name in self.order}
+
+    def run(self, first_stage, items, on_tick=None, tick_interval=1.0):
+        """Feed items (any iterable) into first_stage and block until the pipeline drains"""
+        for name in self.order:
+            stage = self.stages[name]
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"{name}-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+        # The feeder counts as one outstanding task until it has queued every
+        # item, so items can be a generator and the pipeline can't look
+        # drained while the feeder is still blocked on a full first queue
+        with self.cond:
+            self.outstanding += 1
+
+        def feed():
+            try:
+                for item in items:
+                    self.emit(first_stage, item)
+            finally:
+                with self.cond:
+                    self.outstanding -= 1
+                    if self.outstanding == 0:
+                        self.cond.notify_all()
+
+        feeder = threading.Thread(target=feed, name='pipeline-feeder', daemon=True)
+        feeder.start()
+
+        while True:
+            with self.cond:
+                if self.outstanding > 0:
+                    self.cond.wait(timeout=tick_interval)
+                if self.outstanding == 0:
+                    break
+            if on_tick is not None:
+                on_tick(self.queue_depths())
+        feeder.join()
+
+        # Everything has drained - stop the workers and run finish hooks in order
+        for name in self.order:
+            stage = self.stages[name]
+            for _ in range(stage.workers):
+                stage.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        for name in self.order:
+            if self.stages[name].on_finish is not None:
+                self.stages[name].on_finish()
+
+    def summary(self):
+        """Return a one-line count of processed tasks and errors per stage"""
+        return ', '.join(
+            f"{name}: {self.stages[name].processed} done/{self.stages[name].errors} errors"
+            for name in self.order
+        )
@@ -0,0 +1,211 @@
+import argparse
+import bisect
+import csv
+import hashlib
+import math
+import os
+from collections import Counter
+
+import brands
+from crawl_state import CrawlState
+from menu_journal import MENU_CSV_PATH
+
+# Pricing-zone detection.
+#
+# Chains price by region, so many stores share the same price vector. Stores
+# are grouped in two passes:
+#
+# 1. exact clusters - stores whose (item, price) vectors hash identically
+# 2. zones - exact clusters with the same item set whose prices all agree
+#    within a relative tolerance are merged (near-duplicates)
+#
+# Each zone gets one or a few representative stores. A zone refresh
+# (`python scrape/menu.py --zone-refresh`) re-crawls the representatives plus
+# a rotating sample of the other members, and re-crawls the whole zone only
+# when one of those stores' prices changed.
+#
+#   python scrape/pricing_zones.py                        # report on data/menu.csv
+#   python scrape/pricing_zones.py --brand kfc --tolerance 0.02
+#   python scrape/pricing_zones.py --save                 # store zones in the crawl state
+
+def load_price_vectors(menu_csv_path=MENU_CSV_PATH):
+    """Return {store_id: {item: price}} from a wide menu.csv, skipping blank cells"""
+    vectors = {}
+    if not os.path.exists(menu_csv_path):
+        return vectors
+    with open(menu_csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        items = (reader.fieldnames or [])[1:]
+        for row in reader:
+            prices = {}
+            for item_name in items:
+                try:
+                    prices[item_name] = round(float(row[item_name]), 2)
+                except (TypeError, ValueError):
+                    continue
+            vectors[row['store_id']] = prices
+    return vectors
+
+def price_signature(prices):
+    """Hash an {item: price} vector; equal vectors get equal signatures"""
+    digest = hashlib.blake2b(digest_size=16)
+    for item_name in sorted(prices):
+        digest.update(f"{item_name}\0{prices[item_name]:.2f}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+def item_set_signature(prices):
+    """Hash just the items a store offers, ignoring prices"""
+    return hashlib.blake2b('\0'.join(sorted(prices)).encode('utf-8'), digest_size=16).hexdigest()
+
+def prices_match(a, b, tolerance):
+    """True if two vectors with the same items agree on every price within a relative tolerance"""
+    for item_name, price in a.items():
+        other = b[item_name]
+        if abs(price - other) > tolerance * max(abs(price), abs(other)) + 0.005:
+            return False
+    return True
+
+def exact_clusters(vectors):
+    """Group stores by identical price vector: {signature: [store_id, ...]}"""
+    clusters = {}
+    for store_id, prices in vectors.items():
+        # A store with no prices (failed or empty crawl) can't represent anything
+        if prices:
+            clusters.setdefault(price_signature(prices), []).append(store_id)
+    return clusters
+
+def find_zones(vectors, tolerance=0.0):
+    """Cluster stores into pricing zones; returns a list of store ID lists, largest first
+
+    With tolerance 0 zones are exactly the identical-vector clusters.
+    Otherwise exact clusters offering the same items are merged when every
+    price agrees within tolerance (e.g. 0.02 for 2%) of the zone's first
+    member. Candidates are narrowed by menu total, since vectors that agree
+    item by item within tolerance have totals within the same tolerance.
+    """
+    clusters = sorted(exact_clusters(vectors).values(), key=len, reverse=True)
+    if tolerance <= 0:
+        return clusters
+
+    zones = []
+    # item set -> (sorted zone totals, zone indexes in the same order)
+    by_item_set = {}
+    for cluster in clusters:
+        prices = vectors[cluster[0]]
+        total = sum(prices.values())
+        totals, indexes = by_item_set.setdefault(item_set_signature(prices), ([], []))
+
+        window = tolerance * total + 0.005 * len(prices)
+        low = bisect.bisect_left(totals, total - window)
+        high = bisect.bisect_right(totals, total + window)
+        for position in range(low, high):
+            zone = zones[indexes[position]]
+            if prices_match(prices, vectors[zone[0]], tolerance):
+                zone.extend(cluster)
+                break
+        else:
+            position = bisect.bisect_left(totals, total)
+            totals.insert(position, total)
+            indexes.insert(position, len(zones))
+            zones.append(list(cluster))
+
+    return sorted(zones, key=len, reverse=True)
+
+def choose_representatives(zone, vectors, count=1):
+    """Pick count stores from the zone's most common exact price vector first"""
+    signatures = {store_id: price_signature(vectors[store_id]) for store_id in zone}
+    ranking = Counter(signatures.values())
+    ordered = sorted(zone, key=lambda store_id: -ranking[signatures[store_id]])
+    return ordered[:max(1, count)]
+
+def zone_name(zone, vectors):
+    """Stable zone ID: the signature of the zone's first store's price vector"""
+    return price_signature(vectors[min(zone)])[:12]
+
+def zone_assignments(zones, vectors, representatives=1):
+    """Return [(store_id, zone, representative)] rows for CrawlState.save_pricing_zones"""
+    rows = []
+    for zone in zones:
+        name = zone_name(zone, vectors)
+        chosen = set(choose_representatives(zone, vectors, representatives))
+        rows.extend((store_id, name, store_id in chosen) for store_id in zone)
+    return rows
+
+def plan_zone_refresh(zones, spot_check=0.1):
+    """Pick the stores a zone refresh crawls first
+
+    zones is CrawlState.pricing_zones(). Every representative is picked,
+    plus spot_check of each zone's other members, least recently checked
+    first, so the sample rotates through the whole zone over successive
+    refreshes. Returns (store_ids, {store_id: zone}).
+    """
+    chosen = []
+    store_zone = {}
+    for zone, members in zones.items():
+        others = []
+        for store_id, representative, last_checked in members:
+            store_zone[store_id] = zone
+            if representative:
+                chosen.append(store_id)
+            else:
+                others.append((last_checked or 0, store_id))
+        others.sort()
+        sample = math.ceil(len(others) * spot_check) if spot_check > 0 else 0
+        chosen.extend(store_id for _, store_id in others[:sample])
+    return chosen, store_zone
+
+def changed_zones(before, after, store_zone):
+    """Return the zones where any re-crawled store's prices differ from before"""
+    changed = set()
+    for store_id, prices in after.items():
+        old = {item_name: round(price, 2) for item_name, price in before.get(store_id, {}).items() if price is not None}
+        new = {item_name: round(price, 2) for item_name, price in prices.items() if price is not None}
+        if old != new:
+            changed.add(store_zone[store_id])
+    return changed
+
+def report(vectors, zones, representatives):
+    """Print a summary of the clustering and the refresh traffic it would save"""
+    priced = sum(1 for prices in vectors.values() if prices)
+    exact = len(exact_clusters(vectors))
+    sizes = [len(zone) for zone in zones]
+    print(f"Stores with prices: {priced} of {len(vectors)}")
+    print(f"Exact price clusters: {exact}")
+    print(f"Pricing zones: {len(zones)} (singletons: {sum(1 for size in sizes if size == 1)})")
+    if sizes:
+        print(f"Largest zones: {', '.join(str(size) for size in sizes[:10])}")
+        crawled = sum(min(size, representatives) for size in sizes)
+        print(f"Representative crawl: {crawled} stores ({crawled / priced * 100:.1f}% of a full refresh)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster stores into pricing zones from existing menu data")
+    parser.add_argument('--brand', choices=sorted(brands.BRANDS), default=brands.DEFAULT_BRAND,
+                        help=f"Brand whose menu and crawl state to use (default: {brands.DEFAULT_BRAND})")
+    parser.add_argument('--menu', help="Wide menu CSV to analyze (default: the brand's menu.csv)")
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help="Relative price difference still counted as the same zone (default: 0, exact)")
+    parser.add_argument('--representatives', type=int, default=1,
+                        help="Representative stores per zone (default: 1)")
+    parser.add_argument('--save', action='store_true', help="Store the zones in the crawl state database")
+    parser.add_argument('--db', help="Path to the state database (default: the brand's)")
+    args = parser.parse_args()
+    brand = brands.get_brand(args.brand)
+    args.menu = args.menu or brand.menu_csv_path
+    args.db = args.db or brand.state_path
+
+    vectors = load_price_vectors(args.menu)
+    if not vectors:
+        print(f"No menu data found in {args.menu}")
+        return
+
+    zones = find_zones(vectors, args.tolerance)
+    report(vectors, zones, args.representatives)
+
+    if args.save:
+        crawl_state = CrawlState(args.db)
+        crawl_state.save_pricing_zones(zone_assignments(zones, vectors, args.representatives))
+        crawl_state.close()
+        print(f"Saved {len(zones)} zones to {args.db}")
+
+if __name__ == "__main__":
+    main()
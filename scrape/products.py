@@ -0,0 +1,142 @@
+import json
+from typing import List, Optional, Union
+
+# Selective decoding of Taco Bell __NEXT_DATA__ product payloads.
+#
+# A category page's props tree is large, but the crawler only needs each
+# product's name, price.value and image URL. With msgspec installed the payload
+# is decoded straight into the small typed schema below and every other field
+# is skipped without being materialized. Without msgspec (or if a page doesn't
+# fit the schema) the full tree is decoded and walked the old way.
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if msgspec is not None:
+    class ImageRef(msgspec.Struct):
+        url: Optional[str] = None
+        src: Optional[str] = None
+
+    class Price(msgspec.Struct):
+        value: Union[float, str, None] = None
+
+    class Product(msgspec.Struct):
+        name: str = ''
+        price: Optional[Price] = None
+        image: Union[str, ImageRef, None] = None
+        imageUrl: Optional[str] = None
+        img: Optional[str] = None
+        images: Optional[List[Union[str, ImageRef]]] = None
+
+    class ProductCategory(msgspec.Struct):
+        label: str = 'Unknown'
+        slug: Optional[str] = ''
+        subtitle: Optional[str] = ''
+
+    class PageProps(msgspec.Struct):
+        products: List[Product] = []
+        productCategories: List[ProductCategory] = []
+
+    class Props(msgspec.Struct):
+        pageProps: PageProps = msgspec.field(default_factory=PageProps)
+
+    class NextData(msgspec.Struct):
+        props: Props = msgspec.field(default_factory=Props)
+
+    NEXT_DATA_DECODER = msgspec.json.Decoder(NextData)
+
+def _image_url_from_ref(ref):
+    if isinstance(ref, str):
+        return ref
+    return ref.url or ref.src
+
+def _typed_menu_items(page, category_name):
+    menu_items = []
+    for product in page.props.pageProps.products:
+        # Image URL - try different possible locations
+        image_url = None
+        if product.image is not None:
+            image_url = _image_url_from_ref(product.image)
+        if not image_url:
+            image_url = product.imageUrl or product.img
+            if not image_url and product.images:
+                image_url = _image_url_from_ref(product.images[0])
+
+        price = product.price.value if product.price is not None else None
+        if product.name and price is not None:
+            menu_items.append({
+                'name': product.name,
+                'price': float(price),
+                'image_url': image_url,
+                'category': category_name
+            })
+    return menu_items
+
+def _dict_menu_items(data, category_name):
+    # Navigate to products in the page data
+    products = data.get('props', {}).get('pageProps', {}).get('products', [])
+
+    menu_items = []
+    for product in products:
+        name = product.get('name', '')
+        # Price is in the price object
+        price_obj = product.get('price', {})
+
+        # Image URL - try different possible locations
+        image_url = None
+        if 'image' in product:
+            if isinstance(product['image'], dict):
+                image_url = product['image'].get('url') or product['image'].get('src')
+            elif isinstance(product['image'], str):
+                image_url = product['image']
+
+        # Also try 'imageUrl' or 'images' fields
+        if not image_url:
+            image_url = product.get('imageUrl') or product.get('img')
+            if not image_url and 'images' in product:
+                images = product['images']
+                if isinstance(images, list) and len(images) > 0:
+                    if isinstance(images[0], dict):
+                        image_url = images[0].get('url') or images[0].get('src')
+                    else:
+                        image_url = images[0]
+
+        if name and price_obj and isinstance(price_obj, dict):
+            price = price_obj.get('value')
+            if price is not None:
+                menu_items.append({
+                    'name': name,
+                    'price': float(price),
+                    'image_url': image_url,
+                    'category': category_name
+                })
+    return menu_items
+
+def decode_menu_items(payload, category_name=''):
+    """Decode a __NEXT_DATA__ JSON payload into a list of menu item dicts"""
+    if msgspec is not None:
+        try:
+            return _typed_menu_items(NEXT_DATA_DECODER.decode(payload), category_name)
+        except (msgspec.ValidationError, msgspec.DecodeError, ValueError):
+            pass
+    return _dict_menu_items(json.loads(payload), category_name)
+
+def decode_product_categories(payload):
+    """Decode a __NEXT_DATA__ JSON payload into (label, slug, subtitle) tuples"""
+    if msgspec is not None:
+        try:
+            page = NEXT_DATA_DECODER.decode(payload)
+            return [
+                (category.label, category.slug or '', category.subtitle or '')
+                for category in page.props.pageProps.productCategories
+            ]
+        except (msgspec.ValidationError, msgspec.DecodeError):
+            pass
+    data = json.loads(payload)
+    product_categories = data.get('props', {}).get('pageProps', {}).get('productCategories', [])
+    return [
+        (category.get('label', 'Unknown'), category.get('slug', ''), category.get('subtitle', ''))
+        for category in product_categories
+    ]
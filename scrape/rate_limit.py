@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Per-host token-bucket rate limiting shared by every scraper.
+#
+# Buckets hand out reservations instead of blocking internally: reserve()
+# takes a token (letting the balance go negative) and returns how long the
+# caller must wait before using it. That keeps one implementation usable from
+# both worker threads (time.sleep) and the asyncio engine (asyncio.sleep).
+#
+# A pause (429 / Retry-After) empties the bucket and stops it refilling until
+# the pause ends, so requests queued up during the pause resume at `rate`
+# instead of all firing the moment it's over.
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests per second with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        # updated lies in the future while paused - nothing accrues until then
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def set_rate(self, rate, burst=None):
+        """Change the refill rate (and optionally the burst size)"""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            if burst is not None:
+                self.burst = max(1.0, float(burst))
+                self.tokens = min(self.tokens, self.burst)
+
+    def reserve(self):
+        """Take one token and return the number of seconds to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            # Token debt is paid off from when accrual (re)starts
+            debt = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(0.0, self.updated - now) + debt
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (e.g. after a Retry-After)"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.paused_until = max(self.paused_until, now + seconds)
+            # Tokens start accruing again when the pause ends, from empty;
+            # debt from reservations made before the pause is still owed
+            self.updated = max(self.updated, self.paused_until)
+            self.tokens = min(self.tokens, 0.0)
+
+class HostRateLimiter:
+    """Keeps one TokenBucket per host, created on first use"""
+
+    def __init__(self, rate, burst=1, host_rates=None):
+        self.rate = rate
+        self.burst = burst
+        # host -> (rate, burst) overrides for hosts with an agreed budget
+        self.host_rates = dict(host_rates or {})
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url_or_host):
+        """Return the bucket for a URL or bare host name"""
+        host = urlsplit(url_or_host).netloc if '://' in url_or_host else url_or_host
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                rate, burst = self.host_rates.get(host, (self.rate, self.burst))
+                bucket = TokenBucket(rate, burst)
+                self.buckets[host] = bucket
+            return bucket
+
+    def configure(self, rate, burst=None, host=None):
+        """Set the rate for one host, or the default for every host when host is None"""
+        with self.lock:
+            if host is None:
+                self.rate = rate
+                if burst is not None:
+                    self.burst = burst
+                targets = list(self.buckets.values())
+            else:
+                self.host_rates[host] = (rate, burst if burst is not None else self.burst)
+                targets = [self.buckets[host]] if host in self.buckets else []
+        for bucket in targets:
+            bucket.set_rate(rate, burst)
+
+    def acquire(self, url):
+        """Block the calling thread until a request to url is allowed"""
+        wait = self.bucket(url).reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url):
+        """Wait on the event loop until a request to url is allowed"""
+        wait = self.bucket(url).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, url, seconds):
+        """Pause all requests to url's host for `seconds`"""
+        if seconds and seconds > 0:
+            self.bucket(url).pause(seconds)
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) to seconds, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -0,0 +1,87 @@
+import bisect
+import hashlib
+import math
+
+# Splitting a crawl's work units (stores or cities) into shards.
+#
+# hash  - consistent hashing: every shard owns VIRTUAL_NODES points on a
+#         64-bit ring and a unit goes to the first point at or after the hash
+#         of its key. Re-planning with one more or one fewer shard only moves
+#         about 1/N of the units, so shard result files from an interrupted
+#         run mostly still line up.
+# state - stores of a state are kept together (their pages share caches and
+#         pricing zones) and states are packed largest first into the
+#         currently lightest shard by expected store count. A state heavier
+#         than an even share is split into even-share-sized pieces first.
+
+VIRTUAL_NODES = 64
+
+STRATEGIES = ('hash', 'state')
+
+def ring_position(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class ConsistentHashRing:
+    """Maps keys onto shard numbers 0..shards-1 by consistent hashing"""
+
+    def __init__(self, shards, virtual_nodes=VIRTUAL_NODES):
+        points = sorted(
+            (ring_position(f"shard-{shard}#{node}"), shard)
+            for shard in range(shards)
+            for node in range(virtual_nodes)
+        )
+        self.positions = [position for position, _ in points]
+        self.owners = [shard for _, shard in points]
+
+    def shard_for(self, key):
+        index = bisect.bisect_left(self.positions, ring_position(key))
+        return self.owners[index % len(self.owners)]
+
+def shard_by_hash(units, shards, key):
+    """Split units into shards by consistent hash of key(unit); returns a list of unit lists"""
+    ring = ConsistentHashRing(shards)
+    result = [[] for _ in range(shards)]
+    for unit in units:
+        result[ring.shard_for(key(unit))].append(unit)
+    return result
+
+def shard_by_state(units, shards, state, weight=lambda unit: 1):
+    """Pack units into shards by state, balancing the total weight (expected stores) per shard"""
+    groups = {}
+    for unit in units:
+        groups.setdefault(state(unit) or '', []).append(unit)
+
+    total = sum(weight(unit) for unit in units)
+    share = max(1, math.ceil(total / shards)) if shards else total
+
+    # Split states heavier than an even share, keeping each piece contiguous
+    pieces = []
+    for members in groups.values():
+        piece, piece_weight = [], 0
+        for unit in members:
+            if piece and piece_weight + weight(unit) > share:
+                pieces.append((piece_weight, piece))
+                piece, piece_weight = [], 0
+            piece.append(unit)
+            piece_weight += weight(unit)
+        if piece:
+            pieces.append((piece_weight, piece))
+
+    # Longest processing time first: heaviest piece to the lightest shard
+    loads = [0] * shards
+    result = [[] for _ in range(shards)]
+    for piece_weight, piece in sorted(pieces, key=lambda entry: -entry[0]):
+        target = loads.index(min(loads))
+        result[target].extend(piece)
+        loads[target] += piece_weight
+    return result
+
+def make_shards(units, shards, strategy, key, state, weight=lambda unit: 1):
+    """Split units with the named strategy, dropping empty shards"""
+    if strategy == 'hash':
+        result = shard_by_hash(units, shards, key)
+    elif strategy == 'state':
+        result = shard_by_state(units, shards, state, weight)
+    else:
+        raise ValueError(f"Unknown sharding strategy {strategy!r}; expected one of {', '.join(STRATEGIES)}")
+    return [shard for shard in result if shard]
@@ -1,44 +1,33 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import http_client
+import brands
 import json
-import re
 import os
 
-def clean_name(name):
-    """Remove the count numbers in parentheses from names"""
-    return re.sub(r'\(\d+\)$', '', name).strip()
-
-def scrape_states():
-    url = "https://locations.tacobell.com/"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
+def scrape_states(brand=None):
+    brand = brand or brands.get_brand()
+    url = brand.locations_root
     
-    print("Fetching states from Taco Bell website...")
-    response = requests.get(url, headers=headers)
+    print(f"Fetching states from {brand.display_name} website...")
+    response = http_client.get(url)
     response.raise_for_status()
     
-    soup = BeautifulSoup(response.text, 'html.parser')
-    directory_container = soup.find('div', class_='directory-container')
-    
-    states = {}
+    states = brand.parse_directory(response.text)
     
-    if directory_container:
-        state_links = directory_container.find_all('a', class_='DirLinks')
-        
-        for link in state_links:
-            state_name = clean_name(link.get_text(strip=True))
-            state_url = f"https://locations.tacobell.com/{link.get('href', '')}"
-            states[state_name] = state_url
-          print(f"Found {len(states)} states")
+    print(f"Found {len(states)} states")
     
     # Create data folder if it doesn't exist
-    os.makedirs('data', exist_ok=True)
+    os.makedirs(brand.data_dir, exist_ok=True)
     
-    with open('data/states.json', 'w') as f:
+    with open(brand.states_path, 'w') as f:
         json.dump(states, f, indent=2)
     
-    print("States saved to data/states.json")
+    print(f"States saved to {brand.states_path}")
 
 if __name__ == "__main__":
-    scrape_states()
+    parser = argparse.ArgumentParser(description="Scrape the state directory of a brand's store locator")
+    parser.add_argument('--brand', choices=sorted(brands.BRANDS), default=brands.DEFAULT_BRAND,
+                        help=f"Brand to scrape (default: {brands.DEFAULT_BRAND})")
+    args = parser.parse_args()
+    http_client.enable_cache()
+    scrape_states(brands.get_brand(args.brand))
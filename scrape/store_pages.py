@@ -0,0 +1,217 @@
+import json
+import re
+
+from bs4 import BeautifulSoup
+
+import http_client
+
+# Store page helpers shared by locations.py and multi-locations.py.
+#
+# The store ID sits in the JSON-LD block near the top of every store page
+# ("menu":"https://www.tacobell.com/food?store=019953"), so the page is read
+# as a stream and the connection is closed as soon as that block has arrived
+# instead of downloading and decoding the whole document.
+#
+# City listing pages carry structured data for their stores too, so most
+# stores can be discovered from the city page alone; fetch_store_details is
+# only needed for stores the city page doesn't identify.
+
+STORE_ID_PATTERN = re.compile(rb'store=(\d+)')
+JSON_LD_OPEN = re.compile(rb'<script[^>]*type=["\']application/ld\+json["\'][^>]*>', re.IGNORECASE)
+SCRIPT_CLOSE = b'</script>'
+
+CHUNK_SIZE = 8192
+
+# Any <script> holding JSON - JSON-LD or embedded application data
+JSON_SCRIPT = re.compile(
+    r'<script[^>]*type=["\'](?:application/ld\+json|application/json)["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL
+)
+STORE_ID_TEXT = re.compile(r'store=(\d+)')
+
+def store_map_url(lat, lng):
+    """Build the Google Maps directions link used in locations.csv"""
+    return f"https://www.google.com/maps/dir/?api=1&destination={lat},{lng}"
+
+def _find_geo_entity(data):
+    """Return the first JSON-LD object that carries a geo or address field"""
+    if isinstance(data, list):
+        for item in data:
+            found = _find_geo_entity(item)
+            if found:
+                return found
+        return None
+    if isinstance(data, dict):
+        if 'geo' in data or 'address' in data:
+            return data
+        if '@graph' in data:
+            return _find_geo_entity(data['@graph'])
+    return None
+
+def _entity_details(entity):
+    """Return lat, lng and a one-line address from a schema.org place object"""
+    details = {'lat': None, 'lng': None, 'address': None}
+
+    geo = entity.get('geo') or {}
+    if isinstance(geo, dict):
+        details['lat'] = geo.get('latitude')
+        details['lng'] = geo.get('longitude')
+
+    address = entity.get('address')
+    if isinstance(address, dict):
+        parts = [
+            address.get('streetAddress'),
+            address.get('addressLocality'),
+            address.get('addressRegion'),
+            address.get('postalCode')
+        ]
+        details['address'] = ', '.join(str(part) for part in parts if part)
+    elif isinstance(address, str):
+        details['address'] = address
+    return details
+
+def parse_json_ld_details(json_ld_text):
+    """Pull lat/lng and a one-line address out of a store's JSON-LD block"""
+    try:
+        entity = _find_geo_entity(json.loads(json_ld_text))
+    except ValueError:
+        entity = None
+    if not entity:
+        return {'lat': None, 'lng': None, 'address': None}
+    return _entity_details(entity)
+
+def _store_id_from_dom(html_bytes):
+    """Fallback: find the 'Start Your Order' link with BeautifulSoup"""
+    soup = BeautifulSoup(html_bytes, 'html.parser')
+
+    # Look for the "Start Your Order" link
+    order_link = soup.find('a', string=re.compile(r'start your order', re.IGNORECASE))
+
+    # Also try finding by href pattern
+    if not order_link:
+        order_link = soup.find('a', href=re.compile(r'tacobell\.com/food\?store='))
+
+    if order_link:
+        href = str(order_link.get('href', ''))
+        # Extract store ID from URL like "https://www.tacobell.com/food?store=019953"
+        match = re.search(r'store=(\d+)', href)
+        if match:
+            return match.group(1)
+    return None
+
+def fetch_store_details(store_page_url):
+    """Stream a store page until its store ID is found; returns a details dict or None
+
+    The dict has store_id plus lat, lng and address from the same JSON-LD
+    block when the page provides them.
+    """
+    response = http_client.get(store_page_url, stream=True)
+    try:
+        response.raise_for_status()
+
+        buffer = b''
+        match = None
+        search_from = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            buffer += chunk
+            if match is None:
+                # Only rescan the new bytes (plus a little overlap for split matches)
+                match = STORE_ID_PATTERN.search(buffer, max(0, search_from - 16))
+                search_from = len(buffer)
+            if match is not None:
+                # Keep reading until the JSON-LD block around the ID is complete
+                if buffer.find(SCRIPT_CLOSE, match.end()) != -1:
+                    break
+    finally:
+        # Closing early drops the rest of the body instead of downloading it
+        response.close()
+
+    if match is None:
+        store_id = _store_id_from_dom(buffer)
+        if not store_id:
+            return None
+        return {'store_id': store_id, 'lat': None, 'lng': None, 'address': None}
+
+    details = {'store_id': match.group(1).decode('ascii'), 'lat': None, 'lng': None, 'address': None}
+
+    # The ID normally sits inside the JSON-LD script - decode just that block
+    json_ld_open = None
+    for json_ld_open in JSON_LD_OPEN.finditer(buffer, 0, match.start()):
+        pass
+    if json_ld_open is not None:
+        end = buffer.find(SCRIPT_CLOSE, match.end())
+        if end != -1 and buffer.rfind(SCRIPT_CLOSE, json_ld_open.end(), match.start()) == -1:
+            details.update(parse_json_ld_details(buffer[json_ld_open.end():end]))
+    return details
+
+def store_page_key(url):
+    """Key a store page link by its final path segment (unique within a city page)"""
+    return url.split('?')[0].split('#')[0].rstrip('/').rsplit('/', 1)[-1].lower()
+
+def _find_store_id(value):
+    """Return the first store=NNN found anywhere inside a JSON value"""
+    if isinstance(value, str):
+        match = STORE_ID_TEXT.search(value)
+        return match.group(1) if match else None
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            found = _find_store_id(item)
+            if found:
+                return found
+    return None
+
+def _collect_store_entities(data, found):
+    """Walk a JSON value and collect every object that links to a store .html page"""
+    if isinstance(data, list):
+        for item in data:
+            _collect_store_entities(item, found)
+        return
+    if not isinstance(data, dict):
+        return
+
+    page_url = None
+    for field in ('url', '@id', 'mainEntityOfPage'):
+        value = data.get(field)
+        if isinstance(value, str) and '.html' in value:
+            page_url = value
+            break
+
+    if page_url:
+        store_id = _find_store_id({
+            key: value for key, value in data.items() if key not in ('url', '@id', 'mainEntityOfPage')
+        })
+        order_url = None
+        for field in ('menu', 'hasMenu', 'orderUrl'):
+            value = data.get(field)
+            if isinstance(value, str) and STORE_ID_TEXT.search(value):
+                order_url = value
+                break
+        details = _entity_details(data)
+        details.update({
+            'store_id': store_id,
+            'name': data.get('name'),
+            'page': page_url,
+            'order_url': order_url
+        })
+        found.setdefault(store_page_key(page_url), details)
+
+    for value in data.values():
+        if isinstance(value, (dict, list)):
+            _collect_store_entities(value, found)
+
+def parse_city_page_stores(html_content):
+    """Return {store page key: details} for every store described in a city page's structured data
+
+    Details hold store_id, name, page, lat, lng, address and order_url; any of
+    them may be None when the page doesn't provide it.
+    """
+    found = {}
+    for payload in JSON_SCRIPT.findall(html_content):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            continue
+        _collect_store_entities(data, found)
+    return found
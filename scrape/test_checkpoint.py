@@ -0,0 +1,34 @@
+import csv
+
+import pytest
+
+from checkpoint import LocationCheckpoint
+
+# Run with `python -m pytest scrape/test_checkpoint.py`.
+
+def location(store_id):
+    return {'store_id': store_id, 'location': f'Store {store_id}', 'page': '', 'map': ''}
+
+class FailingState:
+    """Crawl state whose database write fails, like a full disk"""
+
+    def record_city(self, state, city, locations):
+        raise OSError('No space left on device')
+
+def test_cities_reach_the_snapshot(tmp_path):
+    csv_path = tmp_path / 'locations.csv'
+    checkpoint = LocationCheckpoint(str(csv_path), str(tmp_path / 'locations.journal'), existing_rows=[])
+    checkpoint.add_city('Alaska', 'Anchorage', [location('1'), location('2')])
+    checkpoint.close()
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        assert [row['store_id'] for row in csv.DictReader(f)] == ['1', '2']
+
+def test_writer_failure_is_raised(tmp_path):
+    checkpoint = LocationCheckpoint(str(tmp_path / 'locations.csv'), str(tmp_path / 'locations.journal'),
+                                    existing_rows=[], crawl_state=FailingState(), fsync_every=1)
+    checkpoint.add_city('Alaska', 'Anchorage', [location('1')])
+    checkpoint.writer.join(timeout=5)
+    with pytest.raises(RuntimeError, match='No space left'):
+        checkpoint.add_city('Alaska', 'Juneau', [location('2')])
+    with pytest.raises(RuntimeError, match='No space left'):
+        checkpoint.close()
@@ -0,0 +1,68 @@
+import argparse
+import threading
+
+import pytest
+
+import distributed
+import work_queue
+
+# Run with `python -m pytest scrape/test_distributed.py`.
+
+UNITS = [{'id': f"{number:03d}", 'state': 'Alaska'} for number in range(40)]
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    """A 'test' job whose crawl echoes its units and whose merge collects them"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(distributed, 'POLL_INTERVAL', 0.05)
+    merged = []
+    spec = {
+        'units': lambda crawl_state, brand: list(UNITS),
+        'key': lambda unit: unit['id'],
+        'state': lambda unit: unit['state'],
+        'weight': lambda unit: 1,
+        'crawl': lambda units, args, lost: [dict(unit, crawled=True) for unit in units],
+        'merge': lambda records, crawl_state, args: merged.extend(records)
+    }
+    monkeypatch.setitem(distributed.JOB_SPECS, 'test', spec)
+    return merged
+
+def make_args(worker_id=None):
+    return argparse.Namespace(brand='tacobell', worker_id=worker_id, lease=5.0)
+
+def plan(shards, brand=None):
+    brand = brand or distributed.brands.get_brand()
+    return distributed.plan('test', shards, 'hash', 'queue.sqlite', 'state.sqlite', brand)
+
+def test_several_workers_crawl_every_unit_once(job):
+    plan(8)
+    workers = [
+        threading.Thread(target=distributed.run_worker, args=('test', make_args(f"worker-{number}"), 'queue.sqlite'))
+        for number in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert distributed.merge('test', make_args(), 'queue.sqlite', 'state.sqlite')
+    assert [record['id'] for record in job] == [unit['id'] for unit in UNITS]
+
+def test_partial_merge_is_not_replayed(job):
+    plan(4)
+    queue = work_queue.WorkQueue('queue.sqlite')
+    # One worker finishes two shards and stops
+    for _ in range(2):
+        shard, token, units = queue.lease('test', 'worker')
+        path = distributed.write_shard_file('test', shard, units, lambda unit: unit['id'], 'worker',
+                                            distributed.brands.get_brand())
+        queue.complete('test', shard, token, path)
+    queue.close()
+
+    assert distributed.merge('test', make_args(), 'queue.sqlite', 'state.sqlite', partial=True)
+    first = len(job)
+    assert 0 < first < len(UNITS)
+
+    distributed.run_worker('test', make_args('worker'), 'queue.sqlite')
+    assert distributed.merge('test', make_args(), 'queue.sqlite', 'state.sqlite')
+    assert sorted(record['id'] for record in job) == [unit['id'] for unit in UNITS]
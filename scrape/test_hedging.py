@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from hedging import MIN_SAMPLES, Hedger
+
+# Run with `python -m pytest scrape/test_hedging.py`.
+
+HOST = 'example.com'
+HEDGE_DELAY = 0.01
+LIMITER_WAIT = 0.3
+
+def warmed_hedger():
+    """A Hedger whose p95 for HOST is HEDGE_DELAY"""
+    hedger = Hedger()
+    for _ in range(MIN_SAMPLES):
+        hedger.record(HOST, HEDGE_DELAY)
+    assert hedger.hedge_delay(HOST) == HEDGE_DELAY
+    return hedger
+
+def test_limiter_wait_does_not_trigger_hedge():
+    hedger = warmed_hedger()
+    # Another request holds the host's only slot for longer than the hedge delay
+    slot = threading.Semaphore(1)
+    slot.acquire()
+    threading.Timer(LIMITER_WAIT, slot.release).start()
+    calls = []
+
+    def send(on_wire):
+        calls.append(time.monotonic())
+        with slot:
+            on_wire()
+            return 'response'
+
+    assert hedger.run(HOST, send) == 'response'
+    assert hedger.hedged == 0
+    assert len(calls) == 1
+
+def test_slow_request_on_the_wire_is_hedged():
+    hedger = warmed_hedger()
+    calls = []
+
+    def send(on_wire):
+        on_wire()
+        calls.append(None)
+        time.sleep(LIMITER_WAIT if len(calls) == 1 else 0)
+        return len(calls)
+
+    assert hedger.run(HOST, send) == 2
+    assert hedger.hedged == 1
+    assert hedger.hedge_wins == 1
+
+def test_async_limiter_wait_does_not_trigger_hedge():
+    hedger = warmed_hedger()
+    calls = []
+
+    async def main():
+        slot = asyncio.Semaphore(1)
+        await slot.acquire()
+        asyncio.get_running_loop().call_later(LIMITER_WAIT, slot.release)
+
+        async def send(on_wire):
+            calls.append(None)
+            async with slot:
+                on_wire()
+                return 'response'
+
+        return await hedger.run_async(HOST, send)
+
+    assert asyncio.run(main()) == 'response'
+    assert hedger.hedged == 0
+    assert len(calls) == 1
+
+def test_send_failing_before_the_wire_raises():
+    hedger = warmed_hedger()
+
+    def send(on_wire):
+        raise ValueError('throttle failed')
+
+    with pytest.raises(ValueError):
+        hedger.run(HOST, send)
+    assert hedger.hedged == 0
+
+def test_cancelled_async_run_cancels_its_request():
+    hedger = warmed_hedger()
+    started = []
+    finished = []
+
+    async def main():
+        async def send(on_wire):
+            on_wire()
+            started.append(None)
+            await asyncio.sleep(LIMITER_WAIT)
+            finished.append(None)
+
+        # Cancelled while waiting out the hedge delay
+        run = asyncio.ensure_future(hedger.run_async(HOST, send))
+        await asyncio.sleep(HEDGE_DELAY / 2)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        await asyncio.sleep(LIMITER_WAIT * 2)
+
+    asyncio.run(main())
+    assert started and not finished
@@ -0,0 +1,45 @@
+import csv
+
+from menu_journal import append_store_results, compact_journal
+
+# Run with `python -m pytest scrape/test_menu_journal.py`.
+
+def store_result(store_id, prices, **extra):
+    menu_items = {name: {'price': price, 'category': 'Food'} for name, price in prices.items()}
+    return dict({'store_id': store_id, 'menu_items': menu_items, 'success': True}, **extra)
+
+def read_menu(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return {row.pop('store_id'): row for row in csv.DictReader(f)}
+
+def test_complete_recrawl_drops_removed_items(tmp_path):
+    journal, menu_csv = str(tmp_path / 'journal.csv'), str(tmp_path / 'menu.csv')
+    append_store_results([store_result('1', {'Taco': 1.0, 'Burrito': 2.0})], journal)
+    compact_journal(journal, menu_csv)
+    append_store_results([store_result('1', {'Taco': 1.5})], journal)
+    compact_journal(journal, menu_csv)
+    assert read_menu(menu_csv) == {'1': {'Taco': '1.5'}}
+
+def test_partial_results_keep_other_items(tmp_path):
+    journal, menu_csv = str(tmp_path / 'journal.csv'), str(tmp_path / 'menu.csv')
+    append_store_results([store_result('1', {'Taco': 1.0, 'Burrito': 2.0}),
+                          store_result('2', {'Taco': 1.1})], journal)
+    compact_journal(journal, menu_csv)
+    append_store_results([
+        store_result('1', {'Taco': 1.5}, partial=True),
+        store_result('2', {'Nachos': 3.0}, failed_categories=[{'url': 'tacos'}])
+    ], journal)
+    compact_journal(journal, menu_csv)
+    assert read_menu(menu_csv) == {
+        '1': {'Burrito': '2.0', 'Nachos': '', 'Taco': '1.5'},
+        '2': {'Burrito': '', 'Nachos': '3.0', 'Taco': '1.1'}
+    }
+
+def test_old_journal_rows_are_merged(tmp_path):
+    journal, menu_csv = str(tmp_path / 'journal.csv'), str(tmp_path / 'menu.csv')
+    append_store_results([store_result('1', {'Taco': 1.0, 'Burrito': 2.0})], journal)
+    compact_journal(journal, menu_csv)
+    with open(journal, 'w', encoding='utf-8', newline='') as f:
+        f.write('store_id,item,price,category,timestamp\n1,Taco,1.5,Food,2024-01-01T00:00:00\n')
+    compact_journal(journal, menu_csv)
+    assert read_menu(menu_csv) == {'1': {'Burrito': '2.0', 'Taco': '1.5'}}
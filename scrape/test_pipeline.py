@@ -0,0 +1,34 @@
+from pipeline import Pipeline, Stage
+
+# Run with `python -m pytest scrape/test_pipeline.py`.
+
+def test_failed_task_reaches_error_hook():
+    results = []
+
+    def work(item, emit):
+        if item == 3:
+            raise ValueError('broken page')
+        emit('collect', ('ok', item))
+
+    def work_failed(item, error, emit):
+        emit('collect', ('failed', item, str(error)))
+
+    def collect(result, emit):
+        results.append(result)
+
+    pipeline = Pipeline([
+        Stage('work', work, workers=2, on_error=work_failed),
+        Stage('collect', collect)
+    ])
+    pipeline.run('work', range(5))
+
+    assert sorted(results) == [('failed', 3, 'broken page')] + [('ok', item) for item in (0, 1, 2, 4)]
+    assert pipeline.stages['work'].errors == 1
+
+def test_failed_task_without_hook_still_drains():
+    def work(item, emit):
+        raise RuntimeError('no handler')
+
+    pipeline = Pipeline([Stage('work', work, workers=2)])
+    pipeline.run('work', range(3))
+    assert pipeline.stages['work'].errors == 3
@@ -0,0 +1,19 @@
+import pytest
+
+from rate_limit import TokenBucket
+
+# Run with `python -m pytest scrape/test_rate_limit.py`.
+
+def test_burst_is_free_then_spaced_by_rate():
+    bucket = TokenBucket(10, 5)
+    waits = [bucket.reserve() for _ in range(8)]
+    assert waits[:5] == [0.0] * 5
+    assert waits[5:] == pytest.approx([0.1, 0.2, 0.3], abs=0.01)
+
+def test_reservations_after_pause_are_spaced_by_rate():
+    bucket = TokenBucket(10, 10)
+    bucket.pause(2.0)
+    waits = [bucket.reserve() for _ in range(40)]
+    assert waits[0] == pytest.approx(2.1, abs=0.01)
+    gaps = [later - earlier for earlier, later in zip(waits, waits[1:])]
+    assert gaps == pytest.approx([0.1] * 39, abs=0.001)
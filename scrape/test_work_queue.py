@@ -0,0 +1,39 @@
+import time
+
+from work_queue import WorkQueue
+
+# Run with `python -m pytest scrape/test_work_queue.py`.
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    queue.create_job('menu', [['1', '2']])
+
+    shard, stale_token, units = queue.lease('menu', 'dead-worker', lease_seconds=0.05)
+    assert units == ['1', '2']
+    assert queue.lease('menu', 'other-worker') is None
+
+    time.sleep(0.1)
+    reclaimed = queue.lease('menu', 'other-worker')
+    assert reclaimed is not None
+    assert reclaimed[0] == shard and reclaimed[1] != stale_token
+
+    # The worker that lost its lease can't heartbeat or finish the shard any more
+    assert not queue.heartbeat('menu', shard, stale_token)
+    assert not queue.complete('menu', shard, stale_token, 'stale.jsonl')
+    assert queue.complete('menu', shard, reclaimed[1], 'shard.jsonl')
+    assert queue.is_finished('menu')
+    queue.close()
+
+def test_merged_shards_are_not_returned_again(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    queue.create_job('menu', [['1'], ['2']])
+    first = queue.lease('menu', 'worker')
+    queue.complete('menu', first[0], first[1], 'first.jsonl')
+
+    assert queue.unmerged_results('menu') == [(first[0], 'first.jsonl')]
+    queue.mark_shards_merged('menu', [first[0]])
+
+    second = queue.lease('menu', 'worker')
+    queue.complete('menu', second[0], second[1], 'second.jsonl')
+    assert queue.unmerged_results('menu') == [(second[0], 'second.jsonl')]
+    queue.close()
@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import time
+
+# Shared lease queue for distributed crawls (see distributed.py).
+#
+# A job (e.g. "menu") is a set of shards, each a JSON list of work units.
+# Workers lease one shard at a time. A lease lasts lease_seconds and is kept
+# alive by heartbeats; a worker that dies stops heartbeating, its lease
+# expires and the shard goes to the next worker that asks. Every lease gets a
+# new token, and heartbeat()/complete() only succeed with the current token,
+# so a worker that stalled past its lease can't overwrite the shard's new
+# owner's status.
+#
+# The queue is one SQLite database in WAL mode, which every process on the
+# host (or on a shared filesystem that supports SQLite locking) opens on its
+# own. Leasing runs in a BEGIN IMMEDIATE transaction, so two workers can never
+# take the same shard.
+#
+# Each done shard records when its results were merged, so a partial merge
+# followed by a full one merges every shard exactly once.
+
+DEFAULT_QUEUE_PATH = 'data/work_queue.sqlite'
+
+DEFAULT_LEASE_SECONDS = 120
+# A shard whose leases keep expiring or failing is given up after this many
+MAX_SHARD_ATTEMPTS = 5
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job TEXT PRIMARY KEY,
+    strategy TEXT,
+    created_at REAL,
+    merged_at REAL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    job TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    units TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    token INTEGER NOT NULL DEFAULT 0,
+    lease_expires REAL,
+    heartbeat_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result_path TEXT,
+    last_error TEXT,
+    updated_at REAL,
+    merged_at REAL,
+    PRIMARY KEY (job, shard)
+);
+CREATE INDEX IF NOT EXISTS shards_status ON shards (job, status, lease_expires);
+'''
+
+class WorkQueue:
+    """SQLite-backed shard queue with leases, heartbeats and lease expiry"""
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit - transactions are opened explicitly where they matter
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        # Queues created before shards had merged_at
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(shards)')}
+        if 'merged_at' not in columns:
+            self.conn.execute('ALTER TABLE shards ADD COLUMN merged_at REAL')
+
+    def close(self):
+        self.conn.close()
+
+    def create_job(self, job, shards, strategy=None):
+        """Replace job's shards with the given lists of work units"""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.execute('DELETE FROM shards WHERE job = ?', (job,))
+            self.conn.execute(
+                'INSERT OR REPLACE INTO jobs (job, strategy, created_at, merged_at) VALUES (?, ?, ?, NULL)',
+                (job, strategy, now)
+            )
+            self.conn.executemany(
+                'INSERT INTO shards (job, shard, units, size, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(job, number, json.dumps(units), len(units), now) for number, units in enumerate(shards)]
+            )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def lease(self, job, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Take the next pending (or expired) shard; returns (shard, token, units) or None"""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.conn.execute(
+                "SELECT shard, units FROM shards WHERE job = ? AND attempts < ? AND "
+                "(status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "ORDER BY attempts, shard LIMIT 1",
+                (job, MAX_SHARD_ATTEMPTS, now)
+            ).fetchone()
+            if row is None:
+                self.conn.execute('COMMIT')
+                return None
+            shard, units = row
+            self.conn.execute(
+                "UPDATE shards SET status = 'leased', worker = ?, token = token + 1, attempts = attempts + 1, "
+                "lease_expires = ?, heartbeat_at = ?, updated_at = ? WHERE job = ? AND shard = ?",
+                (worker, now + lease_seconds, now, now, job, shard)
+            )
+            token = self.conn.execute(
+                'SELECT token FROM shards WHERE job = ? AND shard = ?', (job, shard)
+            ).fetchone()[0]
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return shard, token, json.loads(units)
+
+    def _update_lease(self, sql, params, job, shard, token):
+        cursor = self.conn.execute(
+            sql + " WHERE job = ? AND shard = ? AND token = ? AND status = 'leased'",
+            (*params, job, shard, token)
+        )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job, shard, token, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend a lease; False means it was lost to another worker"""
+        now = time.time()
+        return self._update_lease(
+            'UPDATE shards SET lease_expires = ?, heartbeat_at = ?',
+            (now + lease_seconds, now), job, shard, token
+        )
+
+    def complete(self, job, shard, token, result_path):
+        """Mark a leased shard done with its result file; False if the lease was lost"""
+        return self._update_lease(
+            "UPDATE shards SET status = 'done', result_path = ?, lease_expires = NULL, "
+            "last_error = NULL, updated_at = ?",
+            (result_path, time.time()), job, shard, token
+        )
+
+    def release(self, job, shard, token, error):
+        """Give a shard back after an error; it becomes pending again (or failed, out of attempts)"""
+        return self._update_lease(
+            "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_expires = NULL, last_error = ?, updated_at = ?",
+            (MAX_SHARD_ATTEMPTS, str(error), time.time()), job, shard, token
+        )
+
+    def counts(self, job):
+        """Return {status: shards}, counting expired leases that are out of attempts as failed"""
+        now = time.time()
+        rows = self.conn.execute(
+            "SELECT CASE WHEN status = 'leased' AND lease_expires < ? AND attempts >= ? THEN 'failed' "
+            "ELSE status END, COUNT(*) FROM shards WHERE job = ? GROUP BY 1",
+            (now, MAX_SHARD_ATTEMPTS, job)
+        ).fetchall()
+        return dict(rows)
+
+    def is_finished(self, job):
+        """True when no shard is pending or leased any more"""
+        counts = self.counts(job)
+        return not counts.get('pending') and not counts.get('leased')
+
+    def unmerged_results(self, job):
+        """(shard, result file) of the job's finished shards not merged yet, in shard order"""
+        return self.conn.execute(
+            "SELECT shard, result_path FROM shards WHERE job = ? AND status = 'done' AND merged_at IS NULL "
+            "ORDER BY shard", (job,)
+        ).fetchall()
+
+    def mark_shards_merged(self, job, shards):
+        """Record that these shards' results are in the final outputs"""
+        now = time.time()
+        self.conn.executemany(
+            'UPDATE shards SET merged_at = ? WHERE job = ? AND shard = ?',
+            [(now, job, shard) for shard in shards]
+        )
+
+    def failed_units(self, job):
+        """Work units of shards that were given up on"""
+        now = time.time()
+        rows = self.conn.execute(
+            "SELECT units FROM shards WHERE job = ? AND (status = 'failed' OR "
+            "(status = 'leased' AND lease_expires < ? AND attempts >= ?)) ORDER BY shard",
+            (job, now, MAX_SHARD_ATTEMPTS)
+        ).fetchall()
+        return [unit for row in rows for unit in json.loads(row[0])]
+
+    def is_merged(self, job):
+        row = self.conn.execute('SELECT merged_at FROM jobs WHERE job = ?', (job,)).fetchone()
+        return row is not None and row[0] is not None
+
+    def mark_merged(self, job):
+        self.conn.execute('UPDATE jobs SET merged_at = ? WHERE job = ?', (time.time(), job))
+
+    def summary(self, job):
+        """Return a one-line progress summary of a job"""
+        row = self.conn.execute('SELECT strategy, merged_at FROM jobs WHERE job = ?', (job,)).fetchone()
+        if row is None:
+            return f"Job {job}: not planned"
+        counts = self.counts(job)
+        units = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0), COALESCE(SUM(CASE WHEN status = 'done' THEN size END), 0) "
+            "FROM shards WHERE job = ?", (job,)
+        ).fetchone()
+        workers = self.conn.execute(
+            "SELECT COUNT(DISTINCT worker) FROM shards WHERE job = ? AND status = 'leased' AND lease_expires >= ?",
+            (job, time.time())
+        ).fetchone()[0]
+        shards = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+        merged = 'merged' if row[1] else 'not merged'
+        return (f"Job {job} ({row[0]} sharding): {shards}; {units[1]} of {units[0]} units done; "
+                f"{workers} active workers; {merged}")